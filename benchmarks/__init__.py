@@ -0,0 +1,3 @@
+"""
+Offline benchmarks of the fingerprint pipeline, see benchmarks/run.py
+"""
@@ -0,0 +1,77 @@
+"""
+Compares the results of two benchmark runs, see benchmarks/run.py, e.g.
+
+    python -m benchmarks.compare results/1a2b3c4.json results/5d6e7f8.json
+
+and exits with a non-zero status if any benchmark is slower by more than
+the threshold.
+"""
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+# The median of a benchmark is compared, as it is less affected by the
+# occasional outlier than the mean
+STATISTIC = 'median'
+
+
+def load(path: Path) -> Dict[str, Dict[str, float]]:
+    return json.loads(path.read_text())['benchmarks']
+
+
+def compare(
+    baseline: Dict[str, Dict[str, float]],
+    candidate: Dict[str, Dict[str, float]],
+) -> List[Tuple[str, float, float, float]]:
+    """
+    Returns (name, baseline, candidate, ratio) for the benchmarks in both
+    runs, where a ratio above 1 means that the candidate is slower
+
+    >>> compare({'a': {'median': 2.0}, 'b': {'median': 1.0}}, {'a': {'median': 3.0}})
+    [('a', 2.0, 3.0, 1.5)]
+    """
+    return [
+        (
+            name,
+            baseline[name][STATISTIC],
+            candidate[name][STATISTIC],
+            candidate[name][STATISTIC] / baseline[name][STATISTIC],
+        )
+        for name in sorted(baseline.keys() & candidate.keys())
+    ]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compare two benchmark runs')
+
+    parser.add_argument('baseline', help='The results to compare against')
+    parser.add_argument('candidate', help='The results to compare')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.1,
+        help='The relative slowdown that counts as a regression',
+    )
+
+    args = parser.parse_args()
+
+    comparisons = compare(load(Path(args.baseline)), load(Path(args.candidate)))
+    regressions = 0
+
+    for name, baseline, candidate, ratio in comparisons:
+        is_regression = ratio > 1 + args.threshold
+        regressions += is_regression
+
+        print(
+            f'{name:<32}'
+            f'\t{baseline * 1000:10.3f} ms'
+            f'\t{candidate * 1000:10.3f} ms'
+            f'\t{ratio:6.2f}x'
+            f'{"  REGRESSION" if is_regression else ""}'
+        )
+
+    sys.exit(1 if regressions > 0 else 0)
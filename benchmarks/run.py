@@ -0,0 +1,153 @@
+"""
+Runs the benchmarks of the fingerprint pipeline on a synthetic video and
+writes the results to a JSON-file, named after the current commit by
+default, e.g.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --filter compare_all --duration 30
+
+Requires ffmpeg, but neither docker nor a deployment of the app. The
+results of two commits are compared with benchmarks/compare.py.
+"""
+import datetime
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import subprocess
+import timeit
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from .suite import BENCHMARKS, Fixtures
+
+
+RESULTS_DIRECTORY = Path(__file__).parent / 'results'
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """
+    Times `func` `repeat` times, each time calling it as often as it takes
+    to run for at least 0.2 seconds, and reports the per-call statistics in
+    seconds
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    timings = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def current_commit() -> Optional[str]:
+    try:
+        output = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return output.decode().strip()
+
+
+def run(fixtures: Fixtures, patterns: List[str], repeat: int) -> Dict[str, Dict]:
+    results = {}
+
+    for name, setup in BENCHMARKS.items():
+        if patterns and not any(fnmatch.fnmatch(name, f'*{p}*') for p in patterns):
+            continue
+
+        func = setup(fixtures)
+
+        if func is None:
+            logger.warning(f'Skipping {name}, not applicable to the synthetic video')
+            continue
+
+        results[name] = measure(func, repeat)
+        logger.info(f'{name}: {results[name]["median"] * 1000:.3f} ms')
+
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Fingerprint pipeline benchmarks')
+
+    parser.add_argument(
+        '--filter',
+        nargs='*',
+        default=[],
+        help='Only run the benchmarks whose names contain any of these',
+    )
+
+    parser.add_argument(
+        '--duration',
+        type=int,
+        default=60,
+        help='The duration of the synthetic video, in seconds',
+    )
+
+    parser.add_argument(
+        '--size', default='640x360', help='The size of the synthetic video'
+    )
+
+    parser.add_argument(
+        '--repeat', type=int, default=5, help='The number of timings per benchmark'
+    )
+
+    parser.add_argument(
+        '--work-directory',
+        default='interim/benchmarks',
+        help='Where the synthetic video, and its frames, are written',
+    )
+
+    parser.add_argument(
+        '--output',
+        help='The JSON-file to write, by default results/<commit>.json',
+    )
+
+    args = parser.parse_args()
+
+    work_directory = Path(args.work_directory)
+    work_directory.mkdir(parents=True, exist_ok=True)
+
+    fixtures = Fixtures.create(work_directory, args.duration, args.size)
+
+    commit = current_commit()
+    output = (
+        Path(args.output)
+        if args.output
+        else RESULTS_DIRECTORY / f'{commit or "unknown"}.json'
+    )
+
+    report = {
+        'commit': commit,
+        'timestamp': datetime.datetime.now().isoformat(),
+        'machine': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'parameters': {
+            'duration': args.duration,
+            'size': args.size,
+            'repeat': args.repeat,
+            'segments': len(fixtures.fingerprints),
+        },
+        'benchmarks': run(fixtures, args.filter, args.repeat),
+    }
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    logger.info(f'Wrote the results to {output}')
@@ -0,0 +1,198 @@
+"""
+The benchmarks, each of which is a function that is given the fixtures
+and returns the (argument-less) callable to measure. Anything done before
+returning is setup and not measured.
+"""
+import os
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+import video_reuse_detector.util as util
+from video_reuse_detector.color_correlation import ColorCorrelation
+from video_reuse_detector.extract_audio import decode_pcm
+from video_reuse_detector.fingerprint import (
+    FPS,
+    FingerprintCollection,
+    FingerprintComparison,
+    extract_fingerprint_collection_with_keyframes,
+)
+from video_reuse_detector.keyframe import Keyframe
+from video_reuse_detector.orb import ORB
+from video_reuse_detector.sampling import sample
+from video_reuse_detector.ssm import SAMPLE_RATE, SSM
+from video_reuse_detector.thumbnail import Thumbnail
+
+from . import synthetic
+
+
+@dataclass
+class Fixtures:
+    video_path: Path
+    interim_directory: Path
+    # The frames of the first segment
+    frames: List[np.ndarray]
+    # The audio of the entire video, see extract_audio.decode_pcm
+    samples: np.ndarray
+    keyframes: List[Keyframe]
+    fingerprints: List[FingerprintCollection]
+
+    @staticmethod
+    def create(directory: Path, duration: int, size: str) -> 'Fixtures':
+        video_path = synthetic.generate_video(directory, duration, size)
+        interim_directory = directory / 'interim'
+
+        keyframes = synthetic.keyframes(video_path, interim_directory)
+        frame_paths = sorted((interim_directory / video_path.stem).glob('*.png'))
+        samples = decode_pcm(video_path, SAMPLE_RATE)
+
+        return Fixtures(
+            video_path,
+            interim_directory,
+            [util.imread(p) for p in frame_paths[:FPS]],
+            samples,
+            keyframes,
+            synthetic.fingerprints(
+                keyframes, video_path.name, SSM.from_pcm(samples, SAMPLE_RATE)
+            ),
+        )
+
+
+# Returns None if the fixtures do not suffice for the benchmark
+Benchmark = Callable[[Fixtures], Optional[Callable[[], Any]]]
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str):
+    def register(func: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = func
+        return func
+
+    return register
+
+
+@benchmark('keyframe.from_frames')
+def keyframe_from_frames(fixtures: Fixtures):
+    return lambda: Keyframe.from_frames(fixtures.frames)
+
+
+@benchmark('thumbnail.from_image')
+def thumbnail_from_image(fixtures: Fixtures):
+    return lambda: Thumbnail.from_image(fixtures.keyframes[0].image)
+
+
+@benchmark('color_correlation.from_image')
+def color_correlation_from_image(fixtures: Fixtures):
+    return lambda: ColorCorrelation.from_image(fixtures.keyframes[0].image)
+
+
+@benchmark('orb.from_image')
+def orb_from_image(fixtures: Fixtures):
+    return lambda: ORB.from_image(fixtures.keyframes[0].image)
+
+
+@benchmark('orb.similar_to')
+def orb_similar_to(fixtures: Fixtures):
+    # Keyframes without keypoints are never compared
+    orbs = [fpc.orb for fpc in fixtures.fingerprints if fpc.orb is not None]
+
+    if len(orbs) < 2:
+        return None
+
+    query, reference = orbs[0], orbs[-1]
+
+    return lambda: query.similar_to(reference)
+
+
+@benchmark('ssm.from_pcm')
+def ssm_from_pcm(fixtures: Fixtures):
+    if len(fixtures.samples) == 0:
+        return None
+
+    return lambda: SSM.from_pcm(fixtures.samples)
+
+
+# The number of query and reference segments compare_all is benchmarked at,
+# the number of comparisons grows quadratically
+COMPARISON_SIZES = [5, 10, 30, 60]
+
+
+def compare_all(n: int) -> Benchmark:
+    def setup(fixtures: Fixtures):
+        if len(fixtures.fingerprints) < n:
+            return None
+
+        fingerprints = fixtures.fingerprints[:n]
+
+        return lambda: FingerprintComparison.compare_all(fingerprints, fingerprints)
+
+    return setup
+
+
+for n in COMPARISON_SIZES:
+    benchmark(f'compare_all.{n}x{n}')(compare_all(n))
+
+
+@benchmark('model.encode')
+def model_encode(fixtures: Fixtures):
+    FingerprintCollectionModel = __fingerprint_collection_model__()
+    fingerprints = fixtures.fingerprints
+
+    return lambda: [
+        FingerprintCollectionModel.from_fingerprint_collection(fpc)
+        for fpc in fingerprints
+    ]
+
+
+@benchmark('model.decode')
+def model_decode(fixtures: Fixtures):
+    FingerprintCollectionModel = __fingerprint_collection_model__()
+    models = [
+        FingerprintCollectionModel.from_fingerprint_collection(fpc)
+        for fpc in fixtures.fingerprints
+    ]
+
+    return lambda: [model.to_fingerprint_collection() for model in models]
+
+
+@benchmark('sampling.sample')
+def sampling_sample(fixtures: Fixtures):
+    # The frames of the first segment, repeated as a static span
+    segments = [fixtures.frames] * 10
+
+    return lambda: list(sample(segments))
+
+
+def extract(adaptive: bool) -> Benchmark:
+    def setup(fixtures: Fixtures):
+        """The entire extraction of the video, decoding included"""
+        output_directory = fixtures.interim_directory / 'extract'
+
+        def run():
+            extract_fingerprint_collection_with_keyframes(
+                fixtures.video_path, output_directory, adaptive=adaptive
+            )
+            shutil.rmtree(output_directory, ignore_errors=True)
+
+        return run
+
+    return setup
+
+
+benchmark('extract')(extract(adaptive=False))
+benchmark('extract.adaptive')(extract(adaptive=True))
+
+
+def __fingerprint_collection_model__():
+    # The models are part of the middleware, the configuration of which
+    # requires database URLs. Converting fingerprints never connects to them
+    for variable in ('DATABASE_URL', 'DATABASE_TEST_URL'):
+        os.environ.setdefault(variable, 'sqlite://')
+
+    from middleware.models.fingerprint_collection import FingerprintCollectionModel
+
+    return FingerprintCollectionModel
@@ -0,0 +1,64 @@
+"""
+Synthetic input for the benchmarks, generated with the lavfi sources of
+ffmpeg so that the benchmarks neither depend on the archive nor on videos
+that cannot be shared.
+"""
+from pathlib import Path
+from typing import List, Optional
+
+from video_reuse_detector import ffmpeg
+from video_reuse_detector.downsample import downsample
+from video_reuse_detector.fingerprint import FPS, FingerprintCollection, chunks
+from video_reuse_detector.keyframe import Keyframe
+from video_reuse_detector.ssm import SSM
+
+
+def generate_video(
+    output_directory: Path,
+    duration: int = 60,
+    size: str = '640x360',
+    rate: int = 25,
+    source: str = 'testsrc',
+) -> Path:
+    """
+    Generates a video of the given duration (in seconds) and size from one
+    of the video sources of ffmpeg, e.g. "testsrc" or "mandelbrot", with a
+    beeping sine wave as its audio, unless it has been generated before
+    """
+    output_path = output_directory / f'{source}_{size}_{rate}fps_{duration}s.mp4'
+
+    if output_path.exists():
+        return output_path
+
+    cmd = (
+        'ffmpeg'
+        ' -f lavfi'
+        f' -i {source}=duration={duration}:size={size}:rate={rate}'
+        ' -f lavfi'
+        f' -i sine=frequency=440:beep_factor=4:duration={duration}'
+        ' -pix_fmt yuv420p'
+        f' -y {output_path}'
+    )
+
+    return ffmpeg.execute(cmd, output_directory)[0]
+
+
+def keyframes(video_path: Path, output_directory: Path) -> List[Keyframe]:
+    """One keyframe per segment (second) of the video, as during extraction"""
+    frame_paths = downsample(video_path, output_directory / video_path.stem, FPS)
+
+    return [Keyframe.from_frame_paths(paths) for paths in chunks(frame_paths, FPS)]
+
+
+def fingerprints(
+    keyframes: List[Keyframe], video_name: str, ssms: List[Optional[SSM]]
+) -> List[FingerprintCollection]:
+    fpcs = [
+        FingerprintCollection.from_keyframe(keyframe, video_name, segment_id)
+        for segment_id, keyframe in enumerate(keyframes)
+    ]
+
+    for fpc, ssm in zip(fpcs, ssms):
+        fpc.ssm = ssm
+
+    return fpcs
@@ -39,25 +39,59 @@ export default function Main() {
 
   useEffect(() => {
     listFiles();
-    socket.on('video_file_added', videoFileAdded);
-    socket.on('video_file_fingerprinted', videoFileFingerprinted);
+    // The backend emits events in batches, i.e. every event carries a list
+    socket.on('video_files_added', videoFilesAdded);
+    socket.on('video_files_fingerprinted', videoFilesFingerprinted);
     socket.on(
-      'comparison_computation_completed',
-      comparisonComputationCompleted
+      'comparison_computations_completed',
+      comparisonComputationsCompleted
     );
+    socket.on('comparison_batches_completed', comparisonBatchesCompleted);
 
     return () => {
-      socket.off('video_file_added');
-      socket.off('video_file_fingerprinted');
-      socket.off('comparison_computation_completed');
+      socket.off('video_files_added');
+      socket.off('video_files_fingerprinted');
+      socket.off('comparison_computations_completed');
+      socket.off('comparison_batches_completed');
     };
   }, []);
 
-  const comparisonComputationCompleted = response => {
-    const { query_video_name, reference_video_name } = response;
-    const event = `Comparison ${query_video_name}:${reference_video_name} complete`;
-    setEvents(events => [event, ...events]);
-    toast.success(event);
+  // Notifies once per batch, rather than once per event, if there are many
+  const notify = (newEvents, summary) => {
+    setEvents(events => [...newEvents.reverse(), ...events]);
+
+    if (newEvents.length > 3) {
+      toast.success(summary);
+    } else {
+      newEvents.forEach(event => toast.success(event));
+    }
+  };
+
+  const comparisonBatchesCompleted = responses => {
+    notify(
+      responses.map(r => `Comparison batch ${r.batch_id} complete`),
+      `${responses.length} comparison batches complete`
+    );
+  };
+
+  const comparisonComputationsCompleted = responses => {
+    notify(
+      responses.map(
+        r => `Comparison ${r.query_video_name}:${r.reference_video_name} complete`
+      ),
+      `${responses.length} comparisons complete`
+    );
+  };
+
+  const mergeFiles = responses => {
+    setAllFiles(allFiles => {
+      const merged = { ...allFiles };
+      responses.forEach(r => {
+        merged[r.video_name] = r;
+      });
+
+      return merged;
+    });
   };
 
   const listFiles = async () => {
@@ -66,12 +100,20 @@ export default function Main() {
     //
     // {"files": [{"processing_state": "FINGERPRINTED", "video_name": "Megamind.avi", ...}, {...}]}
     //
-    // and a few other attributes
-    const { data } = await axios.get(
-      `${process.env.REACT_APP_API_URL}/api/files/list`
-    );
+    // and a few other attributes. The list is paginated, the "cursor" of
+    // a page is passed along to get the next one, and is null on the last
+    let files = [];
+    let cursor = null;
+
+    do {
+      const { data } = await axios.get(
+        `${process.env.REACT_APP_API_URL}/api/files/list`,
+        { params: cursor === null ? {} : { cursor } }
+      );
 
-    const files = data.files || [];
+      files = files.concat(data.files || []);
+      cursor = data.cursor === undefined ? null : data.cursor;
+    } while (cursor !== null);
 
     // Make it so that the video_name is the key to the rest of the attributes,
     //
@@ -98,22 +140,18 @@ export default function Main() {
     }));
   };
 
-  const videoFileAdded = response => {
-    setEvents(events => [`${response.display_name} added`, ...events]);
-    setAllFiles(allFiles => ({
-      ...allFiles,
-      [response.video_name]: response
-    }));
+  const videoFilesAdded = responses => {
+    const newEvents = responses.map(r => `${r.display_name} added`);
+    setEvents(events => [...newEvents.reverse(), ...events]);
+    mergeFiles(responses);
   };
 
-  const videoFileFingerprinted = response => {
-    const event = `${response.display_name} fingerprinted`;
-    toast.info(event);
-    setEvents(events => [event, ...events]);
-    setAllFiles(allFiles => ({
-      ...allFiles,
-      [response.video_name]: response
-    }));
+  const videoFilesFingerprinted = responses => {
+    notify(
+      responses.map(r => `${r.display_name} fingerprinted`),
+      `${responses.length} videos fingerprinted`
+    );
+    mergeFiles(responses);
   };
 
   const getUploadParams = ({ file, meta }) => {
@@ -161,18 +199,32 @@ export default function Main() {
       .then(response => {
         console.log(response.data);
 
-        for (let [k, v] of Object.entries(response.data)) {
-          console.log(v);
+        const { batch_id, ...statuses } = response.data;
+        const started = [];
+        const existing = [];
+
+        for (let [k, v] of Object.entries(statuses)) {
           if (v === 'started') {
-            toast.success(`Comparison between ${k} has been queued`);
+            started.push(k);
           }
           if (v === 'exists') {
-            toast.info(`Comparsion between ${k} already exists`);
+            existing.push(k);
           }
           if (v === 'fingerprint missing') {
             toast.warn(`${k} has not been fingerprinted yet. Try again later!`);
           }
         }
+
+        // One notification per outcome, rather than per pair, as a single
+        // request may cover thousands of pairs
+        if (started.length > 0) {
+          toast.success(
+            `${started.length} comparisons have been queued (batch ${batch_id})`
+          );
+        }
+        if (existing.length > 0) {
+          toast.info(`${existing.length} comparisons already exist`);
+        }
       });
   };
 
@@ -182,11 +234,16 @@ export default function Main() {
     const queryVideoNames = getVideoNames(selectedQueryFiles);
     const referenceVideoNames = getVideoNames(selectedReferenceFiles);
 
+    // Only the summaries, every visualization fetches its comparisons page
+    // by page, see Visualization.loadComparisons
     axios
-      .post(`${process.env.REACT_APP_API_URL}/api/fingerprints/comparisons`, {
-        query_video_names: queryVideoNames,
-        reference_video_names: referenceVideoNames
-      })
+      .post(
+        `${process.env.REACT_APP_API_URL}/api/fingerprints/comparisons/summary`,
+        {
+          query_video_names: queryVideoNames,
+          reference_video_names: referenceVideoNames
+        }
+      )
       .then(response => {
         if (response.data.comparisons.length === 0) {
           toast.warn(
@@ -1,6 +1,8 @@
 import React from 'react';
 import PropTypes from 'prop-types';
 
+import axios from 'axios';
+
 import Paper from '@material-ui/core/Paper';
 import { Link } from 'react-router-dom';
 
@@ -11,6 +13,9 @@ function round(value, decimals) {
   );
 }
 
+// The number of comparisons fetched per request, see /comparisons/rows
+const PAGE_SIZE = 1000;
+
 const matchLevels = [
   // G is never rendered, why? Because it means there is no similarity.
   'MatchLevel.LEVEL_A',
@@ -97,10 +102,65 @@ export default class Visualization extends React.Component {
       x: -1,
       y: -1,
       w: -1,
-      h: -1
+      h: -1,
+      // Grouped by match level, as they are fetched, see loadComparisons
+      comparisons: {}
     };
   }
 
+  componentDidMount() {
+    this.loadComparisons();
+  }
+
+  componentDidUpdate(prevProps) {
+    if (prevProps.comparison !== this.props.comparison) {
+      this.loadComparisons();
+    }
+  }
+
+  componentWillUnmount() {
+    this.unmounted = true;
+  }
+
+  // The summary of the comparison is all the header needs, the comparisons
+  // themselves are fetched page by page and drawn as they arrive. They are
+  // expanded to one comparison per pair of segments, as counted by the
+  // summary, whether or not the segments were collapsed
+  loadComparisons = async () => {
+    const { queryVideoName, referenceVideoName } = this.props.comparison;
+    const comparisons = {};
+    let cursor = null;
+
+    // A newer load, of a newer summary, supersedes this one
+    const load = (this.load || 0) + 1;
+    this.load = load;
+
+    do {
+      const { data } = await axios.post(
+        `${process.env.REACT_APP_API_URL}/api/fingerprints/comparisons/rows`,
+        {
+          query_video_name: queryVideoName,
+          reference_video_name: referenceVideoName,
+          cursor,
+          limit: PAGE_SIZE,
+          expand: true
+        }
+      );
+
+      if (this.unmounted || this.load !== load) {
+        return;
+      }
+
+      data.comparisons.forEach(c => {
+        comparisons[c.match_level] = comparisons[c.match_level] || [];
+        comparisons[c.match_level].push(c);
+      });
+
+      this.setState({ comparisons: { ...comparisons } });
+      cursor = data.cursor;
+    } while (cursor !== null);
+  };
+
   onSelected = segment => {
     this.setState({
       selected: segment !== null,
@@ -134,16 +194,16 @@ export default class Visualization extends React.Component {
   }
 
   createMatchLevelDistribution(comparison) {
-    const comparisonsByMatchLevel = comparison.comparisons;
+    const matchLevelToNumberOfMatches = comparison.matchesPerLevel;
 
-    const matchLevelToNumberOfMatches = {};
     const rectangles = [];
     let xOffset = 0;
     const totalWidth = 100;
 
-    for (let [matchLevel, matches] of Object.entries(comparisonsByMatchLevel)) {
-      matchLevelToNumberOfMatches[matchLevel] = matches.length;
-      const width = (totalWidth * matches.length) / comparison.totalMatches;
+    for (let [matchLevel, numberOfMatches] of Object.entries(
+      matchLevelToNumberOfMatches
+    )) {
+      const width = (totalWidth * numberOfMatches) / comparison.totalMatches;
       const fillStyle = matchLevelToSwatchMap[matchLevel];
 
       rectangles.push(
@@ -156,7 +216,8 @@ export default class Visualization extends React.Component {
     }
 
     const totalMatches = Object.values(matchLevelToNumberOfMatches).reduce(
-      (a, b) => a + b
+      (a, b) => a + b,
+      0
     );
     if (totalMatches !== comparison.totalMatches) {
       console.log(
@@ -200,6 +261,7 @@ export default class Visualization extends React.Component {
           height={780}
           onSelected={this.onSelected}
           comparison={this.props.comparison}
+          comparisons={this.state.comparisons}
         />
         <div>{this.getSelectionStr()}</div>
       </Paper>
@@ -240,9 +302,26 @@ class Canvas extends React.Component {
     this.ctx.strokeStyle = this.props.strokeStyle;
     this.ctx.lineWidth = this.props.lineWidth;
     this.addMouseEvents();
+    this.createObjects();
   }
 
-  componentDidUpdate() {
+  componentDidUpdate(prevProps) {
+    if (prevProps.comparison !== this.props.comparison) {
+      this.createObjects();
+    } else if (prevProps.comparisons !== this.props.comparisons) {
+      // Another page of comparisons has been fetched
+      this.lines = createComparisonLines(
+        this.querySegments,
+        this.referenceSegments,
+        this.props.comparisons
+      );
+
+      this.shouldRender = true;
+      requestAnimationFrame(this.updateCanvas);
+    }
+  }
+
+  createObjects() {
     const comparison = this.props.comparison;
     if (comparison.length === 0) {
       console.log('No comparison to render');
@@ -299,7 +378,7 @@ class Canvas extends React.Component {
     this.lines = createComparisonLines(
       this.querySegments,
       this.referenceSegments,
-      comparison.comparisons
+      this.props.comparisons
     );
 
     this.shouldRender = true;
@@ -415,7 +494,8 @@ Canvas.propTypes = {
   height: PropTypes.number.isRequired,
   strokeStyle: PropTypes.string.isRequired,
   onSelected: PropTypes.func.isRequired,
-  comparison: PropTypes.object.isRequired
+  comparison: PropTypes.object.isRequired,
+  comparisons: PropTypes.object.isRequired
 };
 
 class Segment {
@@ -7,7 +7,8 @@ from flask_cors import CORS
 from flask_socketio import SocketIO
 from redis import Redis
 
-from . import models, routes, services
+from . import events, models, routes, services
+from .queues import Priority, create_extract_queues
 
 
 socketio = SocketIO()
@@ -28,12 +29,14 @@ def create_app():
     app.url_map.strict_slashes = False
 
     app.redis = Redis.from_url(app.config['REDIS_URL'])
-    app.extract_queue = rq.Queue('extract', connection=app.redis)
+    app.extract_queues = create_extract_queues(app.redis)
+    app.extract_queue = app.extract_queues[Priority.NORMAL]
     app.compare_queue = rq.Queue('compare', connection=app.redis)
 
     socketio.init_app(
         app, cors_allowed_origins="*", message_queue=app.config['REDIS_URL']
     )
+    events.init_app(app, socketio)
 
     models.init_app(app)  # inits db
     admin.init_app(app)
@@ -29,6 +29,59 @@ __ARCHIVE_FILE__ = Path(__archive_file__) if __archive_file__ else None
 # TODO: Not part of the application configuration necessarily, move?
 INTERIM_DIRECTORY = create_directory(__BASE_DIR_PATH__ / 'interim')
 
+# The number of segments (seconds) fingerprinted between every checkpoint
+# during extraction. An interrupted extraction resumes from the last
+# checkpoint, so this is an upper bound on the amount of work that is lost
+SEGMENTS_PER_CHECKPOINT = int(os.getenv('SEGMENTS_PER_CHECKPOINT', default='60'))
+
+# The extraction of a video is split into jobs of at most this many segments
+# (seconds) that are processed in parallel by the available extractors
+SEGMENTS_PER_JOB = int(os.getenv('SEGMENTS_PER_JOB', default='600'))
+
+# Videos longer than this (in seconds) are extracted with a lower priority
+# than they would otherwise, so that they do not hold up short query clips
+LONG_VIDEO_DURATION = float(os.getenv('LONG_VIDEO_DURATION', default='1800'))
+
+# Whether keyframes are sampled adaptively, i.e. per shot and low-motion
+# span rather than per second, see video_reuse_detector.sampling
+ADAPTIVE_SAMPLING = os.getenv('ADAPTIVE_SAMPLING', default='1') == '1'
+
+# Consecutive segments with thumbnails at least this similar are collapsed
+# into one before they are stored, see
+# video_reuse_detector.fingerprint.collapse_near_duplicates. Any value above
+# 1 disables collapsing
+COLLAPSE_THRESHOLD = float(os.getenv('COLLAPSE_THRESHOLD', default='0.98'))
+
+
+# Comparisons are enqueued as jobs of one query video against at most this
+# many reference videos, so that the query fingerprints are loaded once per
+# job rather than once per pair
+REFERENCES_PER_COMPARISON_JOB = int(
+    os.getenv('REFERENCES_PER_COMPARISON_JOB', default='20')
+)
+
+# How long (in seconds) the progress of a batch of comparisons is kept
+COMPARISON_BATCH_TTL = 7 * 24 * 60 * 60
+
+# How long (in seconds) the pending ranges, the letterbox, and the profiles
+# of the finished jobs, of an extraction are kept. An extraction that has not
+# been finalized by then is resumed by the resume_extractions command
+EXTRACTION_TTL = 7 * 24 * 60 * 60
+
+# How often (in seconds) the web server emits the buffered events, and the
+# number of events of each type that are buffered at most, see events.py
+EVENT_FLUSH_INTERVAL = float(os.getenv('EVENT_FLUSH_INTERVAL', default='0.5'))
+MAX_BUFFERED_EVENTS = 10000
+
+# Whether the stages of extractions and comparisons are profiled, see
+# video_reuse_detector.profiling. The total processing time is recorded
+# either way
+PROFILING = os.getenv('PROFILING', default='1') == '1'
+
+# The number of hash partitions of the fingerprint_comparisons table. Fixed
+# when the table is created, i.e. changing it requires a recreate_db
+COMPARISON_PARTITIONS = int(os.getenv('COMPARISON_PARTITIONS', default='16'))
+
 
 class Config(object):
     DEBUG = False
@@ -42,6 +95,17 @@ class Config(object):
     ARCHIVE_FILE = __ARCHIVE_FILE__
     REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
 
+    # Workers keep their connections open between jobs, which the database
+    # may close in the meantime. Pinging on checkout replaces those
+    # transparently rather than failing the next job
+    SQLALCHEMY_ENGINE_OPTIONS = {'pool_pre_ping': True, 'pool_recycle': 3600}
+
+    # How often an extractor looks for work in the high, normal and low
+    # priority queue first, respectively
+    EXTRACT_QUEUE_WEIGHTS = [
+        float(w) for w in os.getenv('EXTRACT_QUEUE_WEIGHTS', '8,3,1').split(',')
+    ]
+
 
 class ProductionConfig(Config):
     DEBUG = False
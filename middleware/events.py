@@ -0,0 +1,155 @@
+"""
+Events for the frontend are buffered in Redis, by whichever process
+produces them, and emitted by the web server in batches.
+
+During a bulk seed, or while a large batch of comparisons is processed,
+events are produced far faster than the frontend can render them one by
+one. The web server instead drains the buffers every EVENT_FLUSH_INTERVAL
+seconds, coalesces the events that concern the same video (or pair of
+videos), and emits one batched event per type, e.g. a single
+"video_files_fingerprinted" with a list of video files.
+"""
+import json
+from typing import Any, Callable, Dict, List, Tuple
+
+from flask import current_app
+from flask_socketio import SocketIO
+from loguru import logger
+from redis import Redis
+
+from .config import EVENT_FLUSH_INTERVAL, MAX_BUFFERED_EVENTS
+
+
+Payload = Dict[str, Any]
+
+# The name of the batched event, and the key that events are coalesced on,
+# i.e. of two events with the same key only the latter is emitted
+BATCHED_EVENTS: Dict[str, Tuple[str, Callable[[Payload], Any]]] = {
+    'video_file_added': ('video_files_added', lambda p: p['video_name']),
+    'video_file_fingerprinted': (
+        'video_files_fingerprinted',
+        lambda p: p['video_name'],
+    ),
+    'comparison_computation_completed': (
+        'comparison_computations_completed',
+        lambda p: (p['query_video_name'], p['reference_video_name']),
+    ),
+    'comparison_batch_completed': (
+        'comparison_batches_completed',
+        lambda p: p['batch_id'],
+    ),
+}
+
+
+def __buffer_key__(event_name: str) -> str:
+    return f'events:{event_name}'
+
+
+def publish(event_name: str, payload: Payload):
+    publish_many(event_name, [payload])
+
+
+def publish_many(event_name: str, payloads: List[Payload]):
+    assert event_name in BATCHED_EVENTS
+
+    if not payloads:
+        return
+
+    key = __buffer_key__(event_name)
+
+    with current_app.redis.pipeline() as pipe:
+        pipe.rpush(key, *map(json.dumps, payloads))
+        # Bounds the buffer, dropping the oldest events, when it is not
+        # being drained
+        pipe.ltrim(key, -MAX_BUFFERED_EVENTS, -1)
+        pipe.execute()
+
+
+def coalesce(event_name: str, payloads: List[Payload]) -> List[Payload]:
+    """
+    >>> coalesce('video_file_added', [
+    ...     {'video_name': 'a.mp4', 'processing_state': 'UPLOADED'},
+    ...     {'video_name': 'b.mp4', 'processing_state': 'UPLOADED'},
+    ...     {'video_name': 'a.mp4', 'processing_state': 'FINGERPRINTED'},
+    ... ])  # doctest: +NORMALIZE_WHITESPACE
+    [{'video_name': 'a.mp4', 'processing_state': 'FINGERPRINTED'},
+     {'video_name': 'b.mp4', 'processing_state': 'UPLOADED'}]
+    """
+    _, key = BATCHED_EVENTS[event_name]
+
+    return list({key(payload): payload for payload in payloads}.values())
+
+
+def drain(redis: Redis, event_name: str) -> List[Payload]:
+    key = __buffer_key__(event_name)
+
+    # Atomically, so that no event is published in between and lost
+    with redis.pipeline() as pipe:
+        pipe.lrange(key, 0, -1)
+        pipe.delete(key)
+        payloads, _ = pipe.execute()
+
+    return [json.loads(payload) for payload in payloads]
+
+
+def discard(redis: Redis):
+    redis.delete(*map(__buffer_key__, BATCHED_EVENTS.keys()))
+
+
+class EventFlusher:
+    def __init__(self, socketio: SocketIO, redis: Redis, interval: float):
+        self.socketio = socketio
+        self.redis = redis
+        self.interval = interval
+        self.subscribers = 0
+        self.started = False
+
+    def connect(self):
+        if self.subscribers == 0:
+            # Whatever happened while nobody was listening is reflected by
+            # the state the frontend fetches when it connects
+            discard(self.redis)
+
+        self.subscribers += 1
+
+        if not self.started:
+            self.started = True
+            self.socketio.start_background_task(self.run)
+
+    def disconnect(self):
+        self.subscribers = max(self.subscribers - 1, 0)
+
+    def flush(self) -> int:
+        if self.subscribers == 0:
+            discard(self.redis)
+            return 0
+
+        emitted = 0
+
+        for event_name, (batched_event_name, _) in BATCHED_EVENTS.items():
+            payloads = coalesce(event_name, drain(self.redis, event_name))
+
+            if payloads:
+                self.socketio.emit(batched_event_name, payloads)
+                emitted += len(payloads)
+
+        return emitted
+
+    def run(self):
+        while True:
+            self.socketio.sleep(self.interval)
+
+            try:
+                emitted = self.flush()
+
+                if emitted > 0:
+                    logger.trace(f'Emitted {emitted} events')
+            except Exception:
+                logger.exception('Could not flush events')
+
+
+def init_app(app, socketio: SocketIO):
+    flusher = EventFlusher(socketio, app.redis, EVENT_FLUSH_INTERVAL)
+
+    socketio.on_event('connect', flusher.connect)
+    socketio.on_event('disconnect', flusher.disconnect)
@@ -1,18 +1,33 @@
+import os
+import statistics
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List, Set, Tuple
 
 import click
 import sqlalchemy
 from flask import current_app
 from flask.cli import FlaskGroup
 from loguru import logger
-from rq import Connection, Worker
+from rq import Connection
+from sqlalchemy.dialects import postgresql
 
 import middleware.models.video_file as video_file
 
 from . import create_app
 from .models import db
+from .models.fingerprint_collection import FingerprintCollectionModel
+from .models.fingerprint_comparison_computation import FingerprintComparisonComputation
 from .models.video_file import VideoFile
+from .queues import SessionWorker, WeightedWorker
+from .routes.fingerprint import (
+    comparison_totals,
+    comparison_totals_per_match_level,
+    comparisons_between,
+)
+from .services import capacity, retrieval
+from .services.fingerprint import archive_comparisons, resume_stalled_extractions
+from .supervisor import RecyclingWorker, Supervisor
 
 
 cli = FlaskGroup(create_app=create_app)
@@ -28,27 +43,92 @@ def get_videos_in_directory(video_directory: Path) -> List[Path]:
     return video_files
 
 
-def insert_videos_from_directory(file_path: Path, video_file_instantiator):
-    file_paths = get_videos_in_directory(file_path)
+# Rows per statement when seeding, which keeps the number of parameters of
+# a statement below the limit of PostgreSQL (65535)
+SEED_CHUNK_SIZE = 5000
+
+
+def chunks(xs: List, n: int):
+    for i in range(0, len(xs), n):
+        yield xs[i : i + n]
+
+
+def existing_video_names(video_names: List[str]) -> Set[str]:
+    existing: Set[str] = set()
+
+    for chunk in chunks(video_names, SEED_CHUNK_SIZE):
+        query = db.session.query(VideoFile.video_name).filter(
+            VideoFile.video_name.in_(chunk)
+        )
+        existing.update(video_name for (video_name,) in query)
+
+    return existing
+
 
-    for f in file_paths:
-        insert_video(f, video_file_instantiator)
+def insert_videos(file_paths: List[Path], video_file_instantiator):
+    """
+    Inserts the video files that are not already in the database in a single
+    transaction, and then enqueues the extraction of all of them at once
+    """
+    for file_path in file_paths:
+        if not file_path.exists():
+            logger.error(f'{file_path.name} could not be inserted. Could not find file')
 
+    # Keyed by name, which has to be unique, the first path of a name wins
+    file_paths_by_name: Dict[str, Path] = {}
+    for f in filter(Path.exists, file_paths):
+        file_paths_by_name.setdefault(f.name, f)
 
-def insert_video(file_path: Path, video_file_instantiator):
-    if not file_path.exists():
-        logger.error(f'{file_path.name} could not be inserted. Could not find file')
+    existing = existing_video_names(list(file_paths_by_name.keys()))
+
+    for video_name in existing:
+        logger.warning(f'{video_name} already in database, skipping...')
+
+    new_video_files = [
+        video_file_instantiator(f)
+        for name, f in file_paths_by_name.items()
+        if name not in existing
+    ]
+
+    if not new_video_files:
         return
 
-    try:
-        db_video_file = video_file_instantiator(file_path)
-        db.session.add(db_video_file)
-        video_file.after_insert(db_video_file)
-        db.session.commit()
-    except sqlalchemy.exc.IntegrityError as e:
-        logger.warning(f'{file_path.name} already in database, skipping...')
-        db.session.rollback()
-        logger.trace(e)
+    columns = [
+        'video_name',
+        'display_name',
+        'file_path',
+        'processing_state',
+        'file_type',
+        'fingerprinted_segments',
+    ]
+
+    rows = [{c: getattr(vf, c) for c in columns} for vf in new_video_files]
+
+    for chunk in chunks(rows, SEED_CHUNK_SIZE):
+        # A video inserted concurrently since the names were checked is skipped
+        statement = (
+            postgresql.insert(VideoFile.__table__)
+            .values(chunk)
+            .on_conflict_do_nothing(index_elements=['video_name'])
+        )
+        db.session.execute(statement)
+
+    db.session.commit()
+
+    logger.info(f'Inserted {len(rows)} videos')
+
+    # Reloaded, for their primary keys and timestamps
+    inserted: List[VideoFile] = []
+    for chunk in chunks([row['video_name'] for row in rows], SEED_CHUNK_SIZE):
+        inserted.extend(
+            db.session.query(VideoFile).filter(VideoFile.video_name.in_(chunk))
+        )
+
+    video_file.after_bulk_insert(inserted)
+
+
+def insert_videos_from_directory(file_path: Path, video_file_instantiator):
+    insert_videos(get_videos_in_directory(file_path), video_file_instantiator)
 
 
 def insert_videos_from_file(file_with_filepaths: Path, video_file_instantiator):
@@ -57,8 +137,8 @@ def insert_videos_from_file(file_with_filepaths: Path, video_file_instantiator):
     with file_with_filepaths.open() as f:
         content = f.read().splitlines()
 
-    for line in content:
-        insert_video(Path(line), video_file_instantiator)
+    file_paths = [Path(line) for line in content if line.strip() != '']
+    insert_videos(file_paths, video_file_instantiator)
 
 
 @cli.command('recreate_db')
@@ -66,22 +146,354 @@ def recreate_db():
     db.drop_all()
     db.create_all()
     db.session.commit()
+    video_file.invalidate_listings()
+
+
+def compile_query(query) -> str:
+    statement = query.statement.compile(
+        dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}
+    )
+
+    # Colons in the (literal) video names must not be taken for parameters
+    return str(statement).replace(':', '\\:')
+
+
+def explain(query) -> str:
+    sql = compile_query(query)
+    rows = db.session.execute(sqlalchemy.text(f'EXPLAIN (ANALYZE, BUFFERS) {sql}'))
+
+    return '\n'.join(row[0] for row in rows)
+
+
+def execution_time(query) -> float:
+    """
+    Returns the time, in milliseconds, that PostgreSQL took to execute the
+    query, i.e. excluding planning and the transfer of the result
+    """
+    sql = compile_query(query)
+    (plan,) = db.session.execute(
+        sqlalchemy.text(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}')
+    ).scalar()
+
+    return plan['Execution Time']
+
+
+def lookup_queries(query_video_name, reference_video_name) -> Dict[str, Any]:
+    """
+    The queries behind the fingerprint routes and services for the given
+    videos
+    """
+    return {
+        'comparisons_between': comparisons_between(
+            query_video_name, reference_video_name
+        ),
+        'has_comparison': comparisons_between(
+            query_video_name, reference_video_name
+        ).limit(1),
+        'comparison_totals': comparison_totals(
+            [query_video_name], [reference_video_name]
+        ),
+        'comparison_totals_per_match_level': comparison_totals_per_match_level(
+            [query_video_name], [reference_video_name]
+        ),
+        'fingerprint_collections_for_video_with_name': db.session.query(
+            FingerprintCollectionModel
+        )
+        .filter_by(video_name=query_video_name)
+        .order_by(FingerprintCollectionModel.segment_id),
+    }
+
+
+@cli.command('explain_queries')
+@click.argument('query_video_name')
+@click.argument('reference_video_name')
+def explain_queries(query_video_name, reference_video_name):
+    """
+    Executes the queries behind the fingerprint routes and services for the
+    given videos and prints their plans, to verify that they use indexes
+    """
+    for name, query in lookup_queries(query_video_name, reference_video_name).items():
+        click.echo(f'-- {name}')
+        click.echo(explain(query))
+        click.echo()
+
+
+# The indexes that only serve the lookups, as opposed to those backing a
+# constraint, which benchmark_queries measures the queries without
+LOOKUP_INDEXES = ['ix_fingerprint_comparisons_matches']
+
+
+@cli.command('benchmark_queries')
+@click.argument('query_video_name')
+@click.argument('reference_video_name')
+@click.option(
+    '--repeat',
+    default=5,
+    show_default=True,
+    help='Executions of each query, of which the median is reported',
+)
+def benchmark_queries(query_video_name, reference_video_name, repeat):
+    """
+    Times the queries of explain_queries with and without LOOKUP_INDEXES,
+    and prints the median execution times next to the scans of their plans.
+
+    The indexes are dropped in a transaction that is rolled back, which
+    locks the tables until then, so this is not to be run against a
+    database that is in use.
+    """
+    queries = lookup_queries(query_video_name, reference_video_name)
+
+    def scan(query) -> str:
+        # The node that reads the table, which tells whether an index is used
+        plan = [line.strip(' ->') for line in explain(query).splitlines()]
+
+        return next((line for line in plan if 'Scan' in line), plan[0])
+
+    def measure() -> Dict[str, Tuple[float, str]]:
+        return {
+            name: (
+                statistics.median(execution_time(query) for _ in range(repeat)),
+                scan(query),
+            )
+            for name, query in queries.items()
+        }
+
+    with_indexes = measure()
+
+    try:
+        for index in LOOKUP_INDEXES:
+            db.session.execute(sqlalchemy.text(f'DROP INDEX {index}'))
+
+        without_indexes = measure()
+    finally:
+        db.session.rollback()
+
+    for name in queries:
+        before, before_plan = without_indexes[name]
+        after, after_plan = with_indexes[name]
+
+        click.echo(f'-- {name}: {before:.3f} ms -> {after:.3f} ms')
+        click.echo(f'   without: {before_plan}')
+        click.echo(f'   with:    {after_plan}')
+
+
+@cli.command('archive_comparisons')
+@click.option(
+    '--older-than',
+    default=30,
+    show_default=True,
+    help='Archive the pairs that were compared more than this many days ago',
+)
+def archive_old_comparisons(older_than):
+    cutoff = datetime.now() - timedelta(days=older_than)
+
+    pairs = (
+        db.session.query(
+            FingerprintComparisonComputation.query_video_name,
+            FingerprintComparisonComputation.reference_video_name,
+        )
+        .filter(FingerprintComparisonComputation.created_on < cutoff)
+        .distinct()
+        .all()
+    )
+
+    archived = sum(
+        archive_comparisons(query_video_name, reference_video_name)
+        for query_video_name, reference_video_name in pairs
+    )
+
+    logger.info(f'Archived the comparisons of {archived} pairs')
+
+
+@cli.command('resume_extractions')
+def resume_extractions():
+    """
+    Resumes the extractions that are unfinished but have no jobs left, e.g.
+    as a job of one of their ranges failed or timed out. Meant to be run
+    periodically
+    """
+    resumed = resume_stalled_extractions()
+
+    logger.info(f'Resumed {resumed} stalled extractions')
+
+
+@cli.command('capacity_report')
+@click.option(
+    '--workers',
+    default=1,
+    show_default=True,
+    help='The number of extractors to predict the drain time for',
+)
+def capacity_report(workers):
+    """
+    Fits the cost of extraction per second of video, by codec and
+    resolution, to the recorded computations and predicts how long it
+    takes to extract the videos that are yet to be fingerprinted
+    """
+    model = capacity.fit_computations()
+
+    click.echo('codec\tresolution\tcomputations\tseconds per video second')
+
+    for (codec, resolution), rate in sorted(model.rates.items()):
+        samples = model.samples[(codec, resolution)]
+        click.echo(f'{codec}\t{resolution}\t{samples}\t{rate:.3f}')
+
+    click.echo(f'all\tall\t{sum(model.samples.values())}\t{model.overall_rate:.3f}')
+    click.echo()
+
+    pending = capacity.pending_videos()
+    video_seconds = sum(p.remaining_duration for p in pending)
+    drain_time = capacity.drain_time(model, pending, workers)
+
+    click.echo(
+        f'{len(pending)} videos ({video_seconds:.0f} seconds of video) are pending,'
+        f' which {workers} extractor(s) are predicted to extract in'
+        f' {timedelta(seconds=round(drain_time))}'
+    )
+
+
+@cli.command('train_vocabulary')
+@click.option(
+    '--words', default=10000, show_default=True, help='The size of the vocabulary'
+)
+@click.option(
+    '--descriptors',
+    default=500000,
+    show_default=True,
+    help='The number of ORB descriptors to sample from the archive',
+)
+@click.option(
+    '--iterations',
+    default=10,
+    show_default=True,
+    help='The maximum number of k-majority iterations',
+)
+def train_vocabulary(words, descriptors, iterations):
+    """
+    Trains a vocabulary of visual words on ORB descriptors sampled from the
+    archive, which segments are indexed with from then on. Run
+    index_visual_words to index the segments that are already fingerprinted
+    """
+    model = retrieval.train_vocabulary(words, descriptors, iterations)
+
+    logger.info(f'Trained vocabulary {model.pk} of {model.number_of_words} words')
+
+
+@cli.command('index_visual_words')
+def index_visual_words():
+    """
+    Indexes the segments of all fingerprinted videos with the most recently
+    trained vocabulary, see services.retrieval
+    """
+    video_names = [
+        video_name
+        for (video_name,) in db.session.query(FingerprintCollectionModel.video_name)
+        .distinct()
+        .order_by(FingerprintCollectionModel.video_name)
+    ]
+
+    indexed = sum(retrieval.index_video(video_name) for video_name in video_names)
+
+    logger.info(f'Indexed {indexed} segments of {len(video_names)} videos')
+
+
+class Extractor(SessionWorker, WeightedWorker):
+    pass
 
 
 @cli.command('run_extractor')
 def run_extractor():
     with Connection(current_app.redis):
-        worker = Worker(current_app.extract_queue)
+        # Ordered by priority, see queues.EXTRACT_QUEUE_NAMES
+        queues = list(current_app.extract_queues.values())
+        weights = current_app.config['EXTRACT_QUEUE_WEIGHTS']
+
+        worker = Extractor(queues, weights)
         worker.work()
 
 
 @cli.command('run_comparator')
 def run_comparator():
     with Connection(current_app.redis):
-        worker = Worker(current_app.compare_queue)
+        worker = SessionWorker(current_app.compare_queue)
         worker.work()
 
 
+def supervise(
+    worker_class, queues, workers, max_jobs, max_memory, threads, **worker_kwargs
+):
+    # Megabytes to bytes
+    worker_class.max_memory = max_memory * 1024 * 1024
+
+    def create_worker():
+        return worker_class(queues, connection=current_app.redis, **worker_kwargs)
+
+    Supervisor(create_worker, workers, max_jobs, threads).run()
+
+
+def supervisor_options(f):
+    options = [
+        click.option(
+            '--workers',
+            default=os.cpu_count(),
+            show_default=True,
+            help='The number of workers',
+        ),
+        click.option(
+            '--max-jobs',
+            default=100,
+            show_default=True,
+            help='Jobs to execute before a worker is replaced',
+        ),
+        click.option(
+            '--max-memory',
+            default=2048,
+            show_default=True,
+            help='Megabytes a worker may use before it is replaced',
+        ),
+        click.option(
+            '--threads',
+            default=1,
+            show_default=True,
+            help='Threads per worker for OpenCV and BLAS',
+        ),
+    ]
+
+    for option in reversed(options):
+        f = option(f)
+
+    return f
+
+
+class SupervisedExtractor(RecyclingWorker, WeightedWorker):
+    pass
+
+
+@cli.command('supervise_extractors')
+@supervisor_options
+def supervise_extractors(workers, max_jobs, max_memory, threads):
+    queues = list(current_app.extract_queues.values())
+    weights = current_app.config['EXTRACT_QUEUE_WEIGHTS']
+
+    supervise(
+        SupervisedExtractor,
+        queues,
+        workers,
+        max_jobs,
+        max_memory,
+        threads,
+        weights=weights,
+    )
+
+
+@cli.command('supervise_comparators')
+@supervisor_options
+def supervise_comparators(workers, max_jobs, max_memory, threads):
+    queues = [current_app.compare_queue]
+
+    supervise(RecyclingWorker, queues, workers, max_jobs, max_memory, threads)
+
+
 @cli.command('seed_query_videos')
 def seed_query_videos():
     uploads_file = current_app.config['UPLOADS_FILE']
@@ -0,0 +1,75 @@
+"""
+The stage timings of every extraction and comparison, aggregated across
+all workers in Redis and exposed in the Prometheus text format, see
+routes/metrics.py.
+
+Each profiled stage is stored as a hash of the bucket counts of its
+histogram, along with the total duration, which the jobs increment when
+they finish. The buckets are fixed, see video_reuse_detector.profiling,
+hence histograms from any number of jobs add up.
+"""
+from typing import Dict
+
+from flask import current_app
+from redis import Redis
+
+from video_reuse_detector.profiling import Histogram, Profile, to_prometheus
+
+
+METRIC_NAME = 'video_reuse_detector_stage_duration_seconds'
+
+STAGES_KEY = 'metrics:stages'
+
+
+def __stage_key__(stage: str) -> str:
+    return f'metrics:stage:{stage}'
+
+
+def record(profile: Profile):
+    if not profile.histograms:
+        return
+
+    with current_app.redis.pipeline() as pipe:
+        for stage, histogram in profile.histograms.items():
+            key = __stage_key__(stage)
+
+            pipe.sadd(STAGES_KEY, stage)
+            pipe.hincrbyfloat(key, 'total', histogram.total)
+
+            for i, n in enumerate(histogram.counts):
+                if n > 0:
+                    pipe.hincrby(key, str(i), n)
+
+        pipe.execute()
+
+
+def histograms(redis: Redis) -> Dict[str, Histogram]:
+    stages = sorted(s.decode('utf-8') for s in redis.smembers(STAGES_KEY))
+
+    with redis.pipeline() as pipe:
+        for stage in stages:
+            pipe.hgetall(__stage_key__(stage))
+
+        fields = pipe.execute()
+
+    result = {}
+
+    for stage, stage_fields in zip(stages, fields):
+        histogram = Histogram()
+        histogram.total = float(stage_fields.pop(b'total', 0.0))
+
+        for i, n in stage_fields.items():
+            histogram.counts[int(i)] = int(n)
+
+        result[stage] = histogram
+
+    return result
+
+
+def reset(redis: Redis):
+    stages = [s.decode('utf-8') for s in redis.smembers(STAGES_KEY)]
+    redis.delete(STAGES_KEY, *map(__stage_key__, stages))
+
+
+def render(redis: Redis) -> str:
+    return to_prometheus(histograms(redis), METRIC_NAME)
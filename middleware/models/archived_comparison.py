@@ -0,0 +1,120 @@
+import io
+from typing import List
+
+import numpy as np
+from flask_admin.contrib.sqla import ModelView
+
+from .. import admin
+from . import db
+from .fingerprint_comparison import FingerprintComparisonModel
+
+
+# The columns of a comparison that are stored as one array each. The video
+# names are the same for every comparison of a pair and are stored once, as
+# columns of the archive itself
+ARCHIVED_COLUMNS = {
+    'query_segment_id': np.int32,
+    'reference_segment_id': np.int32,
+    'match_level': np.str_,
+    'similarity_score': np.float64,
+    'similar_enough_th': np.bool_,
+    'could_compare_cc': np.bool_,
+    'similar_enough_cc': np.bool_,
+    'could_compare_orb': np.bool_,
+    'similar_enough_orb': np.bool_,
+    'query_run_length': np.int32,
+    'reference_run_length': np.int32,
+}
+
+# The value of the columns that were added after archives were first
+# written, for the archives that lack them
+DEFAULTS = {'query_run_length': 1, 'reference_run_length': 1}
+
+
+def __value_of__(model: FingerprintComparisonModel, column: str):
+    # Column defaults are only applied once a model is inserted
+    value = getattr(model, column)
+    return DEFAULTS[column] if value is None and column in DEFAULTS else value
+
+
+class ArchivedComparisonModel(db.Model):  # type: ignore
+    """
+    All the comparisons between a pair of videos, compressed into a single
+    blob. Archiving the pairs that are no longer being looked at keeps the
+    fingerprint_comparisons table, and its indexes, small.
+    """
+
+    __tablename__ = 'archived_fingerprint_comparisons'
+
+    pk = db.Column(db.Integer(), primary_key=True)
+
+    query_video_name = db.Column(db.String())
+    reference_video_name = db.Column(db.String())
+
+    number_of_comparisons = db.Column(db.Integer())
+    comparisons = db.Column(db.LargeBinary())  # numpy .npz
+    archived_on = db.Column(db.DateTime, server_default=db.func.now())
+
+    __table_args__ = (db.UniqueConstraint('query_video_name', 'reference_video_name'),)
+
+    @staticmethod
+    def from_comparison_models(
+        models: List[FingerprintComparisonModel],
+    ) -> 'ArchivedComparisonModel':
+        assert len(models) > 0
+
+        first = models[0]
+        assert all(
+            m.query_video_name == first.query_video_name
+            and m.reference_video_name == first.reference_video_name
+            for m in models
+        )
+
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            **{
+                column: np.array(
+                    [__value_of__(m, column) for m in models], dtype=dtype
+                )
+                for column, dtype in ARCHIVED_COLUMNS.items()
+            },
+        )
+
+        return ArchivedComparisonModel(
+            query_video_name=first.query_video_name,
+            reference_video_name=first.reference_video_name,
+            number_of_comparisons=len(models),
+            comparisons=buffer.getvalue(),
+        )
+
+    def to_comparison_models(self) -> List[FingerprintComparisonModel]:
+        """
+        Returns the archived comparisons as transient models, i.e. models
+        that are not part of the session, without primary keys
+        """
+        n = self.number_of_comparisons
+
+        with np.load(io.BytesIO(self.comparisons)) as arrays:
+            columns = {
+                column: arrays[column].tolist()
+                if column in arrays
+                else [DEFAULTS[column]] * n
+                for column in ARCHIVED_COLUMNS
+            }
+
+        return [
+            FingerprintComparisonModel(
+                query_video_name=self.query_video_name,
+                reference_video_name=self.reference_video_name,
+                **{column: values[i] for column, values in columns.items()},
+            )
+            for i in range(n)
+        ]
+
+
+class ArchivedComparisonView(ModelView):
+    column_exclude_list = ['comparisons']
+
+
+admin.add_view(ArchivedComparisonView(ArchivedComparisonModel, db.session))
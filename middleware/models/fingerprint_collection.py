@@ -3,9 +3,11 @@ import base64
 import numpy as np
 from loguru import logger
 
+from video_reuse_detector import phash
 from video_reuse_detector.color_correlation import ColorCorrelation
 from video_reuse_detector.fingerprint import FingerprintCollection
 from video_reuse_detector.orb import ORB
+from video_reuse_detector.ssm import SSM
 from video_reuse_detector.thumbnail import Thumbnail
 
 from . import db
@@ -35,17 +37,62 @@ class FingerprintCollectionModel(db.Model):  # type: ignore
     #
     # keyframe = db.Column(sa.String())
     video_name = db.Column(db.String())
+    # Videos are looked up by name, the key only removes the fingerprints
+    # of a video along with it
+    video_id = db.Column(
+        db.Integer(), db.ForeignKey('video_file.pk', ondelete='CASCADE'), index=True
+    )
     segment_id = db.Column(db.Integer())
     thumbnail = db.Column(db.LargeBinary())  # base64
     color_correlation = db.Column(db.BigInteger())
     orb = db.Column(db.ARRAY(db.Integer(), dimensions=2))
-
-    def __init__(self, video_name, segment_id, thumbnail, color_correlation, orb):
+    # See SSM.to_bytes, NULL for silent segments and videos without audio
+    ssm = db.Column(db.LargeBinary())
+    # The number of consecutive segments, starting at segment_id, that the
+    # fingerprints represent, see FingerprintCollection
+    run_length = db.Column(db.Integer(), nullable=False, default=1)
+    # See FingerprintCollection.informative
+    informative = db.Column(db.Boolean(), nullable=False, default=True)
+    # See video_reuse_detector.phash. The chunks of the hash are indexed
+    # separately, to look up the near-duplicates of a hash, see
+    # services.lookup
+    phash = db.Column(db.BigInteger())
+    phash_0 = db.Column(db.Integer(), index=True)
+    phash_1 = db.Column(db.Integer(), index=True)
+    phash_2 = db.Column(db.Integer(), index=True)
+    phash_3 = db.Column(db.Integer(), index=True)
+
+    # Extraction is checkpointed, and resumed, segment range by segment
+    # range. This guarantees that a resumed extraction never duplicates
+    # the segments of a previous attempt. The constraint also doubles as
+    # the (video_name, segment_id) index every lookup by name goes through
+    __table_args__ = (db.UniqueConstraint('video_name', 'segment_id'),)
+
+    def __init__(
+        self,
+        video_name,
+        segment_id,
+        thumbnail,
+        color_correlation,
+        orb,
+        ssm=None,
+        run_length=1,
+        informative=True,
+        perceptual_hash=None,
+    ):
         self.video_name = video_name
         self.segment_id = segment_id
         self.thumbnail = thumbnail
         self.color_correlation = color_correlation
         self.orb = orb
+        self.ssm = ssm
+        self.run_length = run_length
+        self.informative = informative
+        self.phash = perceptual_hash
+
+        if perceptual_hash is not None:
+            chunks = phash.chunks(perceptual_hash)
+            self.phash_0, self.phash_1, self.phash_2, self.phash_3 = chunks
 
     def __repr__(self):
         return '<pk {}>'.format(self.pk)
@@ -58,6 +105,10 @@ class FingerprintCollectionModel(db.Model):  # type: ignore
             'thumbnail': self.thumbnail,
             'color_correlation': self.color_correlation,
             'orb': self.orb,
+            'ssm': self.ssm,
+            'run_length': self.run_length,
+            'informative': self.informative,
+            'phash': self.phash,
         }
 
     def to_fingerprint_collection(self) -> FingerprintCollection:
@@ -86,9 +137,18 @@ class FingerprintCollectionModel(db.Model):  # type: ignore
         cc = ColorCorrelation.from_number(self.color_correlation)
 
         orb = ORB(np.array(self.orb, dtype=np.uint8).tolist()) if self.orb else None
+        ssm = SSM.from_bytes(self.ssm) if self.ssm is not None else None
 
         return FingerprintCollection(
-            Thumbnail(thumbnail), cc, orb, self.video_name, self.segment_id,
+            Thumbnail(thumbnail),
+            cc,
+            orb,
+            self.video_name,
+            self.segment_id,
+            ssm,
+            self.run_length or 1,
+            self.informative is not False,
+            self.phash,
         )
 
     @staticmethod
@@ -107,6 +167,16 @@ class FingerprintCollectionModel(db.Model):  # type: ignore
         if fpc.orb is not None:
             orb = fpc.orb.descriptors.tolist()
 
+        ssm = fpc.ssm.to_bytes() if fpc.ssm is not None else None
+
         return FingerprintCollectionModel(
-            video_name, segment_id, encoded, color_correlation, orb
+            video_name,
+            segment_id,
+            encoded,
+            color_correlation,
+            orb,
+            ssm,
+            fpc.run_length,
+            fpc.informative,
+            fpc.phash,
         )
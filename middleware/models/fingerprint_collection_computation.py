@@ -12,6 +12,27 @@ class FingerprintCollectionComputation(db.Model):  # type: ignore
     video_duration = db.Column(db.Float())
     processing_time = db.Column(db.Float())
 
+    # The first video stream, to gauge how the size and encoding of a video
+    # affect the processing time, see services.capacity
+    codec = db.Column(db.String())
+    width = db.Column(db.Integer())
+    height = db.Column(db.Integer())
+    frame_rate = db.Column(db.Float())
+
+    # The number of frames decoded (at the sampling rate, not that of the
+    # video) and of keyframes produced. Only counted while profiling
+    frames_decoded = db.Column(db.Integer())
+    keyframes = db.Column(db.Integer())
+
+    # The highest peak resident set size (in bytes) of the workers that
+    # extracted the video. Workers outlive their jobs, so this is an upper
+    # bound on what the extraction itself required
+    peak_memory_usage = db.Column(db.BigInteger())
+
+    # The count, total, p50 and p95 duration (in seconds) of every profiled
+    # stage, see video_reuse_detector.profiling
+    stage_timings = db.Column(db.JSON())
+
 
 class FingerprintCollectionComputationView(ModelView):
     can_export = True
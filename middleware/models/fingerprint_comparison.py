@@ -1,17 +1,21 @@
 from flask_admin.contrib.sqla import ModelView
+from sqlalchemy import DDL, event
 
 from video_reuse_detector.fingerprint import FingerprintComparison, MatchLevel
 
 from .. import admin
+from ..config import COMPARISON_PARTITIONS
 from . import db, ma
 
 
 class FingerprintComparisonModel(db.Model):  # type: ignore
     __tablename__ = 'fingerprint_comparisons'
 
-    pk = db.Column(db.Integer(), primary_key=True)
+    # The table is partitioned by the query video, and the partition key
+    # has to be part of the primary key
+    pk = db.Column(db.Integer(), primary_key=True, autoincrement=True)
 
-    query_video_name = db.Column(db.String())
+    query_video_name = db.Column(db.String(), primary_key=True)
     reference_video_name = db.Column(db.String())
     query_segment_id = db.Column(db.Integer())
     reference_segment_id = db.Column(db.Integer())
@@ -24,6 +28,12 @@ class FingerprintComparisonModel(db.Model):  # type: ignore
     could_compare_orb = db.Column(db.Boolean())
     similar_enough_orb = db.Column(db.Boolean())
 
+    # The number of segments the compared fingerprints represent, i.e. the
+    # comparison stands for the comparisons of all of them, see
+    # FingerprintComparison.expand
+    query_run_length = db.Column(db.Integer(), nullable=False, default=1)
+    reference_run_length = db.Column(db.Integer(), nullable=False, default=1)
+
     __table_args__ = (
         db.UniqueConstraint(
             'query_video_name',
@@ -31,6 +41,22 @@ class FingerprintComparisonModel(db.Model):  # type: ignore
             'query_segment_id',
             'reference_segment_id',
         ),
+        # Only the matches, i.e. rows with a nonzero score, are ever read
+        # back. The columns are those the summaries group by, so those can
+        # be answered by an index-only scan
+        db.Index(
+            'ix_fingerprint_comparisons_matches',
+            'query_video_name',
+            'reference_video_name',
+            'match_level',
+            'query_segment_id',
+            'query_run_length',
+            'reference_run_length',
+            postgresql_where=similarity_score > 0,
+        ),
+        # All the comparisons of a pair end up in the same partition, so
+        # deleting or replacing them touches a single, small, table
+        {'postgresql_partition_by': 'HASH (query_video_name)'},
     )
 
     def to_fingerprint_comparison(self) -> FingerprintComparison:
@@ -46,6 +72,8 @@ class FingerprintComparisonModel(db.Model):  # type: ignore
             self.similar_enough_cc,
             self.could_compare_orb,
             self.similar_enough_orb,
+            self.query_run_length or 1,
+            self.reference_run_length or 1,
         )
 
     @staticmethod
@@ -62,9 +90,22 @@ class FingerprintComparisonModel(db.Model):  # type: ignore
             similar_enough_cc=fc.similar_enough_cc,
             could_compare_orb=fc.could_compare_orb,
             similar_enough_orb=fc.could_compare_orb,
+            query_run_length=fc.query_run_length,
+            reference_run_length=fc.reference_run_length,
         )
 
 
+for remainder in range(COMPARISON_PARTITIONS):
+    event.listen(
+        FingerprintComparisonModel.__table__,
+        'after_create',
+        DDL(
+            f'CREATE TABLE %(table)s_{remainder} PARTITION OF %(table)s'
+            f' FOR VALUES WITH (MODULUS {COMPARISON_PARTITIONS}, REMAINDER {remainder})'  # noqa: E501
+        ).execute_if(dialect='postgresql'),
+    )
+
+
 class FingerprintComparisonSchema(ma.ModelSchema):
     class Meta:
         model = FingerprintComparisonModel
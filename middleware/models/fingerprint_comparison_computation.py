@@ -1,14 +1,9 @@
 from flask_admin.contrib.sqla import ModelView
-from flask_socketio import SocketIO
 
-from .. import admin
-from ..config import Config
+from .. import admin, events
 from . import db
 
 
-socketio = SocketIO(message_queue=Config.REDIS_URL)
-
-
 class FingerprintComparisonComputation(db.Model):  # type: ignore
     __tablename__ = 'fingerprint_comparison_computation'
 
@@ -21,9 +16,14 @@ class FingerprintComparisonComputation(db.Model):  # type: ignore
 
     processing_time = db.Column(db.Float())
 
+    # See FingerprintCollectionComputation.stage_timings
+    stage_timings = db.Column(db.JSON())
+
+    created_on = db.Column(db.DateTime, server_default=db.func.now())
+
 
 def after_insert(fpcc):
-    socketio.emit(
+    events.publish(
         'comparison_computation_completed',
         {
             'query_video_name': fpcc.query_video_name,
@@ -32,4 +32,8 @@ def after_insert(fpcc):
     )
 
 
+def after_batch_completed(batch_id: str):
+    events.publish('comparison_batch_completed', {'batch_id': batch_id})
+
+
 admin.add_view(ModelView(FingerprintComparisonComputation, db.session))
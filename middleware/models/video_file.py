@@ -1,21 +1,18 @@
 from enum import Enum, auto
 from pathlib import Path
+from typing import List, Optional
 
 from flask import current_app
 from flask_admin.contrib.sqla import ModelView
-from flask_socketio import SocketIO
 from loguru import logger
 from marshmallow_enum import EnumField
 
-from .. import admin
-from ..config import Config
-from ..services.fingerprint import extract_fingerprints
+from .. import admin, events
+from ..queues import Priority, extract_queue
+from ..services.fingerprint import plan_extraction
 from . import db, ma
 
 
-socketio = SocketIO(message_queue=Config.REDIS_URL)
-
-
 class VideoFileType(Enum):
     QUERY = auto()
     REFERENCE = auto()
@@ -38,6 +35,8 @@ class VideoFileState(Enum):
     NOT_FINGERPRINTED = auto()
     FINGERPRINTED = auto()
     UPLOADED = auto()
+    PARTIALLY_FINGERPRINTED = auto()
+    UPLOADING = auto()
 
 
 class VideoFile(db.Model):  # type: ignore
@@ -46,12 +45,20 @@ class VideoFile(db.Model):  # type: ignore
     video_name = db.Column(db.String(), unique=True)
     display_name = db.Column(db.Unicode())
 
-    # TODO: Add video_duration = db.Column(db.Float()) and
-    # have computations have a FK to here
+    # TODO: Have computations have a FK to here
     file_path = db.Column(db.String())
     processing_state = db.Column(db.Enum(VideoFileState))
     file_type = db.Column(db.Enum(VideoFileType))
 
+    # The SHA-256 of the contents of uploaded videos, to reject duplicates
+    # uploaded under another name
+    content_hash = db.Column(db.String(64), unique=True)
+
+    # Set when extraction starts, and the number of segments for which
+    # fingerprints have been committed so far, to track progress
+    video_duration = db.Column(db.Float())
+    fingerprinted_segments = db.Column(db.Integer(), default=0)
+
     created_on = db.Column(db.DateTime, server_default=db.func.now())
     updated_on = db.Column(
         db.DateTime,
@@ -73,13 +80,30 @@ class VideoFile(db.Model):  # type: ignore
         self.file_path = str(file_path)
         self.processing_state = VideoFileState.NOT_FINGERPRINTED
         self.file_type = file_type
+        self.fingerprinted_segments = 0
 
     def mark_as_fingerprinted(self):
         self.processing_state = VideoFileState.FINGERPRINTED
 
+    def mark_as_uploaded(self):
+        if self.file_type == VideoFileType.QUERY:
+            self.processing_state = VideoFileState.UPLOADED
+        else:
+            self.processing_state = VideoFileState.NOT_FINGERPRINTED
+
     def is_fingerprinted(self):
         return self.processing_state == VideoFileState.FINGERPRINTED
 
+    def extraction_priority(self) -> Priority:
+        """
+        Query videos are compared against the archive as soon as they are
+        available, whereas reference videos are typically part of a backfill
+        """
+        if self.file_type == VideoFileType.QUERY:
+            return Priority.HIGH
+
+        return Priority.LOW
+
     @staticmethod
     def from_upload(file_path: Path, display_name: str = '') -> 'VideoFile':
         video_file = VideoFile(file_path, VideoFileType.QUERY, display_name)
@@ -95,44 +119,67 @@ class VideoFile(db.Model):  # type: ignore
         return f'VideoFile={VideoFileSchema().dumps(self)}'
 
 
-def after_insert(video_file):
+def after_insert(
+    video_file, priority: Optional[Priority] = None, depends_on: Optional[str] = None
+):
+    """
+    Enqueues the extraction of the video, once the job with the given id,
+    if any, is done
+    """
     emit_event(video_file, 'video_file_added')
 
+    if priority is None:
+        priority = video_file.extraction_priority()
+
     file_path = video_file.file_path
 
     logger.info(
         f'Extracting fingerprints for "{file_path}" after insertion of "{video_file}""'  # noqa: E501
     )
 
-    extract_job = current_app.extract_queue.enqueue(
-        extract_fingerprints, file_path, job_timeout=6000
+    # Splits the extraction into jobs that are processed in parallel, the
+    # last of which marks the video as done
+    extract_queue(priority).enqueue(
+        plan_extraction, file_path, priority.value, depends_on=depends_on
     )
 
-    # Important to enqueue at front otherwise the UI is not notified until
-    # the entire set of videos available at start-up has been processed.
-    current_app.extract_queue.enqueue(
-        mark_as_done, file_path, depends_on=extract_job, at_front=True
-    )
 
+# Bumped whenever a video file is added or changes state, which invalidates
+# all the cached listings, see services.files.cached_listing
+LISTING_VERSION_KEY = 'files:list:version'
+
+
+def invalidate_listings():
+    current_app.redis.incr(LISTING_VERSION_KEY)
 
-def __mark_as_done__(file_path: Path):
-    video_name = file_path.name
-    logger.success(f'Marking "{video_name}" as fingerprinted')
 
-    video_file = db.session.query(VideoFile).filter_by(video_name=video_name).first()
-    video_file.mark_as_fingerprinted()
-    db.session.commit()
+def after_bulk_insert(video_files: List[VideoFile]):
+    """
+    As after_insert, for many video files at once, using a single pipeline
+    to enqueue the extractions
+    """
+    events.publish_many(
+        'video_file_added', [video_file_schema.dump(vf) for vf in video_files]
+    )
+    invalidate_listings()
+
+    with current_app.redis.pipeline() as pipe:
+        for vf in video_files:
+            priority = vf.extraction_priority()
+            queue = extract_queue(priority)
 
-    emit_event(video_file, 'video_file_fingerprinted')
+            job = queue.create_job(plan_extraction, args=(vf.file_path, priority.value))
+            queue.enqueue_job(job, pipeline=pipe)
 
+        pipe.execute()
 
-def mark_as_done(file_path: str):
-    __mark_as_done__(Path(file_path))
+    logger.info(f'Enqueued the extraction of {len(video_files)} videos')
 
 
 def emit_event(video_file: VideoFile, event_name: str):
     logger.trace(f'Emitting "{event_name}" for {str(video_file)}')
-    socketio.emit(event_name, VideoFileSchema().dump(video_file))
+    events.publish(event_name, video_file_schema.dump(video_file))
+    invalidate_listings()
 
 
 admin.add_view(ModelView(VideoFile, db.session))
@@ -144,3 +191,6 @@ class VideoFileSchema(ma.ModelSchema):
 
     class Meta:
         model = VideoFile
+
+
+video_file_schema = VideoFileSchema()
@@ -0,0 +1,63 @@
+from flask_admin.contrib.sqla import ModelView
+
+from video_reuse_detector.vocabulary import Vocabulary
+
+from .. import admin
+from . import db
+
+
+class VisualVocabularyModel(db.Model):  # type: ignore
+    """
+    A vocabulary of visual words, see video_reuse_detector.vocabulary. The
+    most recently trained vocabulary is the one segments are indexed with
+    """
+
+    __tablename__ = 'visual_vocabularies'
+
+    pk = db.Column(db.Integer(), primary_key=True)
+    number_of_words = db.Column(db.Integer())
+    words = db.Column(db.LargeBinary())  # See Vocabulary.to_bytes
+    trained_on = db.Column(db.DateTime, server_default=db.func.now())
+
+    def to_vocabulary(self) -> Vocabulary:
+        return Vocabulary.from_bytes(self.words)
+
+
+class VisualWordModel(db.Model):  # type: ignore
+    """
+    The inverted file of a vocabulary, i.e. the segments that each of its
+    words occurs in, with the term frequency of the word in the segment
+    """
+
+    __tablename__ = 'visual_words'
+
+    pk = db.Column(db.Integer(), primary_key=True)
+    vocabulary_id = db.Column(
+        db.Integer(),
+        db.ForeignKey('visual_vocabularies.pk', ondelete='CASCADE'),
+        nullable=False,
+    )
+    word_id = db.Column(db.Integer(), nullable=False)
+    video_name = db.Column(db.String())
+    video_id = db.Column(
+        db.Integer(), db.ForeignKey('video_file.pk', ondelete='CASCADE'), index=True
+    )
+    segment_id = db.Column(db.Integer())
+    frequency = db.Column(db.Float())
+
+    __table_args__ = (
+        # The postings of a word, which is what a retrieval looks up
+        db.Index('ix_visual_words_word', 'vocabulary_id', 'word_id'),
+        # The words of a video, to index it anew, and the indexed segments,
+        # i.e. the documents of the inverse document frequencies
+        db.Index(
+            'ix_visual_words_video', 'vocabulary_id', 'video_name', 'segment_id'
+        ),
+    )
+
+
+class VisualVocabularyView(ModelView):
+    column_exclude_list = ['words']
+
+
+admin.add_view(VisualVocabularyView(VisualVocabularyModel, db.session))
@@ -0,0 +1,85 @@
+import random
+from enum import Enum
+from typing import Dict, List
+
+import rq
+from flask import current_app
+from redis import Redis
+
+from .models import db
+
+
+class Priority(Enum):
+    HIGH = 'high'
+    NORMAL = 'normal'
+    LOW = 'low'
+
+    def demote(self) -> 'Priority':
+        """
+        >>> Priority.HIGH.demote()
+        <Priority.NORMAL: 'normal'>
+
+        >>> Priority.LOW.demote()
+        <Priority.LOW: 'low'>
+        """
+        priorities = list(Priority)
+        return priorities[min(priorities.index(self) + 1, len(priorities) - 1)]
+
+
+# Ordered from the highest to the lowest priority. The normal priority keeps
+# the name of the original (and only) extract queue
+EXTRACT_QUEUE_NAMES = {
+    Priority.HIGH: 'extract_high',
+    Priority.NORMAL: 'extract',
+    Priority.LOW: 'extract_low',
+}
+
+
+def create_extract_queues(connection: Redis) -> Dict[Priority, rq.Queue]:
+    return {
+        priority: rq.Queue(name, connection=connection)
+        for priority, name in EXTRACT_QUEUE_NAMES.items()
+    }
+
+
+def extract_queue(priority: Priority = Priority.NORMAL) -> rq.Queue:
+    return current_app.extract_queues[priority]
+
+
+class SessionWorker(rq.SimpleWorker):
+    """
+    Executes its jobs in its own process, rather than in a work horse forked
+    per job, so that the connection pool of the worker is reused from one job
+    to the next. Every job gets a fresh session, which is removed, and its
+    connection returned to the pool, when the job is done.
+    """
+
+    def perform_job(self, job, queue, *args, **kwargs):
+        try:
+            return super().perform_job(job, queue, *args, **kwargs)
+        finally:
+            # Discards whatever a failed job left uncommitted as well
+            db.session.remove()
+
+
+class WeightedWorker(rq.Worker):
+    """
+    A worker that usually listens on its queues in the given order, i.e.
+    by priority, but starts with a lower priority queue with a probability
+    proportional to its weight. A steady stream of interactive jobs then
+    delays, rather than starves, the jobs of a backfill.
+    """
+
+    def __init__(self, queues: List[rq.Queue], weights: List[float], *args, **kwargs):
+        super().__init__(queues, *args, **kwargs)
+
+        assert len(weights) == len(self.queues)
+
+        self.prioritized_queues = list(self.queues)
+        self.weights = weights
+
+    def dequeue_job_and_maintain_ttl(self, timeout):
+        first = random.choices(self.prioritized_queues, weights=self.weights)[0]
+        self.queues = [first] + [q for q in self.prioritized_queues if q is not first]
+
+        return super().dequeue_job_and_maintain_ttl(timeout)
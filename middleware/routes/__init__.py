@@ -1,8 +1,10 @@
 def init_app(app):
-    from . import files, ping, fingerprint
+    from . import files, ping, fingerprint, metrics
 
     files.register_as_plugin(app)
 
     ping.register_as_plugin(app)
 
     fingerprint.register_as_plugin(app)
+
+    metrics.register_as_plugin(app)
@@ -1,6 +1,9 @@
+import hashlib
 import json
 from pathlib import Path
+from typing import Optional
 
+import sqlalchemy
 from flask import (
     Blueprint,
     Response,
@@ -10,13 +13,17 @@ from flask import (
     send_from_directory,
 )
 from loguru import logger
+from sqlalchemy import or_
 from werkzeug.utils import secure_filename
 
 import middleware.models.video_file as video_file
 
 from ..models import db
-from ..models.video_file import VideoFile, VideoFileType
-from ..services import files
+from ..models.fingerprint_collection import FingerprintCollectionModel
+from ..models.video_file import VideoFile, VideoFileState, VideoFileType
+from ..models.visual_word import VisualWordModel
+from ..queues import Priority
+from ..services import files, uploads
 
 
 file_blueprint = Blueprint('file', __name__)
@@ -39,13 +46,38 @@ def info(filename):
 
 @file_blueprint.route('/list')
 def list_files():
+    """
+    Lists the video files a page at a time, optionally filtered by
+    "file_type" and "processing_state". The "cursor" in the response is
+    given in the next request to get the next page, and is null after the
+    last page. Responses carry an ETag.
+    """
     try:
-        return jsonify({"files": files.list_files()})
+        file_type = request.args.get('file_type', type=VideoFileType.__getitem__)
+        processing_state = request.args.get(
+            'processing_state', type=VideoFileState.__getitem__
+        )
+        cursor = request.args.get('cursor', type=int)
+        limit = min(
+            request.args.get('limit', default=files.DEFAULT_PAGE_SIZE, type=int),
+            files.MAX_PAGE_SIZE,
+        )
+    except KeyError as e:
+        return f'Unexpected value {e}', 400
+
+    try:
+        body = files.cached_listing(file_type, processing_state, cursor, limit)
     except Exception as e:
         # Couldn't connect to database or database not seeded
         logger.warning(f"Exception when attempting to list files: {e}")
         return jsonify({"files": []}), 500
 
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.sha1(body.encode('utf-8')).hexdigest())
+
+    # Answers with 304 Not Modified if the client has the same listing
+    return response.make_conditional(request)
+
 
 def generate_random_filename(extension):
     import random_name
@@ -53,6 +85,106 @@ def generate_random_filename(extension):
     return f'{random_name.generate_name()}{extension}'
 
 
+# The number of random names that are checked for availability at a time
+RANDOM_NAME_CANDIDATES = 10
+
+
+def resolve_video_name(display_name: str) -> Optional[str]:
+    """
+    Returns the name to store an upload with the given (display) name as,
+    or None if a video with the same name has already been uploaded
+    """
+    # NOTE: Does not contain the extension! However, we cannot perform the
+    # assertion
+    #
+    # assert extension not in ascii_only_filename
+    #
+    # as this is an example of a valid filename: Ｊａｇｕａｒ．ｍｐ４.mp4
+    ascii_only_filename = secure_filename(Path(display_name).stem)
+    extension = Path(display_name).suffix
+
+    if ascii_only_filename != '':
+        candidates = [f'{ascii_only_filename}{extension}']
+    else:
+        # The uploaded file must have been all non-ASCII characters. Note
+        # that the random names contain the extension
+        candidates = [
+            generate_random_filename(extension) for _ in range(RANDOM_NAME_CANDIDATES)
+        ]
+
+    # One query for both the display name and all the candidates
+    taken = (
+        db.session.query(VideoFile.video_name, VideoFile.display_name)
+        .filter(
+            or_(
+                VideoFile.display_name == display_name,
+                VideoFile.video_name.in_(candidates),
+            )
+        )
+        .all()
+    )
+
+    if any(taken_display_name == display_name for _, taken_display_name in taken):
+        logger.warning(f'"{display_name}" already in database, skipping...')
+        return None
+
+    taken_video_names = {taken_video_name for taken_video_name, _ in taken}
+    available = [c for c in candidates if c not in taken_video_names]
+
+    if available:
+        return available[0]
+
+    if ascii_only_filename != '':
+        logger.warning(f'"{candidates[0]}" already in database, skipping...')
+        return None
+
+    return resolve_video_name(display_name)
+
+
+def find_duplicate(content_hash: str) -> Optional[str]:
+    """Returns the name of the video with the given contents, if any"""
+    return (
+        db.session.query(VideoFile.video_name)
+        .filter(VideoFile.content_hash == content_hash)
+        .scalar()
+    )
+
+
+def get_target_directory(file_type: VideoFileType) -> Path:
+    expected_filetypes_to_dir_map = {
+        VideoFileType.QUERY: current_app.config['UPLOADS_DIRECTORY'],
+        VideoFileType.REFERENCE: current_app.config['ARCHIVE_DIRECTORY'],
+    }
+
+    return expected_filetypes_to_dir_map[file_type]
+
+
+def create_video_file(
+    display_name: str, upload_destination: Path, file_type: VideoFileType
+) -> VideoFile:
+    if file_type == VideoFileType.QUERY:
+        return VideoFile.from_upload(upload_destination, display_name)
+    elif file_type == VideoFileType.REFERENCE:
+        return VideoFile.from_archival_footage(upload_destination, display_name)
+    else:
+        # Should never happen, handled by .from_str earlier
+        raise NotImplementedError
+
+
+def accepted(video_name: str, file_type: VideoFileType) -> Response:
+    return Response(
+        json.dumps(
+            {
+                'video_name': video_name,
+                'file_type': file_type.name,
+                'target_directory': str(get_target_directory(file_type)),
+            }
+        ),
+        status=202,
+        mimetype='application/json',
+    )
+
+
 @file_blueprint.route('/upload', methods=['POST'])
 def upload_file():
     FORM_PROPERTY_FILE_TYPE = 'file_type'
@@ -60,14 +192,6 @@ def upload_file():
     if request.form.get(FORM_PROPERTY_FILE_TYPE) is None:
         return f'Expected attribute "{FORM_PROPERTY_FILE_TYPE}" to be set', 400
 
-    def get_target_directory(file_type):
-        expected_filetypes_to_dir_map = {
-            VideoFileType.QUERY: current_app.config['UPLOADS_DIRECTORY'],
-            VideoFileType.REFERENCE: current_app.config['ARCHIVE_DIRECTORY'],
-        }
-
-        return expected_filetypes_to_dir_map[file_type]
-
     file_type = None
 
     try:
@@ -89,81 +213,212 @@ def upload_file():
     f = request.files['file']
     display_name = f.filename
 
-    if db.session.query(VideoFile).filter_by(display_name=display_name).first():
-        logger.warning(f'"{display_name}" already in database, skipping...')
-        return f'Rejected "{display_name}" as it already exists', 403
+    filename = resolve_video_name(display_name)
 
-    # NOTE: Does not contain the extension! However, we cannot perform the
-    # assertion
-    #
-    # assert extension not in ascii_only_filename
-    #
-    # as this is an example of a valid filename: Ｊａｇｕａｒ．ｍｐ４.mp4
-    ascii_only_filename = secure_filename(Path(display_name).stem)
-    extension = Path(display_name).suffix
-
-    # The uploaded file must have been all non-ASCII characters,
-    if ascii_only_filename == '':
-        # Note that filename here contains the extension
-        filename = generate_random_filename(extension)
+    if filename is None:
+        return f'Rejected "{display_name}" as it already exists', 403
 
-        # so this filter_by is "safe"
-        is_unique = (
-            db.session.query(VideoFile).filter_by(video_name=filename).first() is None
-        )
+    upload_destination = get_target_directory(file_type) / filename
 
-        while not is_unique:
-            filename = generate_random_filename(extension)
-            is_unique = (
-                db.session.query(VideoFile).filter_by(video_name=filename).first()
-                is None
-            )
-    else:
-        filename = f'{ascii_only_filename}{extension}'
+    logger.info(f'Saving upload to {str(upload_destination)}')
 
-    if db.session.query(VideoFile).filter_by(video_name=filename).first():
-        logger.warning(f'"{filename}" already in database, skipping...')
-        return f'Rejected "{filename}" as it already exists', 403
+    # The contents are hashed while they are written, rather than read again
+    content_hash = hashlib.sha256()
+    with upload_destination.open('wb') as destination:
+        uploads.copy(f.stream, destination, content_hash)
 
-    target_directory = get_target_directory(file_type)
-    upload_destination = target_directory / filename
+    assert upload_destination.exists()
 
-    logger.info(f'Saving upload to {str(upload_destination)}')
-    f.save(str(upload_destination))
+    duplicate = find_duplicate(content_hash.hexdigest())
 
-    assert upload_destination.exists()
+    if duplicate is not None:
+        upload_destination.unlink()
+        return f'Rejected "{display_name}" as it is identical to "{duplicate}"', 403
 
     video_name = upload_destination.name
 
-    def create_video_file(
-        display_name: str, upload_destination: Path, file_type: VideoFileType
-    ) -> VideoFile:
-        if file_type == VideoFileType.QUERY:
-            return VideoFile.from_upload(upload_destination, display_name)
-        elif file_type == VideoFileType.REFERENCE:
-            return VideoFile.from_archival_footage(upload_destination, display_name)
-        else:
-            # Should never happen, handled by .from_str earlier
-            raise NotImplementedError
-
     logger.info(f'Adding "{video_name}" to video_file table')
     db_video_file = create_video_file(display_name, upload_destination, file_type)
+    db_video_file.content_hash = content_hash.hexdigest()
+    db.session.add(db_video_file)
+
+    try:
+        db.session.commit()
+    except sqlalchemy.exc.IntegrityError:
+        # The same contents were uploaded concurrently, since the check for
+        # duplicates above
+        db.session.rollback()
+        upload_destination.unlink()
+        return f'Rejected "{display_name}" as it already exists', 403
+
+    # Someone is waiting for the result, regardless of the type of video
+    video_file.after_insert(db_video_file, Priority.HIGH)
+
+    return accepted(video_name, file_type)
+
+
+def upload_status(upload: uploads.Upload):
+    return {
+        'upload_id': upload.upload_id,
+        'video_name': upload.video_name,
+        'offset': upload.received,
+        'size': upload.size,
+    }
+
+
+@file_blueprint.route('/upload/chunked', methods=['POST'])
+def start_upload():
+    """
+    Starts a chunked upload of a file with the given "filename", "file_type"
+    and "size" (in bytes). The contents are then sent, in order, through
+    PUT /upload/chunked/<upload_id>?offset=<offset>, see services.uploads.
+    """
+    req_data = request.get_json()
+
+    try:
+        file_type = VideoFileType.from_str(req_data['file_type'])
+        display_name = req_data['filename']
+        size = int(req_data['size'])
+    except (KeyError, TypeError, ValueError) as e:
+        return f'Expected "filename", "file_type" and "size" ({e})', 400
+
+    filename = resolve_video_name(display_name)
+
+    if filename is None:
+        return f'Rejected "{display_name}" as it already exists', 403
+
+    destination = get_target_directory(file_type) / filename
+
+    # Inserted up front, which reserves the name and lets the fingerprints
+    # extracted during the upload be associated with the video
+    db_video_file = create_video_file(display_name, destination, file_type)
+    db_video_file.processing_state = VideoFileState.UPLOADING
     db.session.add(db_video_file)
-    video_file.after_insert(db_video_file)
+
+    try:
+        db.session.commit()
+    except sqlalchemy.exc.IntegrityError:
+        db.session.rollback()
+        return f'Rejected "{display_name}" as it already exists', 403
+
+    video_file.emit_event(db_video_file, 'video_file_added')
+
+    upload = uploads.start_upload(filename, destination, size)
+
+    if upload.is_complete:
+        return complete_upload(upload, file_type)
+
+    return jsonify(upload_status(upload)), 201
+
+
+@file_blueprint.route('/upload/chunked/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    upload = uploads.Upload.load(upload_id)
+
+    if upload is None:
+        return f'No upload with id "{upload_id}"', 404
+
+    return jsonify(upload_status(upload))
+
+
+@file_blueprint.route('/upload/chunked/<upload_id>', methods=['PUT'])
+def put_chunk(upload_id):
+    upload = uploads.Upload.load(upload_id)
+
+    if upload is None:
+        return f'No upload with id "{upload_id}"', 404
+
+    offset = request.args.get('offset', type=int)
+
+    if offset is None:
+        return 'Expected the query parameter "offset" to be set', 400
+
+    try:
+        uploads.write_chunk(upload, offset, request.stream)
+    except uploads.UploadOffsetMismatch:
+        # The client resumes from the offset in the response
+        return jsonify(upload_status(upload)), 409
+
+    if not upload.is_complete:
+        uploads.enqueue_received_segments(upload)
+
+        return jsonify(upload_status(upload))
+
+    db_video_file = (
+        db.session.query(VideoFile).filter_by(video_name=upload.video_name).one()
+    )
+
+    return complete_upload(upload, db_video_file.file_type)
+
+
+@file_blueprint.route('/upload/chunked/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    upload = uploads.Upload.load(upload_id)
+
+    if upload is None:
+        return f'No upload with id "{upload_id}"', 404
+
+    # Any extraction of its received segments that is yet to start finds
+    # nothing to extract
+    uploads.release_received_file(upload, None)
+    uploads.discard_upload(upload)
+    delete_video(upload.video_name)
+
+    return '', 204
+
+
+def delete_video(video_name: str):
+    """
+    Deletes the video along with whatever was fingerprinted during its
+    upload. The fingerprints are deleted by name, as well as by the
+    cascade, as an extraction of its received segments that is still
+    running may have stored some since the video was looked up
+    """
+    db.session.query(FingerprintCollectionModel).filter_by(
+        video_name=video_name
+    ).delete(synchronize_session=False)
+    db.session.query(VisualWordModel).filter_by(video_name=video_name).delete(
+        synchronize_session=False
+    )
+    db.session.query(VideoFile).filter_by(video_name=video_name).delete(
+        synchronize_session=False
+    )
     db.session.commit()
+    video_file.invalidate_listings()
 
-    return Response(
-        json.dumps(
-            {
-                'video_name': video_name,
-                'file_type': file_type.name,
-                'target_directory': str(target_directory),
-            }
-        ),
-        status=202,
-        mimetype='application/json',
+
+def complete_upload(upload: uploads.Upload, file_type: VideoFileType) -> Response:
+    # The extraction of the received segments may still be in progress
+    depends_on = uploads.outstanding_job(upload)
+    content_hash = uploads.finish_upload(upload)
+
+    db_video_file = (
+        db.session.query(VideoFile).filter_by(video_name=upload.video_name).one()
     )
 
+    duplicate = find_duplicate(content_hash)
+
+    if duplicate is not None:
+        Path(upload.destination).unlink()
+
+        display_name = db_video_file.display_name
+        uploads.release_received_file(upload, None)
+        delete_video(upload.video_name)
+
+        return f'Rejected "{display_name}" as it is identical to "{duplicate}"', 403
+
+    db_video_file.content_hash = content_hash
+    db_video_file.mark_as_uploaded()
+
+    # Planned once the received segments are extracted, which the planned
+    # jobs then resume past, rather than concurrently with them
+    video_file.after_insert(db_video_file, Priority.HIGH, depends_on)
+    db.session.commit()
+
+    uploads.release_received_file(upload, depends_on)
+
+    return accepted(upload.video_name, file_type)
+
 
 def register_as_plugin(app):
     logger.debug('Registering file_blueprint')
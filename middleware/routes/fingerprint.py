@@ -1,80 +1,261 @@
 import itertools
-from collections import defaultdict
-from typing import Set, Tuple
+import json
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
 
-from flask import Blueprint, current_app, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from loguru import logger
-from sqlalchemy import func
+from sqlalchemy import func, tuple_
+
+from video_reuse_detector import phash
 
 from ..models import db
+from ..models.archived_comparison import ArchivedComparisonModel
 from ..models.fingerprint_collection import FingerprintCollectionModel
 from ..models.fingerprint_comparison import (
     FingerprintComparisonModel,
     FingerprintComparisonSchema,
 )
 from ..models.video_file import VideoFile, VideoFileState
-from ..services.fingerprint import compare_fingerprints
+from ..services.fingerprint import comparison_batch_progress, plan_comparisons
+from ..services.lookup import candidate_references, near_duplicates
+from ..services.retrieval import retrieve
 
 
 fingerprint_blueprint = Blueprint('fingerprint', __name__)
 fingerprint_schema = FingerprintComparisonSchema(many=True)
 
 
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+# The number of rows fetched from the database cursor at a time when
+# streaming comparisons
+STREAM_BATCH_SIZE = 1000
+
+
 def groupby_to_dict(iterable, grouper):
+    # Note that itertools.groupby only groups consecutive elements, i.e.
+    # the iterable is expected to be sorted by the grouper
     return {k: list(v) for k, v in itertools.groupby(iterable, grouper)}
 
 
-def group_by_name_pairing(fpcms):
-    def __group_by_name_pairing__(fpcm):
-        return (fpcm.query_video_name, fpcm.reference_video_name)
+def name_pairing(fpcm) -> Tuple[str, str]:
+    return (fpcm.query_video_name, fpcm.reference_video_name)
 
-    return groupby_to_dict(fpcms, __group_by_name_pairing__)
 
+def group_by_name_pairing(fpcms):
+    return groupby_to_dict(fpcms, name_pairing)
 
-def group_by_match_level(fpcms):
+
+def group_by_match_level(rows):
     grouped_by_match_level = defaultdict(list)
 
-    for fpcm in fpcms:
-        grouped_by_match_level[fpcm.match_level].append(fpcm)
+    for row in rows:
+        grouped_by_match_level[row['match_level']].append(row)
 
     return grouped_by_match_level
 
 
-def fetch_number_of_segments_for_video(video_name: str) -> int:
+def fetch_number_of_segments_for_videos(video_names: Iterable[str]) -> Dict[str, int]:
+    video_names = set(video_names)
+
+    result = (
+        db.session.query(
+            FingerprintCollectionModel.video_name,
+            # A fingerprint may cover several segments, see run_length
+            func.sum(func.coalesce(FingerprintCollectionModel.run_length, 1)),
+        )
+        .filter(FingerprintCollectionModel.video_name.in_(video_names))
+        .group_by(FingerprintCollectionModel.video_name)
+        .all()
+    )
+
+    counts = dict(result)
+
+    return {video_name: int(counts.get(video_name, 0)) for video_name in video_names}
+
+
+def matching_comparisons_filter(query_video_names, reference_video_names):
+    video_names = list(query_video_names) + list(reference_video_names)
+
     return (
-        db.session.query(func.count(FingerprintCollectionModel.pk))
-        .filter(FingerprintCollectionModel.video_name == video_name)
-        .one()[0]
+        FingerprintComparisonModel.query_video_name.in_(video_names),
+        FingerprintComparisonModel.reference_video_name.in_(video_names),
+        FingerprintComparisonModel.similarity_score > 0,
+    )
+
+
+def archived_matches(
+    query_video_names, reference_video_names
+) -> List[FingerprintComparisonModel]:
+    """
+    Returns the matching comparisons of the archived pairs between the given
+    videos, decompressed into transient models
+    """
+    video_names = list(query_video_names) + list(reference_video_names)
+
+    archives = db.session.query(ArchivedComparisonModel).filter(
+        ArchivedComparisonModel.query_video_name.in_(video_names),
+        ArchivedComparisonModel.reference_video_name.in_(video_names),
+    )
+
+    return [
+        fpcm
+        for archive in archives
+        for fpcm in archive.to_comparison_models()
+        if fpcm.similarity_score > 0
+    ]
+
+
+def segment_pairs(fpcm) -> int:
+    """The number of pairs of segments a comparison stands for"""
+    return (fpcm.query_run_length or 1) * (fpcm.reference_run_length or 1)
+
+
+def archived_totals(fpcms) -> Tuple[List[Tuple], List[Tuple]]:
+    """
+    Computes the same aggregates as comparison_totals and
+    comparison_totals_per_match_level for comparisons that are not in
+    the database
+    """
+    totals = []
+    per_match_level = []
+
+    grouped_by_name_pairing = group_by_name_pairing(sorted(fpcms, key=name_pairing))
+
+    for pair, comparisons in grouped_by_name_pairing.items():
+        query_run_lengths = {
+            fpcm.query_segment_id: fpcm.query_run_length for fpcm in comparisons
+        }
+        distinct_matches = sum(query_run_lengths.values())
+        totals.append((*pair, distinct_matches, sum(map(segment_pairs, comparisons))))
+
+        counts = Counter()  # type: Counter
+        for fpcm in comparisons:
+            counts[fpcm.match_level] += segment_pairs(fpcm)
+
+        per_match_level.extend((*pair, level, count) for level, count in counts.items())
+
+    return totals, per_match_level
+
+
+PAIR = (
+    FingerprintComparisonModel.query_video_name,
+    FingerprintComparisonModel.reference_video_name,
+)
+
+
+# The number of pairs of segments a comparison stands for, see segment_pairs
+SEGMENT_PAIRS = (
+    FingerprintComparisonModel.query_run_length
+    * FingerprintComparisonModel.reference_run_length
+)
+
+
+def comparison_totals(query_video_names, reference_video_names):
+    # The matches are first summed per query segment so that the segments,
+    # which may stand for several, see query_run_length, are counted once.
+    # Only columns of the partial index on the matches are read, so that it
+    # covers the query
+    per_query_segment = (
+        db.session.query(
+            *PAIR,
+            FingerprintComparisonModel.query_run_length,
+            func.sum(SEGMENT_PAIRS).label('matches'),
+        )
+        .filter(*matching_comparisons_filter(query_video_names, reference_video_names))
+        .group_by(
+            *PAIR,
+            FingerprintComparisonModel.query_segment_id,
+            FingerprintComparisonModel.query_run_length,
+        )
+        .subquery()
     )
 
+    pair = (
+        per_query_segment.c.query_video_name,
+        per_query_segment.c.reference_video_name,
+    )
 
-def structure_fingerprint_comparison_information(
-    fpcms, query_video_name, reference_video_name
-):
-    d = {}
+    return (
+        db.session.query(
+            *pair,
+            func.sum(per_query_segment.c.query_run_length),
+            func.sum(per_query_segment.c.matches),
+        )
+        .group_by(*pair)
+        .order_by(*pair)
+    )
 
-    grouped_by_match_level = group_by_match_level(fpcms)
 
-    d['comparisons'] = {
-        match_level: fingerprint_schema.dump(comparisons)
-        for match_level, comparisons in grouped_by_match_level.items()
-    }
-    d['numberOfQuerySegments'] = fetch_number_of_segments_for_video(query_video_name)
-    d['numberOfReferenceSegments'] = fetch_number_of_segments_for_video(
-        reference_video_name
+def comparison_totals_per_match_level(query_video_names, reference_video_names):
+    return (
+        db.session.query(
+            *PAIR, FingerprintComparisonModel.match_level, func.sum(SEGMENT_PAIRS)
+        )
+        .filter(*matching_comparisons_filter(query_video_names, reference_video_names))
+        .group_by(*PAIR, FingerprintComparisonModel.match_level)
     )
 
-    # Distinct matches, as every query segment id in fpcms will be matching
-    # against at least on reference segment
-    distinct_matches = set(fpcm.query_segment_id for fpcm in fpcms)
-    d['distinctMatches'] = len(distinct_matches)
 
-    total_matches = sum(len(matches) for matches in grouped_by_match_level.values())
-    d['totalMatches'] = total_matches
+def summarize_comparisons(query_video_names, reference_video_names) -> List[Dict]:
+    """
+    Summarizes the matching segments for every pair of videos for which
+    there are comparisons, using one aggregate query for the matches and
+    one for the number of segments per video
+    """
+    sql_query = comparison_totals(query_video_names, reference_video_names)
+    logger.trace(sql_query)
+
+    per_match_level = comparison_totals_per_match_level(
+        query_video_names, reference_video_names
+    ).all()
+
+    # Archived pairs are summarized separately and then merged. A pair is
+    # either archived or not, never both
+    archived = archived_matches(query_video_names, reference_video_names)
+    totals, archived_per_match_level = archived_totals(archived)
+
+    totals = sorted(sql_query.all() + totals, key=lambda t: t[:2])
+    per_match_level += archived_per_match_level
+
+    matches_per_level = defaultdict(dict)  # type: Dict[Tuple[str, str], Dict]
+    for query_video_name, reference_video_name, match_level, count in per_match_level:
+        matches_per_level[(query_video_name, reference_video_name)][
+            match_level
+        ] = int(count)
+
+    summaries = [
+        {
+            'queryVideoName': query_video_name,
+            'referenceVideoName': reference_video_name,
+            # Every query segment id will be matching against at least one
+            # reference segment
+            'distinctMatches': int(distinct_matches),
+            'totalMatches': int(total_matches),
+            'matchesPerLevel': matches_per_level[
+                (query_video_name, reference_video_name)
+            ],
+        }
+        for query_video_name, reference_video_name, distinct_matches, total_matches in totals  # noqa: E501
+    ]
+
+    number_of_segments = fetch_number_of_segments_for_videos(
+        itertools.chain.from_iterable(
+            (s['queryVideoName'], s['referenceVideoName']) for s in summaries
+        )
+    )
+
+    for summary in summaries:
+        summary['numberOfQuerySegments'] = number_of_segments[summary['queryVideoName']]
+        summary['numberOfReferenceSegments'] = number_of_segments[
+            summary['referenceVideoName']
+        ]
 
-    assert d['distinctMatches'] <= d['totalMatches']
+        assert summary['distinctMatches'] <= summary['totalMatches']
 
-    return d
+    return summaries
 
 
 @fingerprint_blueprint.route('/comparisons', methods=['POST'])
@@ -89,35 +270,251 @@ def get_comparisons():
         f'Retrieving comparisons between "{query_video_names}" and "{reference_video_names}""'  # noqa: E501
     )
 
-    video_names = query_video_names + reference_video_names
+    summaries = summarize_comparisons(query_video_names, reference_video_names)
+
     sql_query = (
         db.session.query(FingerprintComparisonModel)
-        .filter(FingerprintComparisonModel.query_video_name.in_(video_names))
-        .filter(FingerprintComparisonModel.reference_video_name.in_(video_names))
-        .filter(FingerprintComparisonModel.similarity_score > 0)
+        .filter(*matching_comparisons_filter(query_video_names, reference_video_names))
+        .order_by(
+            FingerprintComparisonModel.query_video_name,
+            FingerprintComparisonModel.reference_video_name,
+        )
+    )
+
+    logger.trace(sql_query)
+
+    # Both are sorted by name pairing and sorted is stable
+    fpcms = sorted(
+        sql_query.all() + archived_matches(query_video_names, reference_video_names),
+        key=name_pairing,
+    )
+
+    comparisons_grouped_by_name_pairing = group_by_name_pairing(fpcms)
+
+    for summary in summaries:
+        name_pair = (summary['queryVideoName'], summary['referenceVideoName'])
+        rows = fingerprint_schema.dump(comparisons_grouped_by_name_pairing[name_pair])
+
+        # A comparison of collapsed segments stands for several pairs of
+        # segments, see expand_rows, each of which is counted in
+        # totalMatches and drawn on its own by the frontend
+        summary['comparisons'] = group_by_match_level(expand_rows(rows))
+
+    return jsonify({'comparisons': summaries})
+
+
+@fingerprint_blueprint.route('/comparisons/summary', methods=['POST'])
+def get_comparison_summaries():
+    """
+    As /comparisons but without the comparisons themselves, which are
+    instead available, page by page, through /comparisons/rows
+    """
+    req_data = request.get_json()
+
+    query_video_names = req_data['query_video_names']  # List of videos
+    reference_video_names = req_data['reference_video_names']  # List of videos
+
+    return jsonify(
+        {'comparisons': summarize_comparisons(query_video_names, reference_video_names)}
+    )
+
+
+@fingerprint_blueprint.route('/comparisons/stream', methods=['POST'])
+def stream_comparisons():
+    """
+    Streams the matching comparisons between the given videos as
+    newline-delimited JSON, one comparison per line, ordered by video pair
+    and segment. An optional "match_level" restricts the comparisons to a
+    single level, and "expand" expands them to segment granularity, see
+    expand_rows.
+
+    The rows are read from a server-side cursor and serialized one by one,
+    so neither the query result nor the response is held in memory.
+    """
+    req_data = request.get_json()
+
+    query_video_names = req_data['query_video_names']  # List of videos
+    reference_video_names = req_data['reference_video_names']  # List of videos
+    match_level = req_data.get('match_level')
+    expand = bool(req_data.get('expand', False))
+
+    # Fetching columns rather than entities skips the identity map and the
+    # marshmallow schema, the keys are the same as the ones it produces
+    columns = FingerprintComparisonModel.__table__.columns
+    keys = [column.key for column in columns]
+
+    sql_query = (
+        db.session.query(*columns)
+        .filter(*matching_comparisons_filter(query_video_names, reference_video_names))
+        .order_by(
+            FingerprintComparisonModel.query_video_name,
+            FingerprintComparisonModel.reference_video_name,
+            FingerprintComparisonModel.query_segment_id,
+            FingerprintComparisonModel.reference_segment_id,
+        )
     )
 
+    if match_level is not None:
+        sql_query = sql_query.filter(
+            FingerprintComparisonModel.match_level == match_level
+        )
+
     logger.trace(sql_query)
 
-    db_result = sql_query.all()
+    sql_query = sql_query.execution_options(stream_results=True).yield_per(
+        STREAM_BATCH_SIZE
+    )
+
+    def rows():
+        for row in sql_query:
+            yield dict(zip(keys, row))
+
+        # The archived pairs follow the ones in the database
+        for fpcm in archived_matches(query_video_names, reference_video_names):
+            if match_level is None or fpcm.match_level == match_level:
+                yield {key: getattr(fpcm, key) for key in keys}
+
+    def generate():
+        for row in expand_rows(rows()) if expand else rows():
+            yield json.dumps(row) + '\n'
 
-    comparisons_grouped_by_name_pairing = group_by_name_pairing(db_result)
-    enriched_comparisons = []
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
-    for name_pair, fpcms_by_name in comparisons_grouped_by_name_pairing.items():
-        query_video_name = name_pair[0]
-        reference_video_name = name_pair[1]
 
-        comparison = structure_fingerprint_comparison_information(
-            fpcms_by_name, query_video_name, reference_video_name
+def expand_rows(rows: Iterable[Dict]) -> Iterator[Dict]:
+    """
+    Expands serialized comparisons to one comparison per pair of segments,
+    as FingerprintComparison.expand
+
+    >>> rows = [{'query_segment_id': 4, 'reference_segment_id': 0,
+    ...          'query_run_length': 2, 'reference_run_length': 1}]
+    >>> [(r['query_segment_id'], r['query_run_length']) for r in expand_rows(rows)]
+    [(4, 1), (5, 1)]
+    """
+    for row in rows:
+        for i in range(row['query_run_length'] or 1):
+            for j in range(row['reference_run_length'] or 1):
+                yield {
+                    **row,
+                    'query_segment_id': row['query_segment_id'] + i,
+                    'reference_segment_id': row['reference_segment_id'] + j,
+                    'query_run_length': 1,
+                    'reference_run_length': 1,
+                }
+
+
+def segments_of(fpcm) -> Tuple[int, int]:
+    return (fpcm.query_segment_id, fpcm.reference_segment_id)
+
+
+def fetch_comparison_rows(
+    query_video_name, reference_video_name, match_level, cursor, limit
+) -> List[FingerprintComparisonModel]:
+    segments = (
+        FingerprintComparisonModel.query_segment_id,
+        FingerprintComparisonModel.reference_segment_id,
+    )
+
+    sql_query = comparisons_between(query_video_name, reference_video_name).filter(
+        FingerprintComparisonModel.similarity_score > 0
+    )
+
+    if match_level is not None:
+        sql_query = sql_query.filter(
+            FingerprintComparisonModel.match_level == match_level
         )
 
-        comparison['queryVideoName'] = query_video_name
-        comparison['referenceVideoName'] = reference_video_name
+    if cursor is not None:
+        sql_query = sql_query.filter(tuple_(*segments) > cursor)
+
+    return sql_query.order_by(*segments).limit(limit).all()
+
 
-        enriched_comparisons.append(comparison)
+def page_archived_rows(
+    archive, match_level, cursor, limit
+) -> List[FingerprintComparisonModel]:
+    rows = [
+        fpcm
+        for fpcm in archive.to_comparison_models()
+        if fpcm.similarity_score > 0
+        and (match_level is None or fpcm.match_level == match_level)
+        and (cursor is None or segments_of(fpcm) > cursor)
+    ]
 
-    return jsonify({'comparisons': enriched_comparisons})
+    return sorted(rows, key=segments_of)[:limit]
+
+
+def parse_cursor(cursor: str) -> Tuple[int, int]:
+    """
+    >>> parse_cursor('12,3')
+    (12, 3)
+    """
+    query_segment_id, reference_segment_id = cursor.split(',')
+    return (int(query_segment_id), int(reference_segment_id))
+
+
+def format_cursor(fpcm) -> str:
+    return f'{fpcm.query_segment_id},{fpcm.reference_segment_id}'
+
+
+@fingerprint_blueprint.route('/comparisons/rows', methods=['POST'])
+def get_comparison_rows():
+    """
+    Returns the matching comparisons between two videos ordered by segment,
+    optionally restricted to a single match level, one page at a time. The
+    "cursor" in the response is given in the next request to get the next
+    page, and is null after the last page.
+
+    With "expand", the comparisons of a page are expanded to segment
+    granularity, see expand_rows, in which case a page may hold more than
+    "limit" comparisons.
+    """
+    req_data = request.get_json()
+
+    query_video_name = req_data['query_video_name']
+    reference_video_name = req_data['reference_video_name']
+    match_level = req_data.get('match_level')
+    cursor = req_data.get('cursor')
+    expand = bool(req_data.get('expand', False))
+    limit = min(int(req_data.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+
+    if cursor is not None:
+        try:
+            cursor = parse_cursor(cursor)
+        except ValueError:
+            return f'Malformed cursor "{cursor}"', 400
+
+    archive = (
+        db.session.query(ArchivedComparisonModel)
+        .filter_by(
+            query_video_name=query_video_name,
+            reference_video_name=reference_video_name,
+        )
+        .first()
+    )
+
+    # Fetch one extra row to know whether there is another page
+    if archive is None:
+        rows = fetch_comparison_rows(
+            query_video_name, reference_video_name, match_level, cursor, limit + 1
+        )
+    else:
+        rows = page_archived_rows(archive, match_level, cursor, limit + 1)
+
+    next_cursor = format_cursor(rows[limit - 1]) if len(rows) > limit else None
+    comparisons = fingerprint_schema.dump(rows[:limit])
+
+    if expand:
+        comparisons = list(expand_rows(comparisons))
+
+    return jsonify(
+        {
+            'queryVideoName': query_video_name,
+            'referenceVideoName': reference_video_name,
+            'comparisons': comparisons,
+            'cursor': next_cursor,
+        }
+    )
 
 
 def comparisons_between(query_video_name, reference_video_name):
@@ -133,10 +530,15 @@ def comparisons_between(query_video_name, reference_video_name):
 
 
 def has_comparison(query_video_name, reference_video_name):
-    return (
-        comparisons_between(query_video_name, reference_video_name).first() is not None
+    if comparisons_between(query_video_name, reference_video_name).first() is not None:
+        return True
+
+    archive = db.session.query(ArchivedComparisonModel.pk).filter_by(
+        query_video_name=query_video_name, reference_video_name=reference_video_name
     )
 
+    return archive.first() is not None
+
 
 def names_of_fingerprinted_videos(names) -> Set[str]:
     """
@@ -158,56 +560,154 @@ def names_of_fingerprinted_videos(names) -> Set[str]:
     return set([v for v, in result])
 
 
-@fingerprint_blueprint.route('/compare', methods=['POST'])
-def compute_comparisons():
-    def videos_with_fingerprints(
-        query_video_names, reference_video_names
-    ) -> Tuple[Set[str], Set[str]]:
-        query_videos_ready_to_compare = names_of_fingerprinted_videos(query_video_names)
-        reference_videos_ready_to_compare = names_of_fingerprinted_videos(
-            reference_video_names
-        )
+def existing_pairs(query_video_names, reference_video_names) -> Set[Tuple[str, str]]:
+    """
+    Returns the pairs of query and reference videos that have already been
+    compared, archived or not, using a single query per table
+    """
 
+    def pairs_in(model):
         return (
-            query_videos_ready_to_compare,
-            reference_videos_ready_to_compare,
+            db.session.query(model.query_video_name, model.reference_video_name)
+            .filter(
+                model.query_video_name.in_(query_video_names),
+                model.reference_video_name.in_(reference_video_names),
+            )
+            .distinct()
         )
 
+    pairs = pairs_in(FingerprintComparisonModel).union(
+        pairs_in(ArchivedComparisonModel)
+    )
+
+    logger.trace(pairs)
+
+    return set(pairs.all())
+
+
+@fingerprint_blueprint.route('/lookup', methods=['POST'])
+def lookup_near_duplicates():
+    """
+    Returns the segments of other videos that are near-duplicates of the
+    segments of the given video, i.e. that have perceptual hashes within
+    "radius" bits of theirs, by video, with the videos with the most
+    matching segments first
+    """
+    req_data = request.get_json()
+
+    video_name = req_data['video_name']
+    radius = int(req_data.get('radius', phash.RADIUS))
+
+    if not 0 <= radius <= phash.RADIUS:
+        return f'The radius has to be in [0, {phash.RADIUS}]', 400
+
+    matches = near_duplicates(video_name, radius)
+
+    return jsonify(
+        {
+            'videoName': video_name,
+            'radius': radius,
+            'matches': [
+                {
+                    'referenceVideoName': reference_video_name,
+                    'segments': [
+                        {
+                            'querySegmentId': q,
+                            'referenceSegmentId': r,
+                            'distance': distance,
+                        }
+                        for q, r, distance in segments
+                    ],
+                }
+                for reference_video_name, segments in sorted(
+                    matches.items(), key=lambda item: (-len(item[1]), item[0])
+                )
+            ],
+        }
+    )
+
+
+@fingerprint_blueprint.route('/retrieve', methods=['POST'])
+def retrieve_similar_segments():
+    """
+    Returns the segments of other videos that share the most distinctive
+    visual words with the segments of the given video, see
+    services.retrieval, by video, with the best scoring videos first. Unless
+    "verify" is false, only the segments whose ORB descriptors match those
+    of the query segment are returned
+    """
+    req_data = request.get_json()
+
+    video_name = req_data['video_name']
+    verify = bool(req_data.get('verify', True))
+
+    try:
+        ranked = retrieve(video_name, verify_candidates=verify)
+    except ValueError as e:
+        return str(e), 400
+
+    return jsonify(
+        {
+            'videoName': video_name,
+            'verified': verify,
+            'matches': [
+                {
+                    'referenceVideoName': reference_video_name,
+                    'score': score,
+                    'segments': [
+                        {
+                            'querySegmentId': q,
+                            'referenceSegmentId': r,
+                            'score': segment_score,
+                        }
+                        for q, r, segment_score in segments
+                    ],
+                }
+                for reference_video_name, score, segments in ranked
+            ],
+        }
+    )
+
+
+@fingerprint_blueprint.route('/compare', methods=['POST'])
+def compute_comparisons():
+    """
+    Enqueues the comparisons between the given query and reference videos
+    that have not been compared already. With "prefilter", a query video is
+    only compared to the reference videos that have at least one segment
+    that is a near-duplicate of one of its segments, see /lookup
+    """
     # Using POST instead of GET to not run into URL-length limits
     req_data = request.get_json()
 
     query_video_names = set(req_data['query_video_names'])  # List of videos
     reference_video_names = set(req_data['reference_video_names'])  # List of videos
+    prefilter = bool(req_data.get('prefilter', False))
 
-    fingerprinted_query_vids, fingerprinted_reference_vids = videos_with_fingerprints(
-        query_video_names, reference_video_names
-    )
+    fingerprinted_query_vids = names_of_fingerprinted_videos(query_video_names)
+    fingerprinted_reference_vids = names_of_fingerprinted_videos(reference_video_names)
+
+    compared = existing_pairs(fingerprinted_query_vids, fingerprinted_reference_vids)
 
     response = {}
+    pairs = defaultdict(list)  # type: Dict[str, List[str]]
 
-    for query_video_name in fingerprinted_query_vids:
-        for reference_video_name in fingerprinted_reference_vids:
-            comparison_exists = (
-                comparisons_between(query_video_name, reference_video_name).first()
-                is not None
+    for query_video_name in sorted(fingerprinted_query_vids):
+        if prefilter:
+            candidates = candidate_references(
+                query_video_name, fingerprinted_reference_vids
             )
 
-            if comparison_exists:
-                logger.info(
-                    f'Comparison between {query_video_name} and {reference_video_name} exists'  # noqa: E501
-                )
+        for reference_video_name in sorted(fingerprinted_reference_vids):
+            key = f'{query_video_name}/{reference_video_name}'
 
-                response[f'{query_video_name}/{reference_video_name}'] = 'exists'
+            if (query_video_name, reference_video_name) in compared:
+                response[key] = 'exists'
+            elif prefilter and reference_video_name not in candidates:
+                response[key] = 'no near-duplicates'
             else:
-                logger.info(
-                    f'Enqueuing comparison between "{query_video_name}" and "{reference_video_name}"'  # noqa: E501
-                )
-                current_app.compare_queue.enqueue(
-                    compare_fingerprints,
-                    args=(query_video_name, reference_video_name),
-                    job_timeout=6000,
-                )
-                response[f'{query_video_name}/{reference_video_name}'] = 'started'
+                pairs[query_video_name].append(reference_video_name)
+                response[key] = 'started'
 
     cannot_compare = query_video_names - fingerprinted_query_vids
     cannot_compare |= reference_video_names - fingerprinted_reference_vids
@@ -215,9 +715,34 @@ def compute_comparisons():
     for unfingerprinted_video in cannot_compare:
         response[f'{unfingerprinted_video}'] = 'fingerprint missing'
 
+    # The progress of the batch is available through /compare/<batch_id>
+    response['batch_id'] = plan_comparisons(pairs) if pairs else None
+
+    logger.info(
+        f'{len(compared)} comparisons exist, enqueued'
+        f' {sum(map(len, pairs.values()))} as batch {response["batch_id"]}'
+    )
+
     return jsonify(response)
 
 
+@fingerprint_blueprint.route('/compare/<batch_id>', methods=['GET'])
+def get_comparison_batch(batch_id):
+    progress = comparison_batch_progress(batch_id)
+
+    if progress is None:
+        return f'No batch with id "{batch_id}"', 404
+
+    return jsonify(
+        {
+            'batch_id': batch_id,
+            'total': progress['total'],
+            'completed': progress['completed'],
+            'done': progress['completed'] >= progress['total'],
+        }
+    )
+
+
 def register_as_plugin(app):
     logger.debug('Registering fingerprint_blueprint')
     app.register_blueprint(fingerprint_blueprint, url_prefix='/api/fingerprints')
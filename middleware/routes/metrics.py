@@ -0,0 +1,20 @@
+from flask import Blueprint, Response, current_app
+from loguru import logger
+
+from .. import metrics
+
+
+metrics_blueprint = Blueprint('metrics', __name__)
+
+
+@metrics_blueprint.route('/metrics')
+def stage_metrics():
+    """The stage timings of all extractions and comparisons, for Prometheus"""
+    return Response(
+        metrics.render(current_app.redis), mimetype='text/plain; version=0.0.4'
+    )
+
+
+def register_as_plugin(app):
+    logger.debug('Registering metrics_blueprint')
+    app.register_blueprint(metrics_blueprint, url_prefix='/api')
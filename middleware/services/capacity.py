@@ -0,0 +1,190 @@
+"""
+A cost model of fingerprint extraction, fitted to the recorded
+computations, to size the fleet of extractors.
+
+The processing time of a video is modelled as proportional to its
+duration, at a rate (seconds of processing per second of video) that
+depends on its codec and resolution. The rate of every such class is the
+least squares fit to the computations of that class, and videos of a
+class without computations are assumed to be processed at the rate of all
+computations combined.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+import middleware.models.video_file as video_file
+from video_reuse_detector import ffmpeg
+from video_reuse_detector.fingerprint import SEGMENT_LENGTH_IN_SECONDS
+
+from ..models import db
+from ..models.fingerprint_collection_computation import FingerprintCollectionComputation
+
+
+# The upper bound of the height of each resolution class
+RESOLUTIONS = [(360, '360p'), (480, '480p'), (720, '720p'), (1080, '1080p')]
+
+UNKNOWN = 'unknown'
+
+# (codec, resolution class)
+VideoClass = Tuple[str, str]
+
+
+def resolution_class(height: Optional[int]) -> str:
+    """
+    >>> resolution_class(360)
+    '360p'
+
+    >>> resolution_class(404)
+    '480p'
+
+    >>> resolution_class(2160)
+    '>1080p'
+    """
+    if height is None:
+        return UNKNOWN
+
+    for bound, name in RESOLUTIONS:
+        if height <= bound:
+            return name
+
+    return f'>{RESOLUTIONS[-1][1]}'
+
+
+def video_class(codec: Optional[str], height: Optional[int]) -> VideoClass:
+    return (codec or UNKNOWN, resolution_class(height))
+
+
+def least_squares_rate(durations: List[float], processing_times: List[float]) -> float:
+    """
+    The rate of the least squares fit of processing_time = rate * duration
+
+    >>> least_squares_rate([10.0, 20.0], [5.0, 10.0])
+    0.5
+    """
+    d = np.array(durations, dtype=np.float64)
+    t = np.array(processing_times, dtype=np.float64)
+
+    denominator = d @ d
+
+    return float(d @ t / denominator) if denominator > 0 else 0.0
+
+
+@dataclass
+class CostModel:
+    # Seconds of processing per second of video
+    rates: Dict[VideoClass, float]
+    samples: Dict[VideoClass, int]
+    overall_rate: float
+
+    def rate(self, codec: Optional[str], height: Optional[int]) -> float:
+        return self.rates.get(video_class(codec, height), self.overall_rate)
+
+    def predict(
+        self, codec: Optional[str], height: Optional[int], duration: float
+    ) -> float:
+        return self.rate(codec, height) * duration
+
+
+def fit(
+    computations: Iterable[Tuple[Optional[str], Optional[int], float, float]]
+) -> CostModel:
+    """
+    Fits a cost model to computations on the form (codec, height, video
+    duration, processing time)
+    """
+    samples: Dict[VideoClass, Tuple[List[float], List[float]]] = {}
+
+    for codec, height, duration, processing_time in computations:
+        durations, processing_times = samples.setdefault(
+            video_class(codec, height), ([], [])
+        )
+        durations.append(duration)
+        processing_times.append(processing_time)
+
+    all_durations = [d for durations, _ in samples.values() for d in durations]
+    all_processing_times = [t for _, times in samples.values() for t in times]
+
+    return CostModel(
+        {c: least_squares_rate(*s) for c, s in samples.items()},
+        {c: len(durations) for c, (durations, _) in samples.items()},
+        least_squares_rate(all_durations, all_processing_times),
+    )
+
+
+def fit_computations() -> CostModel:
+    computations = db.session.query(
+        FingerprintCollectionComputation.codec,
+        FingerprintCollectionComputation.height,
+        FingerprintCollectionComputation.video_duration,
+        FingerprintCollectionComputation.processing_time,
+    ).filter(
+        FingerprintCollectionComputation.video_duration > 0,
+        FingerprintCollectionComputation.processing_time.isnot(None),
+    )
+
+    return fit(computations)
+
+
+@dataclass
+class PendingVideo:
+    video_name: str
+    codec: Optional[str]
+    height: Optional[int]
+    # The duration (in seconds) of the part that is yet to be fingerprinted
+    remaining_duration: float
+
+
+def pending_videos() -> List[PendingVideo]:
+    """
+    The videos that are yet to be (completely) fingerprinted. Videos that
+    are still being uploaded are not included, as they can not be probed.
+    """
+    VideoFile = video_file.VideoFile
+    VideoFileState = video_file.VideoFileState
+
+    video_files = db.session.query(VideoFile).filter(
+        VideoFile.processing_state.notin_(
+            [VideoFileState.FINGERPRINTED, VideoFileState.UPLOADING]
+        )
+    )
+
+    pending = []
+
+    for vf in video_files:
+        path = Path(vf.file_path)
+
+        try:
+            duration = vf.video_duration or ffmpeg.get_video_duration(path)
+            stream_info = ffmpeg.get_video_stream_info(path)
+        except Exception:
+            logger.warning(f'Could not probe {path}, skipping it')
+            continue
+
+        fingerprinted = (vf.fingerprinted_segments or 0) * SEGMENT_LENGTH_IN_SECONDS
+
+        pending.append(
+            PendingVideo(
+                vf.video_name,
+                stream_info.get('codec'),
+                stream_info.get('height'),
+                max(duration - fingerprinted, 0.0),
+            )
+        )
+
+    return pending
+
+
+def drain_time(model: CostModel, pending: List[PendingVideo], workers: int) -> float:
+    """
+    The time (in seconds) it takes the given number of workers to extract
+    the pending videos, assuming the work is evenly spread among them
+    """
+    total = sum(
+        model.predict(p.codec, p.height, p.remaining_duration) for p in pending
+    )
+
+    return total / max(workers, 1)
@@ -1,14 +1,98 @@
+import json
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+
+import middleware.models.video_file as video_file
+
 from ..models import db
-from ..models.video_file import VideoFile, VideoFileSchema
+from ..models.video_file import (
+    VideoFile,
+    VideoFileSchema,
+    VideoFileState,
+    VideoFileType,
+)
 
 
 SCHEMA = VideoFileSchema()
 
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+# Cached listings are never stale, see video_file.invalidate_listings, the
+# expiry only removes listings that can no longer be reached
+LISTING_TTL = 60 * 60
+
+
+def list_files(
+    file_type: Optional[VideoFileType] = None,
+    processing_state: Optional[VideoFileState] = None,
+    cursor: Optional[int] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Tuple[List[Dict], Optional[int]]:
+    """
+    Returns a page of at most `limit` video files, ordered by primary key,
+    and the cursor of the next page, if any. The cursor is the primary key
+    of the last video file on the page.
+    """
+    query = db.session.query(VideoFile).order_by(VideoFile.pk)
+
+    if file_type is not None:
+        query = query.filter(VideoFile.file_type == file_type)
+
+    if processing_state is not None:
+        query = query.filter(VideoFile.processing_state == processing_state)
+
+    if cursor is not None:
+        query = query.filter(VideoFile.pk > cursor)
+
+    # Fetch one extra row to know whether there is another page
+    video_files = query.limit(limit + 1).all()
+    next_cursor = video_files[limit - 1].pk if len(video_files) > limit else None
+
+    return [SCHEMA.dump(v) for v in video_files[:limit]], next_cursor
+
+
+def cached_listing(
+    file_type: Optional[VideoFileType] = None,
+    processing_state: Optional[VideoFileState] = None,
+    cursor: Optional[int] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> str:
+    """
+    As list_files, serialized as JSON and cached in Redis until a video file
+    is added or changes state
+    """
+    redis = current_app.redis
+
+    # Read before the listing is, so that a listing computed concurrently
+    # with an invalidation is cached under the outdated version
+    version = int(redis.get(video_file.LISTING_VERSION_KEY) or 0)
+
+    key = ':'.join(
+        map(
+            str,
+            [
+                'files:list',
+                version,
+                file_type.name if file_type else None,
+                processing_state.name if processing_state else None,
+                cursor,
+                limit,
+            ],
+        )
+    )
+
+    body = redis.get(key)
+
+    if body is not None:
+        return body.decode('utf-8')
 
-def list_files():
-    video_files = db.session.query(VideoFile).all()
+    files, next_cursor = list_files(file_type, processing_state, cursor, limit)
+    body = json.dumps({'files': files, 'cursor': next_cursor})
+    redis.set(key, body, ex=LISTING_TTL)
 
-    return [SCHEMA.dump(v) for v in video_files]
+    return body
 
 
 def info(filename):
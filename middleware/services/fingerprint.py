@@ -1,32 +1,192 @@
 import itertools
+import json
+import uuid
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
+from flask import current_app
 from loguru import logger
+from rq.exceptions import NoSuchJobError
+from rq.job import Job, JobStatus
+from rq.registry import DeferredJobRegistry, StartedJobRegistry
+from sqlalchemy import func
 
 import middleware.models.fingerprint_comparison_computation as fingerprint_comparison_computation  # noqa: E501
-from video_reuse_detector import ffmpeg
+import middleware.models.video_file as video_file
+from video_reuse_detector import ffmpeg, profiling
 from video_reuse_detector.fingerprint import (
     FingerprintCollection,
     FingerprintComparison,
-    extract_fingerprint_collection,
+    collapse_near_duplicates,
+    detect_letterbox,
+    extract_fingerprint_collection_in_ranges,
+    number_of_segments,
+)
+from video_reuse_detector.profiling import Profile, peak_memory_usage
+
+from .. import metrics
+from ..config import (
+    ADAPTIVE_SAMPLING,
+    COLLAPSE_THRESHOLD,
+    COMPARISON_BATCH_TTL,
+    EXTRACTION_TTL,
+    INTERIM_DIRECTORY,
+    LONG_VIDEO_DURATION,
+    PROFILING,
+    REFERENCES_PER_COMPARISON_JOB,
+    SEGMENTS_PER_CHECKPOINT,
+    SEGMENTS_PER_JOB,
 )
-from video_reuse_detector.profiling import timeit
-
-from ..config import INTERIM_DIRECTORY
 from ..models import db
+from ..models.archived_comparison import ArchivedComparisonModel
 from ..models.fingerprint_collection import FingerprintCollectionModel
 from ..models.fingerprint_collection_computation import FingerprintCollectionComputation
 from ..models.fingerprint_comparison import FingerprintComparisonModel
 from ..models.fingerprint_comparison_computation import FingerprintComparisonComputation
+from ..queues import Priority, extract_queue
+from . import retrieval
+
+
+def last_committed_segment_id(
+    video_name: str, start_segment_id: int = 0, end_segment_id: int = None
+) -> Optional[int]:
+    """
+    Returns the highest segment id in [start_segment_id, end_segment_id)
+    for which fingerprints have been committed, or None if there are none.
+    A fingerprint covering several segments, see run_length, counts as
+    committed for all of them
+    """
+    last_covered = FingerprintCollectionModel.segment_id + func.coalesce(
+        FingerprintCollectionModel.run_length, 1
+    )
 
+    query = db.session.query(func.max(last_covered) - 1).filter(
+        FingerprintCollectionModel.video_name == video_name,
+        FingerprintCollectionModel.segment_id >= start_segment_id,
+    )
 
-@timeit
-def __extract_fingerprint_collection__(file_path: Path) -> List[FingerprintCollection]:
-    return extract_fingerprint_collection(file_path, INTERIM_DIRECTORY)
+    if end_segment_id is not None:
+        query = query.filter(FingerprintCollectionModel.segment_id < end_segment_id)
 
+    return query.scalar()
 
-def __extract_fingerprints__(file_path: Path) -> Path:
+
+def video_ids_by_name(video_names: Iterable[str]) -> Dict[str, int]:
+    VideoFile = video_file.VideoFile
+
+    return dict(
+        db.session.query(VideoFile.video_name, VideoFile.pk).filter(
+            VideoFile.video_name.in_(set(video_names))
+        )
+    )
+
+
+@profiling.profiled('checkpoint')
+def __checkpoint__(video_name: str, fingerprints: List[FingerprintCollection]):
+    VideoFile = video_file.VideoFile
+    VideoFileState = video_file.VideoFileState
+
+    video_id = video_ids_by_name([video_name]).get(video_name)
+
+    # Once removed, e.g. as a rejected upload, the fingerprints of a video
+    # are not stored anymore. Those of a video that is removed after this
+    # point reference it, and are removed along with it
+    if video_id is None:
+        logger.warning(
+            f'{video_name} has been removed, discarding {len(fingerprints)}'
+            ' fingerprints'
+        )
+
+        return
+
+    models = list(
+        map(FingerprintCollectionModel.from_fingerprint_collection, fingerprints)
+    )
+
+    for model in models:
+        model.video_id = video_id
+
+    db.session.bulk_save_objects(models)
+
+    with profiling.span('index_words'):
+        retrieval.index_fingerprints(video_name, video_id, fingerprints)
+
+    fingerprinted_segments = sum(fpc.run_length for fpc in fingerprints)
+
+    # The progress is committed in the same transaction as the fingerprints,
+    # so the two never disagree even if the job is killed
+    db.session.query(VideoFile).filter_by(pk=video_id).update(
+        {
+            VideoFile.fingerprinted_segments: VideoFile.fingerprinted_segments
+            + fingerprinted_segments
+        },
+        synchronize_session=False,
+    )
+
+    # Neither an upload in progress nor a video that has been finalized
+    # already is marked as partially fingerprinted
+    transitioned = (
+        db.session.query(VideoFile)
+        .filter(
+            VideoFile.pk == video_id,
+            VideoFile.processing_state.in_(
+                [VideoFileState.NOT_FINGERPRINTED, VideoFileState.UPLOADED]
+            ),
+        )
+        .update(
+            {VideoFile.processing_state: VideoFileState.PARTIALLY_FINGERPRINTED},
+            synchronize_session=False,
+        )
+    )
+
+    db.session.commit()
+
+    # The cached listings are invalidated as the state of the video changes,
+    # rather than on every checkpoint. Its last state change, to
+    # fingerprinted, invalidates them through emit_event
+    if transitioned > 0:
+        video_file.invalidate_listings()
+
+
+def __extract_fingerprint_collection__(
+    file_path: Path,
+    start_segment_id: int = 0,
+    end_segment_id: int = None,
+    letterbox: Tuple[slice, slice] = None,
+) -> int:
+    """
+    Extracts, and commits, the fingerprints for the given segment range
+    checkpoint by checkpoint. Returns the number of extracted fingerprints.
+    The letterbox is detected unless given, see detect_letterbox
+    """
+    number_of_fingerprints = 0
+
+    ranges = extract_fingerprint_collection_in_ranges(
+        file_path,
+        INTERIM_DIRECTORY,
+        SEGMENTS_PER_CHECKPOINT,
+        start_segment_id,
+        end_segment_id,
+        ADAPTIVE_SAMPLING,
+        letterbox,
+    )
+
+    for range_start, range_end, fingerprints in ranges:
+        # Within the range only, a resumed extraction starts at a range
+        with profiling.span('collapse'):
+            fingerprints = collapse_near_duplicates(fingerprints, COLLAPSE_THRESHOLD)
+
+        __checkpoint__(file_path.name, fingerprints)
+        number_of_fingerprints += len(fingerprints)
+
+        logger.debug(
+            f'Checkpointed segments {range_start}..{range_end} of {file_path.name}'
+        )
+
+    return number_of_fingerprints
+
+
+def __assert_exists__(file_path: Path):
     if not file_path.exists():
         msg = (
             f'Attempted to extract fingerprints for file_path={file_path}'
@@ -44,34 +204,80 @@ def __extract_fingerprints__(file_path: Path) -> Path:
 
         raise ValueError(msg)
 
-    assert file_path.exists()
 
-    fingerprints, processing_time = __extract_fingerprint_collection__(file_path)
-    models = list(
-        map(FingerprintCollectionModel.from_fingerprint_collection, fingerprints)
-    )
+def __set_video_duration__(file_path: Path) -> float:
+    duration = ffmpeg.get_video_duration(file_path)
 
-    db.session.bulk_save_objects(models)
+    db.session.query(video_file.VideoFile).filter_by(
+        video_name=file_path.name
+    ).update({video_file.VideoFile.video_duration: duration}, synchronize_session=False)
+    db.session.commit()
 
-    duration = ffmpeg.get_video_duration(file_path)
-    filename = file_path.name
+    return duration
+
+
+def __record_computation__(
+    path: Path, duration: float, profile: Profile, peak_memory: int
+):
+    """Adds the computation of the extraction of the video to the session"""
+    try:
+        stream_info = ffmpeg.get_video_stream_info(path)
+    except Exception:
+        logger.warning(f'Could not probe the video stream of {path.name}')
+        stream_info = {}
 
-    # TODO: Add if the video has color, and its dimensions, to be able to
-    # gauge how video size and color content affect computation time
     db.session.add(
         FingerprintCollectionComputation(
-            video_name=filename,
+            video_name=path.name,
             video_duration=duration,
-            processing_time=processing_time,
+            processing_time=profile.elapsed,
+            stage_timings=profile.summary(),
+            codec=stream_info.get('codec'),
+            width=stream_info.get('width'),
+            height=stream_info.get('height'),
+            frame_rate=stream_info.get('frame_rate'),
+            frames_decoded=profile.counters.get('frames'),
+            keyframes=profile.counters.get('keyframes'),
+            peak_memory_usage=peak_memory,
         )
     )
 
+
+def __extract_fingerprints__(file_path: Path) -> Path:
+    __assert_exists__(file_path)
+
+    duration = __set_video_duration__(file_path)
+    filename = file_path.name
+
+    # Resume from the last checkpoint if a previous attempt was interrupted
+    last_segment_id = last_committed_segment_id(filename)
+    start_segment_id = 0 if last_segment_id is None else last_segment_id + 1
+
+    if start_segment_id > 0:
+        logger.info(f'Resuming {filename} from segment {start_segment_id}')
+
+    with profiling.collect(PROFILING) as profile:
+        __extract_fingerprint_collection__(file_path, start_segment_id)
+
+    metrics.record(profile)
+    processing_time = profile.elapsed
+
+    # Note that processing_time only covers the last attempt if the
+    # extraction was resumed
+    __record_computation__(file_path, duration, profile, peak_memory_usage())
+
+    db_video_file = (
+        db.session.query(video_file.VideoFile).filter_by(video_name=filename).one()
+    )
+    db_video_file.mark_as_fingerprinted()
     db.session.commit()
 
     logger.success(
         f'Processing {filename} ({duration} seconds of video) took {processing_time}s seconds'  # noqa: E501
     )
 
+    video_file.emit_event(db_video_file, 'video_file_fingerprinted')
+
     return file_path
 
 
@@ -79,12 +285,415 @@ def extract_fingerprints(file_path: str) -> Path:
     return __extract_fingerprints__(Path(file_path))
 
 
-@timeit
+def __extraction_key__(video_name: str, suffix: str) -> str:
+    return f'extraction:{video_name}:{suffix}'
+
+
+def __range_key__(start_segment_id: int, end_segment_id: int) -> str:
+    return f'{start_segment_id}:{end_segment_id}'
+
+
+def __detect_letterbox__(path: Path, duration: float = None) -> Tuple[slice, slice]:
+    """
+    Detects the letterbox of the video, and stores it for the jobs of its
+    ranges, which are thereby cropped alike without seeking through the
+    video again
+    """
+    letterbox = detect_letterbox(path, INTERIM_DIRECTORY, duration)
+
+    current_app.redis.set(
+        __extraction_key__(path.name, 'letterbox'),
+        json.dumps([[bounds.start, bounds.stop] for bounds in letterbox]),
+        ex=EXTRACTION_TTL,
+    )
+
+    return letterbox
+
+
+def __letterbox__(path: Path, duration: float = None) -> Tuple[slice, slice]:
+    """
+    The letterbox of the video as detected when its extraction was planned,
+    or detected anew if that has expired since
+    """
+    stored = current_app.redis.get(__extraction_key__(path.name, 'letterbox'))
+
+    if stored is None:
+        return __detect_letterbox__(path, duration)
+
+    rows, columns = (slice(*bounds) for bounds in json.loads(stored))
+
+    return rows, columns
+
+
+def __job_priority__(duration: float, priority: str) -> Priority:
+    job_priority = Priority(priority)
+
+    if duration > LONG_VIDEO_DURATION:
+        job_priority = job_priority.demote()
+
+    return job_priority
+
+
+def __ranges__(total: int) -> List[Tuple[int, int]]:
+    return [
+        (start, min(start + SEGMENTS_PER_JOB, total))
+        for start in range(0, total, SEGMENTS_PER_JOB)
+    ]
+
+
+def __enqueue_ranges__(
+    file_path: str,
+    ranges: List[Tuple[int, int]],
+    job_priority: Priority,
+    keep_profiles: bool = False,
+):
+    video_name = Path(file_path).name
+    queue = extract_queue(job_priority)
+
+    # The pending ranges are set in the same transaction as the jobs are
+    # enqueued, otherwise the first job could finish before they exist and
+    # finalize the video prematurely
+    pending_key = __extraction_key__(video_name, 'pending')
+
+    with current_app.redis.pipeline() as pipe:
+        pipe.delete(pending_key)
+        pipe.sadd(pending_key, *(__range_key__(*r) for r in ranges))
+        pipe.expire(pending_key, EXTRACTION_TTL)
+
+        if not keep_profiles:
+            pipe.delete(__extraction_key__(video_name, 'profiles'))
+
+        for start_segment_id, end_segment_id in ranges:
+            job = queue.create_job(
+                extract_fingerprints_range,
+                args=(file_path, start_segment_id, end_segment_id, job_priority.value),
+                timeout=6000,
+            )
+            queue.enqueue_job(job, pipeline=pipe)
+
+        pipe.execute()
+
+
+def plan_extraction(file_path: str, priority: str = Priority.NORMAL.value) -> int:
+    """
+    Splits the extraction of the given video into jobs of SEGMENTS_PER_JOB
+    segments each, see extract_fingerprints_range, and enqueues all of them
+    at once so that they can be processed in parallel. The last job to
+    finish enqueues finalize_extraction.
+
+    The jobs are enqueued with the given priority, or the next lower one if
+    the video is longer than LONG_VIDEO_DURATION.
+
+    Returns the number of enqueued jobs
+    """
+    path = Path(file_path)
+    __assert_exists__(path)
+
+    duration = __set_video_duration__(path)
+    ranges = __ranges__(number_of_segments(duration))
+
+    if len(ranges) == 0:
+        logger.warning(f'{path.name} has no segments to extract fingerprints for')
+        finalize_extraction(file_path)
+
+        return 0
+
+    logger.info(f'Extracting fingerprints for {path.name} in {len(ranges)} jobs')
+
+    # Once for all of the ranges
+    __detect_letterbox__(path, duration)
+
+    __enqueue_ranges__(file_path, ranges, __job_priority__(duration, priority))
+
+    return len(ranges)
+
+
+def resume_extraction(file_path: str, priority: str = Priority.NORMAL.value) -> int:
+    """
+    Enqueues the jobs of the ranges of the given video that have not been
+    fingerprinted to their end, e.g. as their job failed or its worker was
+    killed, or finalizes the video if there are none. Returns the number of
+    enqueued jobs
+    """
+    path = Path(file_path)
+    __assert_exists__(path)
+
+    duration = __set_video_duration__(path)
+
+    missing = []
+
+    for start_segment_id, end_segment_id in __ranges__(number_of_segments(duration)):
+        last_segment_id = last_committed_segment_id(
+            path.name, start_segment_id, end_segment_id
+        )
+
+        # The last segment of a video with a fractional length might not
+        # contain any frames, in which case its range is resumed needlessly
+        if last_segment_id is None or last_segment_id < end_segment_id - 1:
+            missing.append((start_segment_id, end_segment_id))
+
+    if len(missing) == 0:
+        extract_queue(Priority(priority)).enqueue(
+            finalize_extraction, file_path, at_front=True
+        )
+
+        return 0
+
+    logger.info(f'Resuming {len(missing)} ranges of {path.name}')
+
+    __letterbox__(path, duration)
+
+    __enqueue_ranges__(
+        file_path, missing, __job_priority__(duration, priority), keep_profiles=True
+    )
+
+    return len(missing)
+
+
+def __active_extractions__() -> Set[str]:
+    """
+    The paths of the videos with extraction jobs that are queued, deferred
+    or being executed. Every extraction job takes the path as its first
+    argument
+    """
+    file_paths: Set[str] = set()
+    redis = current_app.redis
+
+    for queue in current_app.extract_queues.values():
+        job_ids = queue.get_job_ids() + StartedJobRegistry(queue=queue).get_job_ids()
+        jobs = Job.fetch_many(job_ids, connection=redis)
+
+        # A deferred job, e.g. the planning of an upload, waits for a job
+        # that is never going to finish if that job failed
+        for job in Job.fetch_many(
+            DeferredJobRegistry(queue=queue).get_job_ids(), connection=redis
+        ):
+            try:
+                dependencies = job.fetch_dependencies() if job is not None else []
+            except NoSuchJobError:
+                continue
+
+            if all(d.get_status() != JobStatus.FAILED for d in dependencies):
+                jobs.append(job)
+
+        for job in jobs:
+            # Jobs that expired since their ids were read are None
+            if job is not None and len(job.args) > 0:
+                file_paths.add(job.args[0])
+
+    return file_paths
+
+
+def resume_stalled_extractions() -> int:
+    """
+    Resumes the extractions that are neither finished nor have any jobs
+    left, which a failed job of a range leaves behind as rq does not retry
+    it, see resume_extraction. Returns the number of resumed videos
+    """
+    VideoFile = video_file.VideoFile
+    VideoFileState = video_file.VideoFileState
+
+    active = __active_extractions__()
+
+    # Uploads are planned once they complete
+    unfinished = db.session.query(VideoFile.file_path).filter(
+        VideoFile.processing_state.notin_(
+            [VideoFileState.FINGERPRINTED, VideoFileState.UPLOADING]
+        )
+    )
+
+    stalled = [file_path for (file_path,) in unfinished if file_path not in active]
+
+    for file_path in stalled:
+        try:
+            resume_extraction(file_path)
+        except ValueError:
+            # The file is missing, which __assert_exists__ has logged
+            continue
+
+    return len(stalled)
+
+
+def __resume_extraction__(
+    path: Path,
+    start_segment_id: int,
+    end_segment_id: int,
+    letterbox: Tuple[slice, slice] = None,
+) -> Profile:
+    last_segment_id = last_committed_segment_id(
+        path.name, start_segment_id, end_segment_id
+    )
+    resume_from = start_segment_id if last_segment_id is None else last_segment_id + 1
+
+    with profiling.collect(PROFILING) as profile:
+        __extract_fingerprint_collection__(
+            path, resume_from, end_segment_id, letterbox
+        )
+
+    metrics.record(profile)
+
+    return profile
+
+
+def extract_received_fingerprints_range(
+    file_path: str, start_segment_id: int, end_segment_id: int
+) -> Path:
+    """
+    Extracts the fingerprints for the segments [start_segment_id,
+    end_segment_id) of a video that is still being uploaded, see
+    services.uploads. Unlike extract_fingerprints_range this is not part of
+    a planned extraction: once the upload completes the video is planned as
+    usual, and the jobs of the ranges extracted here resume past them.
+
+    The path is a link that is removed once the upload is aborted or
+    rejected, see services.uploads.release_received_file, and the jobs of
+    an upload are chained, so a job never fails. The planned extraction,
+    which depends on the last of them, extracts whatever they did not.
+    """
+    path = Path(file_path)
+
+    if not path.exists():
+        logger.info(f'{path.name} is no longer being uploaded, skipping...')
+
+        return path
+
+    try:
+        __resume_extraction__(path, start_segment_id, end_segment_id)
+    except Exception:
+        logger.exception(
+            f'Could not extract segments [{start_segment_id}, {end_segment_id})'
+            f' of {path.name} while it was being uploaded'
+        )
+
+    return path
+
+
+def extract_fingerprints_range(
+    file_path: str,
+    start_segment_id: int,
+    end_segment_id: int,
+    priority: str = Priority.NORMAL.value,
+) -> Path:
+    """
+    Extracts the fingerprints for the segments [start_segment_id,
+    end_segment_id) of the given video. Being checkpointed, a retried job
+    resumes where the previous attempt left off.
+    """
+    path = Path(file_path)
+    __assert_exists__(path)
+
+    profile = __resume_extraction__(
+        path, start_segment_id, end_segment_id, __letterbox__(path)
+    )
+
+    # Merged by finalize_extraction
+    redis = current_app.redis
+    profiles_key = __extraction_key__(path.name, 'profiles')
+
+    with redis.pipeline() as pipe:
+        pipe.rpush(
+            profiles_key,
+            json.dumps(
+                {'profile': profile.to_dict(), 'peak_memory_usage': peak_memory_usage()}
+            ),
+        )
+        pipe.expire(profiles_key, EXTRACTION_TTL)
+        pipe.execute()
+
+    pending_key = __extraction_key__(path.name, 'pending')
+
+    with redis.pipeline() as pipe:
+        pipe.srem(pending_key, __range_key__(start_segment_id, end_segment_id))
+        pipe.scard(pending_key)
+        removed, remaining = pipe.execute()
+
+    # Fan-in, whichever job finishes the last pending range finalizes the
+    # video. A range that is finished again, e.g. by a job that is retried
+    # after its worker died, is no longer pending and finalizes nothing. If a
+    # job fails instead its range is left pending, and the extraction is left
+    # to resume_stalled_extractions
+    if removed == 1 and remaining == 0:
+        # Important to enqueue at front otherwise the UI is not notified until
+        # the entire set of videos available at start-up has been processed.
+        extract_queue(Priority(priority)).enqueue(
+            finalize_extraction, file_path, at_front=True
+        )
+
+    return path
+
+
+def finalize_extraction(file_path: str) -> Path:
+    """
+    Records the computation, and marks the video as fingerprinted, once all
+    of its extraction jobs have finished
+    """
+    path = Path(file_path)
+    filename = path.name
+
+    redis = current_app.redis
+    profiles_key = __extraction_key__(filename, 'profiles')
+
+    profile = Profile()
+    peak_memory = 0
+
+    for job in map(json.loads, redis.lrange(profiles_key, 0, -1)):
+        profile.merge(Profile.from_dict(job['profile']))
+        peak_memory = max(peak_memory, job['peak_memory_usage'])
+
+    processing_time = profile.elapsed
+
+    db_video_file = (
+        db.session.query(video_file.VideoFile).filter_by(video_name=filename).one()
+    )
+    duration = db_video_file.video_duration
+
+    fingerprinted_segments = (
+        db.session.query(
+            func.sum(func.coalesce(FingerprintCollectionModel.run_length, 1))
+        )
+        .filter(FingerprintCollectionModel.video_name == filename)
+        .scalar()
+        or 0
+    )
+
+    # For videos with a fractional length the last segment might not contain
+    # any frames, hence the expected number of segments is off by one
+    expected = number_of_segments(duration) - 1 if duration is not None else 0
+
+    if fingerprinted_segments < expected:
+        logger.warning(
+            f'Only {fingerprinted_segments} segments of {filename} were fingerprinted'
+            f' ({duration} seconds of video)'
+        )
+
+    # Note that processing_time is the sum of the processing times of the
+    # individual jobs, not the wall time
+    __record_computation__(path, duration, profile, peak_memory)
+
+    # The computation is recorded in the same transaction as the video is
+    # marked as fingerprinted
+    db_video_file.mark_as_fingerprinted()
+    db.session.commit()
+
+    redis.delete(
+        profiles_key,
+        __extraction_key__(filename, 'pending'),
+        __extraction_key__(filename, 'letterbox'),
+    )
+
+    logger.success(
+        f'Processing {filename} ({duration} seconds of video) took {processing_time}s seconds'  # noqa: E501
+    )
+
+    video_file.emit_event(db_video_file, 'video_file_fingerprinted')
+
+    return path
+
+
 def __compare_fingerprints__(
-    query_video_name, reference_video_name
+    query_fps: List[FingerprintCollection], reference_video_name
 ) -> List[FingerprintComparison]:
     # One per segment
-    query_fps = fingerprint_collections_for_video_with_name(query_video_name)
     reference_fps = fingerprint_collections_for_video_with_name(reference_video_name)
 
     # Yields a map wherein each key is a segment in the query video and the value
@@ -105,17 +714,103 @@ def model_from_comparison(fpc: FingerprintComparison) -> FingerprintComparisonMo
     return FingerprintComparisonModel.from_fingerprint_comparison(fpc)
 
 
-def compare_fingerprints(query_video_name, reference_video_name):
-    all_comparisons, processing_time = __compare_fingerprints__(
-        query_video_name, reference_video_name
+def delete_comparisons(query_video_name: str, reference_video_name: str) -> int:
+    """
+    Deletes the comparisons between the given videos, archived or not, and
+    returns the number of deleted rows. The caller commits.
+    """
+    deleted = (
+        db.session.query(FingerprintComparisonModel)
+        .filter(
+            # Restricting the query video confines the delete to a single
+            # partition
+            FingerprintComparisonModel.query_video_name == query_video_name,
+            FingerprintComparisonModel.reference_video_name == reference_video_name,
+        )
+        .delete(synchronize_session=False)
+    )
+
+    db.session.query(ArchivedComparisonModel).filter_by(
+        query_video_name=query_video_name, reference_video_name=reference_video_name
+    ).delete(synchronize_session=False)
+
+    return deleted
+
+
+def replace_comparisons(
+    query_video_name: str,
+    reference_video_name: str,
+    comparison_models: List[FingerprintComparisonModel],
+):
+    """
+    Replaces the comparisons between the given videos, such that comparing
+    a pair anew does not violate the uniqueness of its segment pairs. The
+    caller commits.
+    """
+    deleted = delete_comparisons(query_video_name, reference_video_name)
+
+    if deleted > 0:
+        logger.info(
+            f'Replacing {deleted} comparisons between "{query_video_name}"'
+            f' and "{reference_video_name}"'
+        )
+
+    db.session.bulk_save_objects(comparison_models)
+
+
+def archive_comparisons(query_video_name: str, reference_video_name: str) -> bool:
+    """
+    Moves the comparisons between the given videos out of the comparisons
+    table and into a single compressed row. Returns False if there was
+    nothing to archive.
+    """
+    models = (
+        db.session.query(FingerprintComparisonModel)
+        .filter(
+            FingerprintComparisonModel.query_video_name == query_video_name,
+            FingerprintComparisonModel.reference_video_name == reference_video_name,
+        )
+        .order_by(
+            FingerprintComparisonModel.query_segment_id,
+            FingerprintComparisonModel.reference_segment_id,
+        )
+        .all()
+    )
+
+    if len(models) == 0:
+        return False
+
+    archive = ArchivedComparisonModel.from_comparison_models(models)
+
+    delete_comparisons(query_video_name, reference_video_name)
+    db.session.add(archive)
+    db.session.commit()
+
+    logger.info(
+        f'Archived {len(models)} comparisons between "{query_video_name}"'
+        f' and "{reference_video_name}" into {len(archive.comparisons)} bytes'
     )
 
+    return True
+
+
+def __store_comparisons__(
+    query_video_name: str,
+    reference_video_name: str,
+    all_comparisons: List[FingerprintComparison],
+    profile: Profile,
+):
+    # Persisting is profiled, but not part of the processing time
+    processing_time = profile.elapsed
+
     # TODO: Can possibly associate computations to object through db.relationship?
     query_video_duration = get_video_duration(query_video_name)
     reference_video_duration = get_video_duration(reference_video_name)
 
     comparison_models = list(map(model_from_comparison, all_comparisons))
-    db.session.bulk_save_objects(comparison_models)
+
+    with profiling.collect(PROFILING, profile), profiling.span('persist'):
+        replace_comparisons(query_video_name, reference_video_name, comparison_models)
 
     fpcc = FingerprintComparisonComputation(
         query_video_name=query_video_name,
@@ -123,19 +818,114 @@ def compare_fingerprints(query_video_name, reference_video_name):
         query_video_duration=query_video_duration,
         reference_video_duration=reference_video_duration,
         processing_time=processing_time,
+        stage_timings=profile.summary(),
     )
 
     db.session.add(fpcc)
     db.session.commit()
     fingerprint_comparison_computation.after_insert(fpcc)
 
+
+def compare_fingerprints(query_video_name, reference_video_name):
+    return compare_fingerprints_batch(query_video_name, [reference_video_name])
+
+
+def __batch_key__(batch_id: str) -> str:
+    return f'comparison_batch:{batch_id}'
+
+
+def compare_fingerprints_batch(
+    query_video_name: str, reference_video_names: List[str], batch_id: str = None
+):
+    """
+    Compares the query video against each of the reference videos, loading
+    the fingerprints of the query video once. If part of a batch, see
+    plan_comparisons, the progress of the batch is updated after every
+    reference video.
+    """
+    query_fps = fingerprint_collections_for_video_with_name(query_video_name)
+
+    for reference_video_name in reference_video_names:
+        with profiling.collect(PROFILING) as profile:
+            all_comparisons = __compare_fingerprints__(query_fps, reference_video_name)
+
+        __store_comparisons__(
+            query_video_name, reference_video_name, all_comparisons, profile
+        )
+        metrics.record(profile)
+
+        if batch_id is not None:
+            __complete_batch_pair__(batch_id)
+
     return True
 
 
+def __complete_batch_pair__(batch_id: str):
+    key = __batch_key__(batch_id)
+    redis = current_app.redis
+
+    completed = redis.hincrby(key, 'completed', 1)
+
+    if completed == int(redis.hget(key, 'total') or 0):
+        fingerprint_comparison_computation.after_batch_completed(batch_id)
+
+
+def plan_comparisons(pairs: Dict[str, List[str]]) -> str:
+    """
+    Enqueues the comparisons between each query video and its reference
+    videos, in jobs of at most REFERENCES_PER_COMPARISON_JOB reference
+    videos each, as a single batch.
+
+    Returns the id of the batch, the progress of which is available through
+    comparison_batch_progress
+    """
+    batch_id = uuid.uuid4().hex
+    key = __batch_key__(batch_id)
+    queue = current_app.compare_queue
+
+    total = sum(map(len, pairs.values()))
+
+    with current_app.redis.pipeline() as pipe:
+        pipe.hset(key, 'total', total)
+        pipe.hset(key, 'completed', 0)
+        pipe.expire(key, COMPARISON_BATCH_TTL)
+
+        for query_video_name, reference_video_names in pairs.items():
+            n = REFERENCES_PER_COMPARISON_JOB
+
+            for i in range(0, len(reference_video_names), n):
+                chunk = reference_video_names[i : i + n]
+
+                job = queue.create_job(
+                    compare_fingerprints_batch,
+                    args=(query_video_name, chunk, batch_id),
+                    timeout=6000 * len(chunk),
+                )
+                queue.enqueue_job(job, pipeline=pipe)
+
+        pipe.execute()
+
+    logger.info(f'Enqueued {total} comparisons as batch {batch_id}')
+
+    return batch_id
+
+
+def comparison_batch_progress(batch_id: str) -> Optional[Dict[str, int]]:
+    progress = current_app.redis.hgetall(__batch_key__(batch_id))
+
+    if not progress:
+        return None
+
+    return {k.decode('utf-8'): int(v) for k, v in progress.items()}
+
+
+@profiling.profiled('load')
 def fingerprint_collections_for_video_with_name(video_name):
+    # Extraction jobs may commit their segments in any order
     models = (
         db.session.query(FingerprintCollectionModel)
         .filter_by(video_name=video_name)
+        .order_by(FingerprintCollectionModel.segment_id)
         .all()
     )
 
@@ -0,0 +1,124 @@
+"""
+Lookups of near-duplicate segments across the archive by their perceptual
+hashes, see video_reuse_detector.phash.
+
+Each chunk of the hashes of the query segments is looked up in the index
+of that chunk, which by the pigeonhole principle finds every segment whose
+hash is within phash.RADIUS bits of a query hash, and only those
+candidates are compared bit by bit. Unlike a comparison, which compares a
+query video to one reference video segment by segment, a lookup covers
+the entire archive at once, and is what comparisons can be restricted to,
+see candidate_references.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import or_
+
+from video_reuse_detector import phash
+
+from ..models import db
+from ..models.fingerprint_collection import FingerprintCollectionModel
+
+
+CHUNK_COLUMNS = [
+    FingerprintCollectionModel.phash_0,
+    FingerprintCollectionModel.phash_1,
+    FingerprintCollectionModel.phash_2,
+    FingerprintCollectionModel.phash_3,
+]
+
+assert len(CHUNK_COLUMNS) == phash.CHUNKS
+
+# (query segment id, reference segment id, Hamming distance)
+Match = Tuple[int, int, int]
+
+
+def query_hashes(video_name: str) -> Dict[int, int]:
+    """The hashes of the informative segments of the video by segment id"""
+    return dict(
+        db.session.query(
+            FingerprintCollectionModel.segment_id, FingerprintCollectionModel.phash
+        ).filter(
+            FingerprintCollectionModel.video_name == video_name,
+            FingerprintCollectionModel.phash.isnot(None),
+            FingerprintCollectionModel.informative.isnot(False),
+        )
+    )
+
+
+def near_duplicates(
+    video_name: str,
+    radius: int = phash.RADIUS,
+    reference_video_names: Iterable[str] = None,
+) -> Dict[str, List[Match]]:
+    """
+    The segments of other videos, optionally restricted to the given ones,
+    with hashes within `radius` bits of those of the segments of the given
+    video, as lists of matches by video name
+    """
+    assert 0 <= radius <= phash.RADIUS
+
+    hashes = query_hashes(video_name)
+
+    if len(hashes) == 0:
+        return {}
+
+    # The query segments by the value of each of their chunks
+    segments_by_chunk: List[Dict[int, List[int]]] = [
+        defaultdict(list) for _ in range(phash.CHUNKS)
+    ]
+
+    for segment_id, h in hashes.items():
+        for i, chunk in enumerate(phash.chunks(h)):
+            segments_by_chunk[i][chunk].append(segment_id)
+
+    candidates = db.session.query(
+        FingerprintCollectionModel.video_name,
+        FingerprintCollectionModel.segment_id,
+        FingerprintCollectionModel.phash,
+    ).filter(
+        FingerprintCollectionModel.video_name != video_name,
+        FingerprintCollectionModel.informative.isnot(False),
+        or_(
+            *(
+                column.in_(list(segments_by_chunk[i].keys()))
+                for i, column in enumerate(CHUNK_COLUMNS)
+            )
+        ),
+    )
+
+    if reference_video_names is not None:
+        candidates = candidates.filter(
+            FingerprintCollectionModel.video_name.in_(list(reference_video_names))
+        )
+
+    matches: Dict[str, List[Match]] = defaultdict(list)
+
+    for reference_video_name, reference_segment_id, h in candidates:
+        # The query segments that share a chunk with the candidate
+        query_segment_ids = {
+            segment_id
+            for i, chunk in enumerate(phash.chunks(h))
+            for segment_id in segments_by_chunk[i].get(chunk, [])
+        }
+
+        for query_segment_id in sorted(query_segment_ids):
+            distance = phash.hamming_distance(hashes[query_segment_id], h)
+
+            if distance <= radius:
+                matches[reference_video_name].append(
+                    (query_segment_id, reference_segment_id, distance)
+                )
+
+    return dict(matches)
+
+
+def candidate_references(
+    query_video_name: str, reference_video_names: Iterable[str]
+) -> Set[str]:
+    """
+    The reference videos with at least one segment that is a near-duplicate
+    of a segment of the query video
+    """
+    return set(near_duplicates(query_video_name, phash.RADIUS, reference_video_names))
@@ -0,0 +1,423 @@
+"""
+Retrieval of the segments across the archive that look like the segments
+of a video, by the visual words of their ORB descriptors, see
+video_reuse_detector.vocabulary.
+
+Segments are indexed as they are fingerprinted, see index_fingerprints, in
+the inverted file of the most recently trained vocabulary. A retrieval
+quantizes the descriptors of the query segments into words, looks up the
+postings of those words only, and scores the segments that share words
+with the query segments by tf-idf. Pairwise matching of ORB descriptors,
+see ORB.similar_to, is left to verify the best scoring candidates.
+"""
+import functools
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import func, tuple_
+
+from video_reuse_detector.orb import ORB
+from video_reuse_detector.vocabulary import (
+    DESCRIPTOR_BYTES,
+    Vocabulary,
+    inverse_document_frequency,
+    tf_idf_scores,
+)
+
+from ..models import db
+from ..models.fingerprint_collection import FingerprintCollectionModel
+from ..models.visual_word import VisualVocabularyModel, VisualWordModel
+
+
+# Words that occur in more than this share of the indexed segments are too
+# common to tell segments apart, and have the longest postings, so they
+# are not looked up. Unless they occur in at most STOP_WORD_POSTINGS
+# segments, which are cheap to look up in any case and keep small archives
+# from having nothing but stop words
+STOP_WORD_FREQUENCY = 0.05
+STOP_WORD_POSTINGS = 1000
+
+# The best scoring reference segments of each query segment that are kept
+# as candidates
+CANDIDATES_PER_SEGMENT = 5
+
+# As fingerprint.compare_orb
+VERIFICATION_THRESHOLD = 0.7
+
+# (query segment id, reference segment id, score)
+Candidate = Tuple[int, int, float]
+
+
+@functools.lru_cache(maxsize=2)
+def __load_vocabulary__(vocabulary_id: int, trained_on) -> Vocabulary:
+    # Vocabularies are never changed once trained. The time of training
+    # tells apart vocabularies with the same id in recreated databases
+    return db.session.query(VisualVocabularyModel).get(vocabulary_id).to_vocabulary()
+
+
+def active_vocabulary() -> Optional[Tuple[int, Vocabulary]]:
+    """The id of the most recently trained vocabulary and the vocabulary"""
+    latest = (
+        db.session.query(VisualVocabularyModel.pk, VisualVocabularyModel.trained_on)
+        .order_by(VisualVocabularyModel.pk.desc())
+        .first()
+    )
+
+    if latest is None:
+        return None
+
+    vocabulary_id, trained_on = latest
+
+    return vocabulary_id, __load_vocabulary__(vocabulary_id, trained_on)
+
+
+def sample_descriptors(number_of_descriptors: int) -> np.ndarray:
+    """
+    The descriptors of informative segments picked at random across the
+    archive, until there are `number_of_descriptors` of them
+    """
+    query = (
+        db.session.query(FingerprintCollectionModel.orb)
+        .filter(
+            FingerprintCollectionModel.orb.isnot(None),
+            FingerprintCollectionModel.informative.isnot(False),
+        )
+        .order_by(func.random())
+        .yield_per(1000)
+    )
+
+    sampled: List[np.ndarray] = []
+    n = 0
+
+    for (orb,) in query:
+        descriptors = np.array(orb, dtype=np.uint8).reshape(-1, DESCRIPTOR_BYTES)
+        sampled.append(descriptors)
+        n += len(descriptors)
+
+        if n >= number_of_descriptors:
+            break
+
+    if len(sampled) == 0:
+        return np.zeros((0, DESCRIPTOR_BYTES), dtype=np.uint8)
+
+    return np.concatenate(sampled)[:number_of_descriptors]
+
+
+def train_vocabulary(
+    number_of_words: int, number_of_descriptors: int, iterations: int
+) -> VisualVocabularyModel:
+    """
+    Trains a vocabulary on descriptors sampled from the archive and makes it
+    the active one. The archive has to be indexed with it, see index_video,
+    before retrievals find anything
+    """
+    descriptors = sample_descriptors(number_of_descriptors)
+
+    if len(descriptors) == 0:
+        raise ValueError('There are no descriptors to train a vocabulary on')
+
+    logger.info(f'Training {number_of_words} words on {len(descriptors)} descriptors')
+
+    vocabulary = Vocabulary.train(descriptors, number_of_words, iterations)
+
+    model = VisualVocabularyModel(
+        number_of_words=len(vocabulary), words=vocabulary.to_bytes()
+    )
+    db.session.add(model)
+    db.session.commit()
+
+    return model
+
+
+def __index__(
+    vocabulary_id: int,
+    vocabulary: Vocabulary,
+    video_name: str,
+    video_id: Optional[int],
+    segments: Iterable[Tuple[int, np.ndarray]],
+) -> int:
+    """
+    Adds the words of the descriptors of the segments, by segment id, to the
+    inverted file of the vocabulary, without committing. Returns the number
+    of indexed segments
+    """
+    rows = []
+    indexed = 0
+
+    for segment_id, descriptors in segments:
+        bag = vocabulary.bag_of_words(descriptors)
+
+        rows.extend(
+            {
+                'vocabulary_id': vocabulary_id,
+                'word_id': word_id,
+                'video_name': video_name,
+                'video_id': video_id,
+                'segment_id': segment_id,
+                'frequency': tf,
+            }
+            for word_id, tf in bag.items()
+        )
+        indexed += 1
+
+    if len(rows) > 0:
+        db.session.bulk_insert_mappings(VisualWordModel, rows)
+
+    return indexed
+
+
+def index_fingerprints(
+    video_name: str, video_id: Optional[int], fingerprints: Iterable
+) -> int:
+    """
+    Indexes the informative fingerprints with descriptors with the active
+    vocabulary, if there is one, in the transaction of the session, see
+    services.fingerprint.__checkpoint__
+    """
+    active = active_vocabulary()
+
+    if active is None:
+        return 0
+
+    vocabulary_id, vocabulary = active
+
+    segments = [
+        (fpc.segment_id, np.asarray(fpc.orb.descriptors, dtype=np.uint8))
+        for fpc in fingerprints
+        if fpc.orb is not None and fpc.informative
+    ]
+
+    return __index__(vocabulary_id, vocabulary, video_name, video_id, segments)
+
+
+def __descriptors_of__(video_name: str) -> Dict[int, np.ndarray]:
+    """The descriptors of the informative segments of the video by segment id"""
+    rows = db.session.query(
+        FingerprintCollectionModel.segment_id, FingerprintCollectionModel.orb
+    ).filter(
+        FingerprintCollectionModel.video_name == video_name,
+        FingerprintCollectionModel.orb.isnot(None),
+        FingerprintCollectionModel.informative.isnot(False),
+    )
+
+    return {
+        segment_id: np.array(orb, dtype=np.uint8).reshape(-1, DESCRIPTOR_BYTES)
+        for segment_id, orb in rows
+    }
+
+
+def index_video(video_name: str) -> int:
+    """
+    (Re)indexes the fingerprinted segments of the video with the active
+    vocabulary, e.g. those fingerprinted before it was trained. Returns the
+    number of indexed segments
+    """
+    active = active_vocabulary()
+
+    if active is None:
+        raise ValueError('No vocabulary has been trained')
+
+    vocabulary_id, vocabulary = active
+
+    db.session.query(VisualWordModel).filter_by(
+        vocabulary_id=vocabulary_id, video_name=video_name
+    ).delete(synchronize_session=False)
+
+    video_id = (
+        db.session.query(FingerprintCollectionModel.video_id)
+        .filter_by(video_name=video_name)
+        .limit(1)
+        .scalar()
+    )
+
+    indexed = __index__(
+        vocabulary_id,
+        vocabulary,
+        video_name,
+        video_id,
+        __descriptors_of__(video_name).items(),
+    )
+
+    db.session.commit()
+
+    return indexed
+
+
+def document_frequencies(vocabulary_id: int, word_ids: Iterable[int]) -> Dict[int, int]:
+    """The number of indexed segments that each of the words occurs in"""
+    return dict(
+        db.session.query(VisualWordModel.word_id, func.count())
+        .filter(
+            VisualWordModel.vocabulary_id == vocabulary_id,
+            VisualWordModel.word_id.in_(list(word_ids)),
+        )
+        .group_by(VisualWordModel.word_id)
+    )
+
+
+def candidates(
+    video_name: str, reference_video_names: Iterable[str] = None
+) -> Dict[str, List[Candidate]]:
+    """
+    The best scoring segments of other videos, optionally restricted to the
+    given ones, for every segment of the given video, as lists of
+    candidates by video name
+    """
+    active = active_vocabulary()
+
+    if active is None:
+        raise ValueError('No vocabulary has been trained')
+
+    vocabulary_id, vocabulary = active
+
+    # The number of documents is counted from the inverted file, rather than
+    # kept in the vocabulary, as every checkpoint of every extraction would
+    # otherwise update (and lock) the same vocabulary row
+    documents = (
+        db.session.query(VisualWordModel.video_name, VisualWordModel.segment_id)
+        .filter_by(vocabulary_id=vocabulary_id)
+        .distinct()
+        .count()
+    )
+
+    # The query video is quantized anew, rather than looked up, so that it
+    # need not have been indexed with the active vocabulary
+    bags = {
+        segment_id: vocabulary.bag_of_words(descriptors)
+        for segment_id, descriptors in __descriptors_of__(video_name).items()
+    }
+    word_ids = set().union(*bags.values())
+
+    if len(word_ids) == 0 or documents == 0:
+        return {}
+
+    idfs = {
+        word_id: inverse_document_frequency(df, documents)
+        for word_id, df in document_frequencies(vocabulary_id, word_ids).items()
+        if df <= max(STOP_WORD_FREQUENCY * documents, STOP_WORD_POSTINGS)
+    }
+
+    if len(idfs) == 0:
+        return {}
+
+    postings = db.session.query(
+        VisualWordModel.video_name,
+        VisualWordModel.segment_id,
+        VisualWordModel.word_id,
+        VisualWordModel.frequency,
+    ).filter(
+        VisualWordModel.vocabulary_id == vocabulary_id,
+        VisualWordModel.word_id.in_(list(idfs.keys())),
+        VisualWordModel.video_name != video_name,
+    )
+
+    if reference_video_names is not None:
+        postings = postings.filter(
+            VisualWordModel.video_name.in_(list(reference_video_names))
+        )
+
+    # Documents are segments, by video name and segment id
+    scores = tf_idf_scores(
+        bags,
+        (
+            ((name, segment_id), word_id, tf)
+            for name, segment_id, word_id, tf in postings
+        ),
+        idfs,
+    )
+
+    # The reference segments of each query segment, best first
+    by_query_segment: Dict[int, List[Tuple[float, str, int]]] = defaultdict(list)
+
+    for (query_segment_id, (name, segment_id)), score in scores.items():
+        by_query_segment[query_segment_id].append((score, name, segment_id))
+
+    result: Dict[str, List[Candidate]] = defaultdict(list)
+
+    for query_segment_id, scored in sorted(by_query_segment.items()):
+        scored.sort(key=lambda s: (-s[0], s[1], s[2]))
+
+        for score, name, segment_id in scored[:CANDIDATES_PER_SEGMENT]:
+            result[name].append((query_segment_id, segment_id, score))
+
+    return dict(result)
+
+
+def verify(
+    video_name: str, candidates_by_video: Dict[str, List[Candidate]]
+) -> Dict[str, List[Candidate]]:
+    """
+    The candidates whose ORB descriptors match those of their query
+    segment, see ORB.similar_to
+    """
+    query_orbs = {
+        segment_id: ORB(descriptors.tolist())
+        for segment_id, descriptors in __descriptors_of__(video_name).items()
+    }
+
+    keys = {
+        (name, segment_id)
+        for name, found in candidates_by_video.items()
+        for _, segment_id, _ in found
+    }
+
+    reference_orbs: Dict[Tuple[str, int], ORB] = {}
+
+    if len(keys) > 0:
+        rows = db.session.query(
+            FingerprintCollectionModel.video_name,
+            FingerprintCollectionModel.segment_id,
+            FingerprintCollectionModel.orb,
+        ).filter(
+            FingerprintCollectionModel.orb.isnot(None),
+            tuple_(
+                FingerprintCollectionModel.video_name,
+                FingerprintCollectionModel.segment_id,
+            ).in_(list(keys)),
+        )
+
+        reference_orbs = {
+            (name, segment_id): ORB(np.array(orb, dtype=np.uint8).tolist())
+            for name, segment_id, orb in rows
+        }
+
+    verified: Dict[str, List[Candidate]] = defaultdict(list)
+
+    for name, found in candidates_by_video.items():
+        for query_segment_id, segment_id, score in found:
+            reference_orb = reference_orbs.get((name, segment_id))
+
+            if reference_orb is None:
+                continue
+
+            similarity = query_orbs[query_segment_id].similar_to(reference_orb)
+
+            if similarity >= VERIFICATION_THRESHOLD:
+                verified[name].append((query_segment_id, segment_id, score))
+
+    return dict(verified)
+
+
+def retrieve(
+    video_name: str,
+    reference_video_names: Iterable[str] = None,
+    verify_candidates: bool = True,
+) -> List[Tuple[str, float, List[Candidate]]]:
+    """
+    The reference videos with segments that look like those of the given
+    video, as (video name, score, candidates), where the score is the sum of
+    the scores of the candidates, best first
+    """
+    found = candidates(video_name, reference_video_names)
+
+    if verify_candidates:
+        found = verify(video_name, found)
+
+    ranked = [
+        (name, sum(score for _, _, score in matches), matches)
+        for name, matches in found.items()
+    ]
+
+    return sorted(ranked, key=lambda r: (-r[1], r[0]))
@@ -0,0 +1,317 @@
+"""
+Chunked, resumable uploads.
+
+An upload is started with the name and size of the file, after which its
+contents are sent in order, one chunk per request, and written to a
+partial file next to its destination. A completed upload is checked for
+duplicates by the SHA-256 of its contents, which is computed from the
+partial file rather than as the chunks arrive, since the chunks of an
+upload may be received by different processes of the web server.
+
+While the upload is in progress, the fingerprints of the part of the
+video that has been received can be extracted, see
+enqueue_received_segments. Those jobs read the file through a hard link of
+its own, which stays in place when the completed file is moved to its
+destination, until the jobs are done, see release_received_file.
+"""
+import hashlib
+import math
+import os
+import shutil
+import uuid
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import IO, Optional
+
+from flask import current_app
+from loguru import logger
+from rq.job import Job, JobStatus
+
+from video_reuse_detector import ffmpeg
+
+from ..config import SEGMENTS_PER_JOB
+from ..queues import Priority, extract_queue
+from .fingerprint import extract_received_fingerprints_range
+
+
+# Bytes read from the request, and hashed, at a time
+READ_SIZE = 1024 * 1024
+
+PARTIAL_DIRECTORY_NAME = '.partial'
+RECEIVED_DIRECTORY_NAME = '.received'
+
+# Uploads that have not received a chunk for this long (in seconds) are
+# forgotten, their partial files have to be removed manually
+UPLOAD_TTL = 24 * 60 * 60
+
+
+class UploadOffsetMismatch(Exception):
+    def __init__(self, expected: int, actual: int):
+        super().__init__(f'Expected a chunk at offset {expected}, got {actual}')
+        self.expected = expected
+        self.actual = actual
+
+
+@dataclass
+class Upload:
+    upload_id: str
+    video_name: str
+    destination: str
+    size: int
+    received: int = 0
+    # The number of leading segments for which extraction has been enqueued
+    enqueued_segments: int = 0
+    # The most recently enqueued extraction of received segments, see
+    # enqueue_received_segments
+    last_job_id: str = ''
+
+    @property
+    def partial_path(self) -> Path:
+        destination = Path(self.destination)
+        return destination.parent / PARTIAL_DIRECTORY_NAME / destination.name
+
+    @property
+    def received_path(self) -> Path:
+        """
+        The hard link to the partial file that the received segments are
+        extracted from. Named after the video, as the fingerprints are
+        """
+        destination = Path(self.destination)
+        return (
+            destination.parent
+            / RECEIVED_DIRECTORY_NAME
+            / self.upload_id
+            / destination.name
+        )
+
+    @property
+    def is_complete(self) -> bool:
+        return self.received >= self.size
+
+    def save(self):
+        key = __upload_key__(self.upload_id)
+
+        with current_app.redis.pipeline() as pipe:
+            pipe.hmset(key, asdict(self))
+            pipe.expire(key, UPLOAD_TTL)
+            pipe.execute()
+
+    @staticmethod
+    def load(upload_id: str) -> Optional['Upload']:
+        fields = current_app.redis.hgetall(__upload_key__(upload_id))
+
+        if not fields:
+            return None
+
+        fields = {k.decode('utf-8'): v.decode('utf-8') for k, v in fields.items()}
+
+        return Upload(
+            upload_id=fields['upload_id'],
+            video_name=fields['video_name'],
+            destination=fields['destination'],
+            size=int(fields['size']),
+            received=int(fields['received']),
+            enqueued_segments=int(fields['enqueued_segments']),
+            last_job_id=fields.get('last_job_id', ''),
+        )
+
+
+def __upload_key__(upload_id: str) -> str:
+    return f'upload:{upload_id}'
+
+
+def copy(
+    source: IO[bytes],
+    destination: Optional[IO[bytes]],
+    content_hash: Optional['hashlib._Hash'],
+    limit: int = None,
+) -> int:
+    """
+    Copies, and hashes if given a hash, at most `limit` bytes from source to
+    destination without holding more than READ_SIZE bytes in memory. Returns
+    the number of copied bytes
+    """
+    copied = 0
+
+    while limit is None or copied < limit:
+        n = READ_SIZE if limit is None else min(READ_SIZE, limit - copied)
+        chunk = source.read(n)
+
+        if not chunk:
+            break
+
+        if destination is not None:
+            destination.write(chunk)
+
+        if content_hash is not None:
+            content_hash.update(chunk)
+
+        copied += len(chunk)
+
+    return copied
+
+
+def start_upload(video_name: str, destination: Path, size: int) -> Upload:
+    upload = Upload(uuid.uuid4().hex, video_name, str(destination), size)
+
+    upload.partial_path.parent.mkdir(parents=True, exist_ok=True)
+    upload.partial_path.touch()
+
+    try:
+        upload.received_path.parent.mkdir(parents=True, exist_ok=True)
+        os.link(upload.partial_path, upload.received_path)
+    except OSError:
+        logger.warning(
+            f'Could not link {upload.partial_path}, its segments are only'
+            ' extracted once the upload is complete'
+        )
+
+    upload.save()
+
+    logger.info(f'Receiving {size} bytes to {upload.partial_path}')
+
+    return upload
+
+
+def write_chunk(upload: Upload, offset: int, stream: IO[bytes]) -> Upload:
+    """
+    Appends the contents of the stream to the upload. Chunks have to be
+    written in order, i.e. the offset must equal the number of bytes
+    received so far, which is what a resuming client starts from.
+    """
+    if offset != upload.received:
+        raise UploadOffsetMismatch(upload.received, offset)
+
+    with upload.partial_path.open('r+b') as f:
+        f.seek(offset)
+        # Never beyond the announced size
+        upload.received += copy(stream, f, None, upload.size - offset)
+
+    upload.save()
+
+    return upload
+
+
+def finish_upload(upload: Upload) -> str:
+    """
+    Moves the partial file to its destination, and returns the SHA-256 of
+    its contents
+    """
+    assert upload.is_complete
+
+    content_hash = hashlib.sha256()
+
+    with upload.partial_path.open('rb') as f:
+        copy(f, None, content_hash, upload.size)
+
+    digest = content_hash.hexdigest()
+
+    shutil.move(str(upload.partial_path), upload.destination)
+    discard_upload(upload)
+
+    return digest
+
+
+def discard_upload(upload: Upload):
+    current_app.redis.delete(__upload_key__(upload.upload_id))
+
+    if upload.partial_path.exists():
+        upload.partial_path.unlink()
+
+
+def outstanding_job(upload: Upload) -> Optional[str]:
+    """
+    The id of the most recently enqueued extraction of received segments,
+    if it is yet to finish. As every such job depends on the one enqueued
+    before it, all of them are done when it is
+    """
+    if not upload.last_job_id:
+        return None
+
+    (job,) = Job.fetch_many([upload.last_job_id], connection=current_app.redis)
+
+    if job is None:
+        return None
+
+    pending = [JobStatus.QUEUED, JobStatus.DEFERRED, JobStatus.STARTED]
+
+    return job.id if job.get_status() in pending else None
+
+
+def remove_received_file(received_path: str):
+    shutil.rmtree(Path(received_path).parent, ignore_errors=True)
+
+
+def release_received_file(upload: Upload, depends_on: Optional[str]):
+    """
+    Removes the link that the received segments are extracted from once
+    the given job, see outstanding_job, is done, or right away. Any
+    extraction of received segments that is yet to start then finds nothing
+    to extract
+    """
+    if depends_on is None:
+        remove_received_file(str(upload.received_path))
+    else:
+        extract_queue(Priority.HIGH).enqueue(
+            remove_received_file, str(upload.received_path), depends_on=depends_on
+        )
+
+
+def enqueue_received_segments(upload: Upload) -> int:
+    """
+    Enqueues the extraction of the ranges of segments that have been
+    received since the last call. Returns the number of enqueued jobs.
+
+    This requires the container to state the duration of the video up
+    front, which is the case for an example for MP4 files with the "moov"
+    atom at the start. The video is assumed to have a roughly constant
+    bitrate, so that the received part of the file maps to the same share
+    of the duration. Only whole ranges of SEGMENTS_PER_JOB segments are
+    extracted, the remainder is left for when the upload is complete.
+
+    The jobs are chained, i.e. each depends on the previous one, so that
+    the extraction that is planned once the upload is complete only has to
+    wait for the last of them.
+    """
+    if not upload.received_path.exists():
+        return 0
+
+    try:
+        duration = ffmpeg.get_video_duration(upload.partial_path)
+    except Exception:
+        # Nothing can be said about the video until it has been received
+        return 0
+
+    received_duration = duration * upload.received / upload.size
+    received_segments = math.floor(received_duration)
+
+    # Whole jobs only, the remainder is extracted once the upload completes
+    end = received_segments - received_segments % SEGMENTS_PER_JOB
+    ranges = [
+        (start, start + SEGMENTS_PER_JOB)
+        for start in range(upload.enqueued_segments, end, SEGMENTS_PER_JOB)
+    ]
+
+    for start_segment_id, end_segment_id in ranges:
+        job = extract_queue(Priority.HIGH).enqueue(
+            extract_received_fingerprints_range,
+            str(upload.received_path),
+            start_segment_id,
+            end_segment_id,
+            job_timeout=6000,
+            # Kept for as long as the upload, to be depended on
+            result_ttl=UPLOAD_TTL,
+            depends_on=outstanding_job(upload),
+        )
+        upload.last_job_id = job.id
+
+    if ranges:
+        logger.info(
+            f'Extracting segments [{upload.enqueued_segments}, {end}) of'
+            f' {upload.video_name} while it is being uploaded'
+        )
+
+        upload.enqueued_segments = end
+        upload.save()
+
+    return len(ranges)
@@ -0,0 +1,152 @@
+"""
+Runs several rq workers per host as forked children of a single process.
+
+The supervisor imports Flask, SQLAlchemy, OpenCV, etc. once and then forks
+its workers, which share the preloaded modules copy-on-write. Workers are
+recycled, i.e. replaced by a fresh fork, after a number of jobs or once
+their memory usage exceeds a threshold.
+"""
+import gc
+import os
+import signal
+import time
+from typing import Callable, Dict, Optional
+
+import cv2
+import rq
+from loguru import logger
+
+from video_reuse_detector.profiling import peak_memory_usage
+
+from .models import db
+from .queues import SessionWorker
+
+
+# Variables read by the BLAS/OpenMP runtimes when they are loaded. As numpy
+# is loaded before the workers are forked these mostly affect subprocesses,
+# for the supervisor itself they have to be set in the environment
+THREAD_LIMIT_VARIABLES = (
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+)
+
+# A worker that exits sooner than this after being started is assumed to
+# be failing at start-up, and is restarted with a delay
+MINIMUM_WORKER_LIFETIME = 5.0
+
+
+def limit_threads(threads_per_worker: int):
+    for variable in THREAD_LIMIT_VARIABLES:
+        os.environ[variable] = str(threads_per_worker)
+
+    cv2.setNumThreads(threads_per_worker)
+
+
+class RecyclingWorker(SessionWorker):
+    """
+    Stops once its memory usage exceeds `max_memory` bytes so that the
+    supervisor can replace it.
+    """
+
+    max_memory: Optional[int] = None
+
+    def execute_job(self, job, queue):
+        result = super().execute_job(job, queue)
+
+        if self.max_memory is not None and peak_memory_usage() > self.max_memory:
+            logger.info(
+                f'Worker {os.getpid()} exceeded {self.max_memory} bytes, recycling'
+            )
+            self._stop_requested = True
+
+        return result
+
+
+class Supervisor:
+    def __init__(
+        self,
+        create_worker: Callable[[], rq.Worker],
+        number_of_workers: int,
+        max_jobs: int = None,
+        threads_per_worker: int = 1,
+    ):
+        self.create_worker = create_worker
+        self.number_of_workers = number_of_workers
+        self.max_jobs = max_jobs
+        self.threads_per_worker = threads_per_worker
+        self.children: Dict[int, float] = {}
+        self.stopping = False
+
+    def __work__(self):
+        # Executed in the forked child
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+        limit_threads(self.threads_per_worker)
+
+        # Connections inherited from the supervisor must not be shared
+        # between processes, the child opens its own on first use
+        db.engine.dispose()
+
+        worker = self.create_worker()
+        worker.work(max_jobs=self.max_jobs)
+
+    def spawn(self):
+        pid = os.fork()
+
+        if pid == 0:
+            exit_code = 0
+
+            try:
+                self.__work__()
+            except Exception:
+                logger.exception(f'Worker {os.getpid()} failed')
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+
+        logger.debug(f'Started worker {pid}')
+        self.children[pid] = time.time()
+
+    def stop(self, signum, frame):
+        logger.info(f'Stopping {len(self.children)} workers')
+        self.stopping = True
+
+        for pid in self.children:
+            try:
+                # rq performs a warm shutdown on SIGTERM, i.e. the current
+                # job is finished first
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # Objects allocated up until now are never collected, which keeps the
+        # garbage collector from touching (and thus copying) their pages in
+        # the workers
+        gc.freeze()
+
+        logger.info(f'Supervising {self.number_of_workers} workers')
+
+        while not self.stopping or self.children:
+            while not self.stopping and len(self.children) < self.number_of_workers:
+                self.spawn()
+
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+
+            started_at = self.children.pop(pid, None)
+            logger.debug(f'Worker {pid} exited with status {status}')
+
+            lifetime = time.time() - started_at if started_at is not None else 0
+            if not self.stopping and lifetime < MINIMUM_WORKER_LIFETIME:
+                time.sleep(MINIMUM_WORKER_LIFETIME)
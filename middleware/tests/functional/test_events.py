@@ -0,0 +1,102 @@
+from unittest import mock
+
+from flask_testing import TestCase
+
+from middleware import create_app, events
+
+
+def added(video_name, processing_state='UPLOADED'):
+    return {'video_name': video_name, 'processing_state': processing_state}
+
+
+class EventsTest(TestCase):
+    def create_app(self):
+        return create_app()
+
+    def setUp(self):
+        events.discard(self.app.redis)
+
+        self.socketio = mock.Mock()
+        self.flusher = events.EventFlusher(self.socketio, self.app.redis, 1.0)
+
+    def test_published_events_are_drained_in_order(self):
+        events.publish('video_file_added', added('a.mp4'))
+        events.publish_many('video_file_added', [added('b.mp4'), added('c.mp4')])
+
+        self.assertEqual(
+            [added('a.mp4'), added('b.mp4'), added('c.mp4')],
+            events.drain(self.app.redis, 'video_file_added'),
+        )
+
+        # Draining empties the buffer
+        self.assertEqual([], events.drain(self.app.redis, 'video_file_added'))
+
+    def test_events_are_coalesced_on_their_key(self):
+        payloads = [
+            {'query_video_name': 'a.mp4', 'reference_video_name': 'b.mp4', 'n': 1},
+            {'query_video_name': 'b.mp4', 'reference_video_name': 'a.mp4', 'n': 2},
+            {'query_video_name': 'a.mp4', 'reference_video_name': 'b.mp4', 'n': 3},
+        ]
+
+        self.assertEqual(
+            [payloads[2], payloads[1]],
+            events.coalesce('comparison_computation_completed', payloads),
+        )
+
+    def test_the_buffer_keeps_the_latest_events(self):
+        with mock.patch.object(events, 'MAX_BUFFERED_EVENTS', 3):
+            events.publish_many(
+                'video_file_added', [added(f'{i}.mp4') for i in range(5)]
+            )
+            events.publish('video_file_added', added('5.mp4'))
+
+        self.assertEqual(
+            [added('3.mp4'), added('4.mp4'), added('5.mp4')],
+            events.drain(self.app.redis, 'video_file_added'),
+        )
+
+    def test_flush_emits_one_batched_event_per_type(self):
+        self.flusher.connect()
+
+        events.publish('video_file_added', added('a.mp4'))
+        events.publish('video_file_added', added('a.mp4', 'FINGERPRINTED'))
+        events.publish('video_file_fingerprinted', added('a.mp4', 'FINGERPRINTED'))
+
+        self.assertEqual(2, self.flusher.flush())
+        self.socketio.emit.assert_has_calls(
+            [
+                mock.call('video_files_added', [added('a.mp4', 'FINGERPRINTED')]),
+                mock.call(
+                    'video_files_fingerprinted', [added('a.mp4', 'FINGERPRINTED')]
+                ),
+            ]
+        )
+
+        # Nothing is emitted twice
+        self.socketio.emit.reset_mock()
+
+        self.assertEqual(0, self.flusher.flush())
+        self.socketio.emit.assert_not_called()
+
+    def test_events_are_dropped_without_subscribers(self):
+        events.publish('video_file_added', added('a.mp4'))
+
+        self.assertEqual(0, self.flusher.flush())
+        self.assertEqual([], events.drain(self.app.redis, 'video_file_added'))
+
+        # Nor are the events published before the first subscriber connects
+        # emitted once it does
+        events.publish('video_file_added', added('b.mp4'))
+        self.flusher.connect()
+        self.flusher.connect()
+        self.flusher.disconnect()
+
+        self.assertEqual(0, self.flusher.flush())
+        self.socketio.emit.assert_not_called()
+        self.socketio.start_background_task.assert_called_once_with(self.flusher.run)
+
+        self.flusher.disconnect()
+        events.publish('video_file_added', added('c.mp4'))
+
+        self.assertEqual(0, self.flusher.flush())
+        self.assertEqual([], events.drain(self.app.redis, 'video_file_added'))
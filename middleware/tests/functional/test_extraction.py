@@ -0,0 +1,336 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import rq
+from flask_testing import TestCase
+from rq.registry import FailedJobRegistry
+from sqlalchemy.exc import IntegrityError
+
+import middleware.models.video_file as video_file
+from middleware import create_app
+from middleware.models import db
+from middleware.models.fingerprint_collection import FingerprintCollectionModel
+from middleware.models.fingerprint_collection_computation import (
+    FingerprintCollectionComputation,
+)
+from middleware.models.video_file import VideoFile, VideoFileState, VideoFileType
+from middleware.services import fingerprint
+from video_reuse_detector import ffmpeg
+from video_reuse_detector.color_correlation import ColorCorrelation
+from video_reuse_detector.fingerprint import FingerprintCollection
+from video_reuse_detector.thumbnail import Thumbnail
+
+
+# A video of 25 segments, extracted in jobs of 10 segments each
+VIDEO_DURATION = 25.0
+SEGMENTS_PER_JOB = 10
+
+LETTERBOX = (slice(2, 28), slice(None))
+
+
+def fingerprint_of(video_name, segment_id, run_length=1) -> FingerprintCollection:
+    return FingerprintCollection(
+        Thumbnail(np.full((30, 30), float(segment_id))),
+        ColorCorrelation.from_number(0),
+        None,
+        video_name,
+        segment_id,
+        run_length=run_length,
+    )
+
+
+class ExtractionTest(TestCase):
+    def create_app(self):
+        os.environ["APP_SETTINGS"] = "middleware.config.TestingConfig"
+
+        app = create_app()
+
+        return app
+
+    def setUp(self):
+        db.create_all()
+        self.app.redis.flushdb()
+
+        self.directory = Path(tempfile.mkdtemp())
+        self.file_path = self.directory / 'somevideo.avi'
+        self.file_path.touch()
+
+        db.session.add(VideoFile(self.file_path, VideoFileType.REFERENCE))
+        db.session.commit()
+
+        # The ranges, by checkpoint, whose extraction fails once, and the
+        # run lengths of the fingerprints by segment id, see
+        # extract_in_ranges
+        self.failing_ranges = set()
+        self.run_lengths = {}
+
+        # The letterbox of every extracted range
+        self.letterboxes = []
+
+        self.patches = [
+            mock.patch.multiple(
+                fingerprint,
+                extract_fingerprint_collection_in_ranges=self.extract_in_ranges,
+                SEGMENTS_PER_JOB=SEGMENTS_PER_JOB,
+                # Every segment is stored on its own
+                COLLAPSE_THRESHOLD=2.0,
+                detect_letterbox=mock.Mock(return_value=LETTERBOX),
+            ),
+            mock.patch.object(
+                ffmpeg, 'get_video_duration', return_value=VIDEO_DURATION
+            ),
+            mock.patch.object(ffmpeg, 'get_video_stream_info', return_value={}),
+        ]
+
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+        shutil.rmtree(self.directory)
+
+        db.session.remove()
+        db.drop_all()
+
+    def extract_in_ranges(
+        self,
+        file_path,
+        root_output_directory,
+        segments_per_range,
+        start_segment_id,
+        end_segment_id,
+        adaptive=False,
+        letterbox=None,
+    ):
+        """
+        Stands in for extract_fingerprint_collection_in_ranges, without
+        decoding anything
+        """
+        self.letterboxes.append(letterbox)
+
+        for range_start in range(start_segment_id, end_segment_id, segments_per_range):
+            range_end = min(range_start + segments_per_range, end_segment_id)
+
+            if (range_start, range_end) in self.failing_ranges:
+                self.failing_ranges.remove((range_start, range_end))
+                raise RuntimeError(f'Segments {range_start}..{range_end} failed')
+
+            fingerprints = []
+            segment_id = range_start
+
+            while segment_id < range_end:
+                run_length = min(
+                    self.run_lengths.get(segment_id, 1), range_end - segment_id
+                )
+                fingerprints.append(
+                    fingerprint_of(file_path.name, segment_id, run_length)
+                )
+                segment_id += run_length
+
+            yield range_start, range_end, fingerprints
+
+    def work(self):
+        # The jobs are executed in this process, within the application
+        # context of the test
+        queues = list(self.app.extract_queues.values())
+        rq.SimpleWorker(queues, connection=self.app.redis).work(burst=True)
+
+    def requeue_failed_jobs(self) -> int:
+        requeued = 0
+
+        for queue in self.app.extract_queues.values():
+            registry = FailedJobRegistry(queue=queue)
+
+            for job_id in registry.get_job_ids():
+                registry.requeue(job_id)
+                requeued += 1
+
+        return requeued
+
+    def covered_segment_ids(self):
+        fingerprints = FingerprintCollectionModel.query.order_by(
+            FingerprintCollectionModel.segment_id
+        )
+
+        return [
+            segment_id
+            for fpc in fingerprints
+            for segment_id in range(fpc.segment_id, fpc.segment_id + fpc.run_length)
+        ]
+
+    def finalizations(self) -> int:
+        return FingerprintCollectionComputation.query.filter_by(
+            video_name=self.file_path.name
+        ).count()
+
+    def video(self) -> VideoFile:
+        db.session.expire_all()
+
+        return VideoFile.query.filter_by(video_name=self.file_path.name).one()
+
+    def processing_state(self) -> VideoFileState:
+        return self.video().processing_state
+
+    def test_every_range_is_extracted_and_finalized_once(self):
+        self.assertEqual(3, fingerprint.plan_extraction(str(self.file_path)))
+
+        self.work()
+
+        self.assertEqual(list(range(25)), self.covered_segment_ids())
+        self.assertEqual(1, self.finalizations())
+        self.assertEqual(VideoFileState.FINGERPRINTED, self.processing_state())
+
+    def test_a_retried_range_finalizes_once(self):
+        self.failing_ranges = {(10, 20)}
+
+        fingerprint.plan_extraction(str(self.file_path))
+        self.work()
+
+        # The failed range is left pending
+        self.assertEqual(0, self.finalizations())
+        self.assertEqual(
+            VideoFileState.PARTIALLY_FINGERPRINTED, self.processing_state()
+        )
+
+        self.assertEqual(1, self.requeue_failed_jobs())
+        self.work()
+
+        self.assertEqual(list(range(25)), self.covered_segment_ids())
+        self.assertEqual(1, self.finalizations())
+
+        # A range that finished already, e.g. retried as its worker died
+        # before the job was marked as finished, finalizes nothing
+        self.app.extract_queue.enqueue(
+            fingerprint.extract_fingerprints_range, str(self.file_path), 0, 10
+        )
+        self.work()
+
+        self.assertEqual(list(range(25)), self.covered_segment_ids())
+        self.assertEqual(1, self.finalizations())
+
+    def test_only_the_missing_ranges_are_resumed(self):
+        # Segments 0..14 were committed before the extraction stalled
+        fingerprint.__checkpoint__(
+            self.file_path.name,
+            [fingerprint_of(self.file_path.name, i) for i in range(15)],
+        )
+
+        self.assertEqual(
+            VideoFileState.PARTIALLY_FINGERPRINTED, self.processing_state()
+        )
+        self.assertEqual(1, fingerprint.resume_stalled_extractions())
+
+        jobs = self.app.extract_queue.get_jobs()
+
+        self.assertEqual([(10, 20), (20, 25)], [tuple(job.args[1:3]) for job in jobs])
+
+        # Nor is a video with jobs left resumed again
+        self.assertEqual(0, fingerprint.resume_stalled_extractions())
+
+        self.work()
+
+        self.assertEqual(list(range(25)), self.covered_segment_ids())
+        self.assertEqual(1, self.finalizations())
+        self.assertEqual(VideoFileState.FINGERPRINTED, self.processing_state())
+
+    def test_an_interrupted_range_resumes_after_its_last_checkpoint(self):
+        # The range of the first job is interrupted after its first checkpoint,
+        # whose last fingerprint covers segments 3 and 4
+        self.failing_ranges = {(5, 10)}
+        self.run_lengths = {3: 2}
+
+        with mock.patch.object(fingerprint, 'SEGMENTS_PER_CHECKPOINT', 5):
+            fingerprint.plan_extraction(str(self.file_path))
+            self.work()
+
+            self.assertEqual(
+                list(range(5)) + list(range(10, 25)), self.covered_segment_ids()
+            )
+            self.assertEqual(
+                4, fingerprint.last_committed_segment_id(self.file_path.name, 0, 10)
+            )
+            self.assertEqual(
+                VideoFileState.PARTIALLY_FINGERPRINTED, self.processing_state()
+            )
+            self.assertEqual(0, self.finalizations())
+
+            self.requeue_failed_jobs()
+            self.work()
+
+        # Neither duplicated nor missing segments
+        self.assertEqual(list(range(25)), self.covered_segment_ids())
+        self.assertEqual(25, self.video().fingerprinted_segments)
+        self.assertEqual(1, self.finalizations())
+        self.assertEqual(VideoFileState.FINGERPRINTED, self.processing_state())
+
+    def test_a_checkpoint_of_committed_segments_is_rejected(self):
+        fingerprint.__checkpoint__(
+            self.file_path.name,
+            [fingerprint_of(self.file_path.name, i) for i in range(5)],
+        )
+
+        # Segments 3 and 4 are committed already, so is none of the checkpoint
+        with self.assertRaises(IntegrityError):
+            fingerprint.__checkpoint__(
+                self.file_path.name,
+                [fingerprint_of(self.file_path.name, i) for i in range(3, 8)],
+            )
+
+        db.session.rollback()
+
+        self.assertEqual(list(range(5)), self.covered_segment_ids())
+        self.assertEqual(5, self.video().fingerprinted_segments)
+
+    def test_the_fingerprints_of_a_removed_video_are_discarded(self):
+        db.session.delete(self.video())
+        db.session.commit()
+
+        fingerprint.__checkpoint__(
+            self.file_path.name,
+            [fingerprint_of(self.file_path.name, i) for i in range(5)],
+        )
+
+        self.assertEqual([], self.covered_segment_ids())
+
+    def test_the_letterbox_is_detected_once_per_video(self):
+        fingerprint.plan_extraction(str(self.file_path))
+        self.work()
+
+        fingerprint.detect_letterbox.assert_called_once()
+        self.assertEqual([LETTERBOX] * 3, self.letterboxes)
+
+    def test_an_expired_letterbox_is_detected_anew(self):
+        self.failing_ranges = {(10, 20)}
+
+        fingerprint.plan_extraction(str(self.file_path))
+        self.work()
+
+        self.app.redis.delete(f'extraction:{self.file_path.name}:letterbox')
+        self.requeue_failed_jobs()
+        self.work()
+
+        self.assertEqual(2, fingerprint.detect_letterbox.call_count)
+        self.assertEqual([LETTERBOX] * 4, self.letterboxes)
+
+    def test_listings_are_invalidated_as_the_state_changes(self):
+        def listing_version():
+            return int(self.app.redis.get(video_file.LISTING_VERSION_KEY) or 0)
+
+        version = listing_version()
+
+        for start in range(0, 15, 5):
+            segment_ids = range(start, start + 5)
+
+            fingerprint.__checkpoint__(
+                self.file_path.name,
+                [fingerprint_of(self.file_path.name, i) for i in segment_ids],
+            )
+
+        # Once, as the video became partially fingerprinted
+        self.assertEqual(version + 1, listing_version())
@@ -1,15 +1,25 @@
+import hashlib
 import io
 import json
 import os
 from pathlib import Path
 from typing import Dict
+from unittest import mock
 
 from flask import url_for
 from flask_testing import TestCase
 
+import middleware.models.video_file as video_file
 from middleware import create_app
 from middleware.models import db
-from middleware.models.video_file import VideoFile, VideoFileSchema, VideoFileType
+from middleware.models.fingerprint_collection import FingerprintCollectionModel
+from middleware.models.video_file import (
+    VideoFile,
+    VideoFileSchema,
+    VideoFileState,
+    VideoFileType,
+)
+from middleware.queues import Priority
 
 
 def get_json_objs(data_dict):
@@ -27,6 +37,8 @@ class FilesRoutesTest(TestCase):
     def setUp(self):
         # Note: executed inside app.context
         db.create_all()
+        # Listings cached by previous tests refer to rows that are gone
+        video_file.invalidate_listings()
 
     def tearDown(self):
         db.session.remove()
@@ -62,6 +74,96 @@ class FilesRoutesTest(TestCase):
         self.assertTrue('video_name' in video_file.keys())
         self.assertEqual(video_file['video_name'], video_name)
 
+    def add_video_files(self, n: int, file_type: VideoFileType):
+        for i in range(n):
+            file_path = Path(f'/some/path/to/{file_type.name.lower()}_{i}.avi')
+            db.session.add(VideoFile(file_path, file_type))
+
+        db.session.commit()
+
+    def test_list_files_paginated(self):
+        self.add_video_files(5, VideoFileType.QUERY)
+
+        video_names = []
+        cursor = None
+        pages = 0
+
+        while True:
+            query_string = {'limit': 2}
+            if cursor is not None:
+                query_string['cursor'] = cursor
+
+            response = self.client.get('/api/files/list', query_string=query_string)
+            self.assertEqual(response.status_code, 200)
+
+            data = json.loads(response.data.decode())
+            video_names.extend(f['video_name'] for f in get_json_objs(data))
+            pages += 1
+
+            cursor = data['cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(video_names, [f'query_{i}.avi' for i in range(5)])
+
+    def test_list_files_filtered(self):
+        self.add_video_files(2, VideoFileType.QUERY)
+        self.add_video_files(3, VideoFileType.REFERENCE)
+
+        response = self.client.get(
+            '/api/files/list', query_string={'file_type': 'REFERENCE'}
+        )
+        files = get_json_objs(json.loads(response.data.decode()))
+
+        self.assertEqual(len(files), 3)
+
+        response = self.client.get(
+            '/api/files/list', query_string={'processing_state': 'FINGERPRINTED'}
+        )
+        files = get_json_objs(json.loads(response.data.decode()))
+
+        self.assertEqual(len(files), 0)
+
+        response = self.client.get(
+            '/api/files/list', query_string={'file_type': 'NOT_A_TYPE'}
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_files_etag(self):
+        self.add_video_files(1, VideoFileType.QUERY)
+
+        response = self.client.get('/api/files/list')
+        etag, _ = response.get_etag()
+
+        self.assertIsNotNone(etag)
+
+        response = self.client.get(
+            '/api/files/list', headers={'If-None-Match': f'"{etag}"'}
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_files_cache_is_invalidated(self):
+        self.add_video_files(1, VideoFileType.QUERY)
+
+        response = self.client.get('/api/files/list')
+        etag, _ = response.get_etag()
+
+        db_video_file = VideoFile.query.first()
+        db_video_file.processing_state = VideoFileState.FINGERPRINTED
+        db.session.commit()
+        video_file.emit_event(db_video_file, 'video_file_fingerprinted')
+
+        response = self.client.get(
+            '/api/files/list', headers={'If-None-Match': f'"{etag}"'}
+        )
+        files = get_json_objs(json.loads(response.data.decode()))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(files[0]['processing_state'], 'FINGERPRINTED')
+
     def test_file_info_route_for_file_that_does_not_exist(self):
         response = self.client.get('/api/files/info/doesnotexist.avi')
 
@@ -170,3 +272,125 @@ class FilesRoutesTest(TestCase):
         )
 
         self.assertEqual(response.status_code, 403)
+
+    def test_chunked_upload(self):
+        contents = b"abcdefghij"
+
+        response = self.client.post(
+            url_for('file.start_upload'),
+            json=dict(filename='test.avi', file_type='QUERY', size=len(contents)),
+        )
+
+        self.assertEqual(response.status_code, 201)
+
+        upload_id = response.get_json()['upload_id']
+        self.assertEqual(response.get_json()['offset'], 0)
+
+        response = self.client.put(
+            url_for('file.put_chunk', upload_id=upload_id, offset=0),
+            data=contents[:4],
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['offset'], 4)
+
+        # A chunk at any other offset than the one received so far is refused
+        response = self.client.put(
+            url_for('file.put_chunk', upload_id=upload_id, offset=2),
+            data=contents[2:],
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()['offset'], 4)
+
+        response = self.client.put(
+            url_for('file.put_chunk', upload_id=upload_id, offset=4),
+            data=contents[4:],
+        )
+
+        self.assertEqual(response.status_code, 202)
+
+        db_video_file = db.session.query(VideoFile).one()
+        self.assertEqual(
+            db_video_file.content_hash, hashlib.sha256(contents).hexdigest()
+        )
+
+        # Nothing was extracted while uploading, so the link to the partial
+        # file is removed right away
+        received = Path(db_video_file.file_path).parent / '.received' / upload_id
+        self.assertFalse(received.exists())
+
+    def test_rejected_chunked_upload_discards_its_fingerprints(self):
+        data = {'file_type': 'QUERY'}
+        data['file'] = (io.BytesIO(b"abcdef"), 'test.avi')
+        self.client.post(
+            url_for('file.upload_file'), content_type='multipart/form-data', data=data
+        )
+
+        response = self.client.post(
+            url_for('file.start_upload'),
+            json=dict(filename='renamed.avi', file_type='QUERY', size=6),
+        )
+        upload_id = response.get_json()['upload_id']
+        video_name = db.session.query(VideoFile.video_name).filter(
+            VideoFile.processing_state == VideoFileState.UPLOADING
+        ).scalar()
+
+        # As if extracted while uploading, by a job that looked the video up
+        # before it was removed
+        db.session.add(FingerprintCollectionModel(video_name, 0, b'', 0, None))
+        db.session.commit()
+
+        response = self.client.put(
+            url_for('file.put_chunk', upload_id=upload_id, offset=0), data=b"abcdef"
+        )
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(
+            0,
+            db.session.query(FingerprintCollectionModel)
+            .filter_by(video_name=video_name)
+            .count(),
+        )
+
+    def test_upload_of_duplicate_contents_not_allowed(self):
+        data = {'file_type': 'QUERY'}
+        data['file'] = (io.BytesIO(b"abcdef"), 'test.avi')
+        response = self.client.post(
+            url_for('file.upload_file'), content_type='multipart/form-data', data=data
+        )
+
+        self.assertEqual(response.status_code, 202)
+
+        data['file'] = (io.BytesIO(b"abcdef"), 'renamed.avi')
+        response = self.client.post(
+            url_for('file.upload_file'), content_type='multipart/form-data', data=data
+        )
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_concurrent_upload_of_duplicate_contents_not_allowed(self):
+        data = {'file_type': 'QUERY'}
+        data['file'] = (io.BytesIO(b"abcdef"), 'test.avi')
+        self.client.post(
+            url_for('file.upload_file'), content_type='multipart/form-data', data=data
+        )
+
+        queue = self.app.extract_queues[Priority.HIGH]
+        enqueued = queue.count
+
+        # As if both were checked for duplicates before either was committed
+        data['file'] = (io.BytesIO(b"abcdef"), 'renamed.avi')
+        with mock.patch('middleware.routes.files.find_duplicate', return_value=None):
+            response = self.client.post(
+                url_for('file.upload_file'),
+                content_type='multipart/form-data',
+                data=data,
+            )
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(1, db.session.query(VideoFile).count())
+        self.assertEqual(enqueued, queue.count)
+        self.assertFalse(
+            (Path(self.app.config['UPLOADS_DIRECTORY']) / 'renamed.avi').exists()
+        )
@@ -1,12 +1,19 @@
+import json
 import os
 import unittest
+from pathlib import Path
 
+import numpy as np
 import sqlalchemy
 from flask_testing import TestCase
 
 from middleware import create_app
 from middleware.models import db
+from middleware.models.fingerprint_collection import FingerprintCollectionModel
 from middleware.models.fingerprint_comparison import FingerprintComparisonModel
+from middleware.models.video_file import VideoFile, VideoFileType
+from middleware.services import retrieval
+from middleware.services.fingerprint import archive_comparisons
 
 
 class FingerprintComparisonTest(TestCase):
@@ -219,3 +226,344 @@ class FingerprintComparisonTest(TestCase):
             )
 
             db.session.commit()
+
+    def add_comparisons(self, query_video_name, reference_video_name, rows):
+        # Optionally followed by the query and reference run lengths
+        for query_segment_id, reference_segment_id, match_level, *run_lengths in rows:
+            query_run_length, reference_run_length = run_lengths or (1, 1)
+
+            db.session.add(
+                FingerprintComparisonModel(
+                    query_video_name=query_video_name,
+                    reference_video_name=reference_video_name,
+                    query_segment_id=query_segment_id,
+                    reference_segment_id=reference_segment_id,
+                    match_level=match_level,
+                    similarity_score=1.0,
+                    query_run_length=query_run_length,
+                    reference_run_length=reference_run_length,
+                )
+            )
+
+        db.session.commit()
+
+    def test_summary_counts_matches_per_level(self):
+        query_video_name = 'somevideo.avi'
+        reference_video_name = 'someothervideo.avi'
+
+        self.add_comparisons(
+            query_video_name,
+            reference_video_name,
+            [(1, 1, 'LEVEL_A'), (1, 2, 'LEVEL_C'), (2, 2, 'LEVEL_C')],
+        )
+
+        response = self.client.post(
+            '/api/fingerprints/comparisons/summary',
+            json=dict(
+                query_video_names=[query_video_name],
+                reference_video_names=[reference_video_name],
+            ),
+        )
+
+        comparison = response.get_json()['comparisons'][0]
+
+        self.assertEqual(2, comparison['distinctMatches'])
+        self.assertEqual(3, comparison['totalMatches'])
+        self.assertEqual({'LEVEL_A': 1, 'LEVEL_C': 2}, comparison['matchesPerLevel'])
+        self.assertEqual(0, comparison['numberOfQuerySegments'])
+        self.assertFalse('comparisons' in comparison.keys())
+
+    def test_collapsed_comparisons_are_expanded(self):
+        query_video_name = 'somevideo.avi'
+        reference_video_name = 'someothervideo.avi'
+
+        # Collapsed segments, standing for 3 x 2 pairs of segments, and a
+        # pair of single segments
+        self.add_comparisons(
+            query_video_name,
+            reference_video_name,
+            [(0, 0, 'LEVEL_A', 3, 2), (5, 5, 'LEVEL_C', 1, 1)],
+        )
+
+        comparison = self.client.post(
+            '/api/fingerprints/comparisons',
+            json=dict(
+                query_video_names=[query_video_name],
+                reference_video_names=[reference_video_name],
+            ),
+        ).get_json()['comparisons'][0]
+
+        matches = comparison['comparisons']
+
+        self.assertEqual(7, comparison['totalMatches'])
+        self.assertEqual(
+            comparison['totalMatches'], sum(len(m) for m in matches.values())
+        )
+        self.assertEqual(
+            comparison['matchesPerLevel'],
+            {match_level: len(m) for match_level, m in matches.items()},
+        )
+        self.assertEqual(
+            [(0, 0), (0, 1), (1, 0), (1, 1), (2, 0), (2, 1)],
+            [
+                (m['query_segment_id'], m['reference_segment_id'])
+                for m in matches['LEVEL_A']
+            ],
+        )
+
+    def test_adaptively_sampled_runs_are_expanded(self):
+        query_video_name = 'somevideo.avi'
+        reference_video_name = 'someothervideo.avi'
+
+        # Keyframes that cover runs of segments, as sampled adaptively, i.e.
+        # segments 0..3 and 4 of the query video and 0..1 of the reference
+        for video_name, segment_id, run_length in [
+            (query_video_name, 0, 4),
+            (query_video_name, 4, 1),
+            (reference_video_name, 0, 2),
+        ]:
+            db.session.add(
+                FingerprintCollectionModel(
+                    video_name, segment_id, b'', 0, None, run_length=run_length
+                )
+            )
+
+        self.add_comparisons(
+            query_video_name,
+            reference_video_name,
+            [(0, 0, 'LEVEL_A', 4, 2), (4, 0, 'LEVEL_C', 1, 2)],
+        )
+
+        comparison = self.client.post(
+            '/api/fingerprints/comparisons',
+            json=dict(
+                query_video_names=[query_video_name],
+                reference_video_names=[reference_video_name],
+            ),
+        ).get_json()['comparisons'][0]
+
+        matches = [m for ms in comparison['comparisons'].values() for m in ms]
+
+        self.assertEqual(5, comparison['numberOfQuerySegments'])
+        self.assertEqual(2, comparison['numberOfReferenceSegments'])
+        self.assertEqual(10, comparison['totalMatches'])
+        self.assertEqual(comparison['totalMatches'], len(matches))
+        self.assertEqual(
+            comparison['distinctMatches'],
+            len({m['query_segment_id'] for m in matches}),
+        )
+
+        # Every match is between segments that the frontend draws
+        self.assertEqual(
+            {(q, r) for q in range(5) for r in range(2)},
+            {(m['query_segment_id'], m['reference_segment_id']) for m in matches},
+        )
+
+    def test_comparison_rows_are_paginated(self):
+        query_video_name = 'somevideo.avi'
+        reference_video_name = 'someothervideo.avi'
+
+        rows = [(i, i, 'LEVEL_A') for i in range(5)]
+        self.add_comparisons(query_video_name, reference_video_name, rows)
+
+        segment_ids = []
+        cursor = None
+
+        for _ in range(len(rows)):
+            response = self.client.post(
+                '/api/fingerprints/comparisons/rows',
+                json=dict(
+                    query_video_name=query_video_name,
+                    reference_video_name=reference_video_name,
+                    cursor=cursor,
+                    limit=2,
+                ),
+            ).get_json()
+
+            segment_ids.extend(c['query_segment_id'] for c in response['comparisons'])
+            cursor = response['cursor']
+
+            if cursor is None:
+                break
+
+        self.assertEqual(list(range(5)), segment_ids)
+
+    def test_streamed_comparisons_are_newline_delimited(self):
+        query_video_name = 'somevideo.avi'
+        reference_video_name = 'someothervideo.avi'
+
+        self.add_comparisons(
+            query_video_name,
+            reference_video_name,
+            [(2, 2, 'LEVEL_A'), (1, 1, 'LEVEL_A'), (1, 2, 'LEVEL_C')],
+        )
+
+        response = self.client.post(
+            '/api/fingerprints/comparisons/stream',
+            json=dict(
+                query_video_names=[query_video_name],
+                reference_video_names=[reference_video_name],
+                match_level='LEVEL_A',
+            ),
+        )
+
+        self.assertEqual('application/x-ndjson', response.mimetype)
+
+        comparisons = [json.loads(line) for line in response.data.splitlines()]
+
+        self.assertEqual([1, 2], [c['query_segment_id'] for c in comparisons])
+        self.assertTrue(all(c['match_level'] == 'LEVEL_A' for c in comparisons))
+
+    def test_archived_comparisons_are_still_served(self):
+        query_video_name = 'somevideo.avi'
+        reference_video_name = 'someothervideo.avi'
+
+        self.add_comparisons(
+            query_video_name,
+            reference_video_name,
+            [(1, 1, 'LEVEL_A'), (1, 2, 'LEVEL_C'), (2, 2, 'LEVEL_C')],
+        )
+
+        self.assertTrue(archive_comparisons(query_video_name, reference_video_name))
+        self.assertEqual(0, FingerprintComparisonModel.query.count())
+
+        request = dict(
+            query_video_names=[query_video_name],
+            reference_video_names=[reference_video_name],
+        )
+
+        summary = self.client.post(
+            '/api/fingerprints/comparisons/summary', json=request
+        ).get_json()['comparisons'][0]
+
+        self.assertEqual(2, summary['distinctMatches'])
+        self.assertEqual(3, summary['totalMatches'])
+        self.assertEqual({'LEVEL_A': 1, 'LEVEL_C': 2}, summary['matchesPerLevel'])
+
+        comparison = self.client.post(
+            '/api/fingerprints/comparisons', json=request
+        ).get_json()['comparisons'][0]
+
+        self.assertEqual(2, len(comparison['comparisons']['LEVEL_C']))
+
+        rows = self.client.post(
+            '/api/fingerprints/comparisons/rows',
+            json=dict(
+                query_video_name=query_video_name,
+                reference_video_name=reference_video_name,
+                match_level='LEVEL_C',
+            ),
+        ).get_json()
+
+        self.assertEqual([1, 2], [c['query_segment_id'] for c in rows['comparisons']])
+        self.assertIsNone(rows['cursor'])
+
+    def test_existing_comparisons_are_not_enqueued(self):
+        query_video_name = 'somevideo.avi'
+        reference_video_name = 'someothervideo.avi'
+
+        for video_name in [query_video_name, reference_video_name]:
+            video_file = VideoFile(Path(video_name), VideoFileType.QUERY)
+            video_file.mark_as_fingerprinted()
+            db.session.add(video_file)
+
+        self.add_comparisons(
+            query_video_name, reference_video_name, [(1, 1, 'LEVEL_A')]
+        )
+
+        response = self.client.post(
+            '/api/fingerprints/compare',
+            json=dict(
+                query_video_names=[query_video_name, 'doesnotexist.avi'],
+                reference_video_names=[reference_video_name],
+            ),
+        ).get_json()
+
+        self.assertEqual(
+            'exists', response[f'{query_video_name}/{reference_video_name}']
+        )
+        self.assertEqual('fingerprint missing', response['doesnotexist.avi'])
+        self.assertIsNone(response['batch_id'])
+
+    def test_lookup_finds_near_duplicate_segments(self):
+        h = 0x0123456789ABCDEF
+        hashes = {
+            ('somevideo.avi', 0): h,
+            # Differs in a bit of each chunk, i.e. shares none of them
+            ('someothervideo.avi', 3): h ^ 0x0001000100010001,
+            # Differs in a bit of a single chunk
+            ('someothervideo.avi', 4): h ^ 0x0001000000000000,
+            ('yetanothervideo.avi', 0): ~h,
+        }
+
+        for (video_name, segment_id), perceptual_hash in hashes.items():
+            db.session.add(
+                FingerprintCollectionModel(
+                    video_name,
+                    segment_id,
+                    b'',
+                    0,
+                    None,
+                    perceptual_hash=perceptual_hash,
+                )
+            )
+
+        db.session.commit()
+
+        response = self.client.post(
+            '/api/fingerprints/lookup', json=dict(video_name='somevideo.avi')
+        ).get_json()
+
+        self.assertEqual(
+            [
+                {
+                    'referenceVideoName': 'someothervideo.avi',
+                    'segments': [
+                        {'querySegmentId': 0, 'referenceSegmentId': 4, 'distance': 1}
+                    ],
+                }
+            ],
+            response['matches'],
+        )
+
+    def test_retrieval_finds_segments_with_the_same_descriptors(self):
+        rng = np.random.default_rng(0)
+        descriptors = rng.integers(0, 256, (20, 32)).tolist()
+        other_descriptors = rng.integers(0, 256, (20, 32)).tolist()
+
+        for video_name, segment_id, orb in [
+            ('somevideo.avi', 0, descriptors),
+            ('someothervideo.avi', 3, descriptors),
+            ('yetanothervideo.avi', 0, other_descriptors),
+        ]:
+            db.session.add(
+                FingerprintCollectionModel(video_name, segment_id, b'', 0, orb)
+            )
+
+        db.session.commit()
+
+        retrieval.train_vocabulary(16, 1000, 10)
+
+        video_names = ['somevideo.avi', 'someothervideo.avi', 'yetanothervideo.avi']
+        for video_name in video_names:
+            retrieval.index_video(video_name)
+
+        response = self.client.post(
+            '/api/fingerprints/retrieve', json=dict(video_name='somevideo.avi')
+        ).get_json()
+
+        # The third video shares none of the descriptors, but with a vocabulary
+        # of 16 words it may well share some words, and is then ranked lower
+        matches = response['matches']
+
+        self.assertEqual('someothervideo.avi', matches[0]['referenceVideoName'])
+        self.assertTrue(
+            all(matches[0]['score'] > match['score'] for match in matches[1:])
+        )
+        self.assertEqual(
+            [(0, 3)],
+            [
+                (segment['querySegmentId'], segment['referenceSegmentId'])
+                for segment in response['matches'][0]['segments']
+            ],
+        )
@@ -0,0 +1,27 @@
+from flask_testing import TestCase
+
+from middleware import create_app, metrics
+from video_reuse_detector.profiling import Histogram, Profile
+
+
+class MetricsTest(TestCase):
+    def create_app(self):
+        return create_app()
+
+    def setUp(self):
+        metrics.reset(self.app.redis)
+
+    def test_metrics_are_aggregated_across_profiles(self):
+        for duration in (0.5, 1.5):
+            profile = Profile()
+            profile.histograms['orb'] = Histogram()
+            profile.histograms['orb'].observe(duration)
+
+            metrics.record(profile)
+
+        response = self.client.get('/api/metrics')
+        lines = response.data.decode().splitlines()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'{metrics.METRIC_NAME}_count{{stage="orb"}} 2', lines)
+        self.assertIn(f'{metrics.METRIC_NAME}_sum{{stage="orb"}} 2', lines)
@@ -0,0 +1,129 @@
+import os
+import random
+from collections import Counter
+from pathlib import Path
+from unittest import mock
+
+from flask_testing import TestCase
+
+from middleware import create_app
+from middleware.models import db
+from middleware.models.video_file import VideoFile, VideoFileType
+from middleware.queues import Priority, SessionWorker, WeightedWorker
+
+
+def noop():
+    pass
+
+
+def add_video_file(video_name: str, fail: bool = False):
+    # Left uncommitted
+    db.session.add(VideoFile(Path(video_name), VideoFileType.REFERENCE))
+
+    if fail:
+        raise RuntimeError(f'Could not add {video_name}')
+
+
+class WeightedWorkerTest(TestCase):
+    def create_app(self):
+        return create_app()
+
+    def setUp(self):
+        self.app.redis.flushdb()
+
+        # Ordered by priority, as passed to the workers
+        self.queues = list(self.app.extract_queues.values())
+
+    def dequeued_queue_names(self, weights):
+        worker = WeightedWorker(self.queues, weights, connection=self.app.redis)
+        names = []
+
+        while True:
+            result = worker.dequeue_job_and_maintain_ttl(None)
+
+            if result is None:
+                return names
+
+            _, queue = result
+            names.append(queue.name)
+
+    def test_extract_queues_are_ordered_by_priority(self):
+        self.assertEqual(
+            ['extract_high', 'extract', 'extract_low'], [q.name for q in self.queues]
+        )
+        self.assertEqual(list(Priority), list(self.app.extract_queues.keys()))
+
+    def test_jobs_are_dequeued_by_weighted_priority(self):
+        for queue in self.queues:
+            queue.enqueue(noop)
+            queue.enqueue(noop)
+
+        # Always starting with the high priority queue
+        self.assertEqual(
+            ['extract_high'] * 2 + ['extract'] * 2 + ['extract_low'] * 2,
+            self.dequeued_queue_names([1, 0, 0]),
+        )
+
+        for queue in self.queues:
+            queue.enqueue(noop)
+
+        # Always starting with the low priority queue, once it is empty the
+        # others are listened on by priority
+        self.assertEqual(
+            ['extract_low', 'extract_high', 'extract'],
+            self.dequeued_queue_names([0, 0, 1]),
+        )
+
+    def test_queues_are_listened_on_first_in_proportion_to_their_weight(self):
+        random.seed(0)
+
+        worker = WeightedWorker(self.queues, [6, 3, 1], connection=self.app.redis)
+        first = Counter()
+
+        for _ in range(1000):
+            worker.dequeue_job_and_maintain_ttl(None)
+            first[worker.queues[0].name] += 1
+
+            # Followed by the others, by priority
+            self.assertEqual(
+                [q for q in self.queues if q is not worker.queues[0]],
+                worker.queues[1:],
+            )
+
+        self.assertAlmostEqual(0.6, first['extract_high'] / 1000, delta=0.05)
+        self.assertAlmostEqual(0.3, first['extract'] / 1000, delta=0.05)
+        self.assertAlmostEqual(0.1, first['extract_low'] / 1000, delta=0.05)
+
+
+class SessionWorkerTest(TestCase):
+    def create_app(self):
+        os.environ["APP_SETTINGS"] = "middleware.config.TestingConfig"
+
+        app = create_app()
+
+        return app
+
+    def setUp(self):
+        db.create_all()
+        self.app.redis.flushdb()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_the_session_is_removed_after_each_job(self):
+        queue = self.app.compare_queue
+        queue.enqueue(add_video_file, 'somevideo.avi')
+        queue.enqueue(add_video_file, 'someothervideo.avi', fail=True)
+
+        worker = SessionWorker([queue], connection=self.app.redis)
+
+        with mock.patch.object(db.session, 'remove', wraps=db.session.remove) as remove:
+            worker.work(burst=True)
+
+        # Whether the job succeeded or failed
+        self.assertEqual(2, remove.call_count)
+
+        # Neither of the video files was committed, nor is either pending
+        self.assertEqual([], list(db.session.new))
+        self.assertEqual(0, VideoFile.query.count())
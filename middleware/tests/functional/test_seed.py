@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from flask_testing import TestCase
+
+from middleware import create_app, manage
+from middleware.models import db
+from middleware.models.video_file import VideoFile
+from middleware.services.fingerprint import plan_extraction
+
+
+class SeedTest(TestCase):
+    def create_app(self):
+        os.environ["APP_SETTINGS"] = "middleware.config.TestingConfig"
+
+        app = create_app()
+
+        return app
+
+    def setUp(self):
+        db.create_all()
+        self.app.redis.flushdb()
+
+        self.directory = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+        db.session.remove()
+        db.drop_all()
+
+    def video(self, file_path: str) -> Path:
+        path = self.directory / file_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.touch()
+
+        return path
+
+    def enqueued_file_paths(self):
+        return sorted(
+            job.args[0]
+            for queue in self.app.extract_queues.values()
+            for job in queue.get_jobs()
+            if job.func == plan_extraction
+        )
+
+    def test_videos_are_inserted_in_chunks(self):
+        file_paths = [self.video(f'{i}.mp4') for i in range(5)]
+
+        # Present already, by name
+        existing = file_paths[1]
+        db.session.add(VideoFile.from_archival_footage(existing))
+        db.session.commit()
+
+        # Of two paths with the same name the first one is inserted
+        duplicate = self.video('subdirectory/3.mp4')
+        missing = self.directory / 'missing.mp4'
+
+        with mock.patch.object(manage, 'SEED_CHUNK_SIZE', 2):
+            manage.insert_videos(
+                file_paths + [duplicate, missing], VideoFile.from_archival_footage
+            )
+
+        self.assertEqual(
+            sorted(str(f) for f in file_paths),
+            sorted(vf.file_path for vf in VideoFile.query),
+        )
+        self.assertEqual(
+            sorted(str(f) for f in file_paths if f != existing),
+            self.enqueued_file_paths(),
+        )
+
+    def test_seeding_again_inserts_nothing(self):
+        file_paths = [self.video(f'{i}.mp4') for i in range(3)]
+
+        with mock.patch.object(manage, 'SEED_CHUNK_SIZE', 2):
+            manage.insert_videos(file_paths, VideoFile.from_archival_footage)
+
+            self.app.redis.flushdb()
+
+            manage.insert_videos(file_paths, VideoFile.from_archival_footage)
+
+        self.assertEqual(3, VideoFile.query.count())
+        self.assertEqual([], self.enqueued_file_paths())
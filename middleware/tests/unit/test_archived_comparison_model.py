@@ -0,0 +1,85 @@
+import io
+import unittest
+
+import numpy as np
+
+from middleware.models.archived_comparison import (
+    ARCHIVED_COLUMNS,
+    DEFAULTS,
+    ArchivedComparisonModel,
+)
+from middleware.models.fingerprint_comparison import FingerprintComparisonModel
+
+
+class ArchivedComparisonModelTest(unittest.TestCase):
+    def test_model_conversion(self):
+        models = [
+            FingerprintComparisonModel(
+                query_video_name='somevideo.avi',
+                reference_video_name='someothervideo.avi',
+                query_segment_id=segment_id,
+                reference_segment_id=segment_id + 1,
+                match_level='LEVEL_A' if segment_id % 2 == 0 else 'LEVEL_C',
+                similarity_score=segment_id / 10,
+                similar_enough_th=True,
+                could_compare_cc=segment_id % 2 == 0,
+                similar_enough_cc=False,
+                could_compare_orb=True,
+                similar_enough_orb=segment_id % 3 == 0,
+                query_run_length=1 + segment_id % 4,
+                reference_run_length=1,
+            )
+            for segment_id in range(10)
+        ]
+
+        archive = ArchivedComparisonModel.from_comparison_models(models)
+        self.assertEqual(len(models), archive.number_of_comparisons)
+
+        restored = archive.to_comparison_models()
+        self.assertEqual(len(models), len(restored))
+
+        for original, decoded in zip(models, restored):
+            self.assertEqual(original.query_video_name, decoded.query_video_name)
+            self.assertEqual(
+                original.reference_video_name, decoded.reference_video_name
+            )
+
+            for column in ARCHIVED_COLUMNS:
+                self.assertEqual(getattr(original, column), getattr(decoded, column))
+
+    def test_archives_without_run_lengths(self):
+        model = FingerprintComparisonModel(
+            query_video_name='somevideo.avi',
+            reference_video_name='someothervideo.avi',
+            query_segment_id=0,
+            reference_segment_id=0,
+            match_level='LEVEL_A',
+            similarity_score=1.0,
+            similar_enough_th=True,
+            could_compare_cc=True,
+            similar_enough_cc=True,
+            could_compare_orb=True,
+            similar_enough_orb=True,
+        )
+
+        # As archived before the run lengths were
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            **{
+                column: np.array([getattr(model, column)], dtype=dtype)
+                for column, dtype in ARCHIVED_COLUMNS.items()
+                if column not in DEFAULTS
+            },
+        )
+
+        archive = ArchivedComparisonModel(
+            query_video_name=model.query_video_name,
+            reference_video_name=model.reference_video_name,
+            number_of_comparisons=1,
+            comparisons=buffer.getvalue(),
+        )
+
+        (restored,) = archive.to_comparison_models()
+        self.assertEqual(restored.query_run_length, 1)
+        self.assertEqual(restored.reference_run_length, 1)
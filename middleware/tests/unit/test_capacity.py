@@ -0,0 +1,30 @@
+import unittest
+
+from middleware.services.capacity import CostModel, PendingVideo, drain_time, fit
+
+
+class CapacityTest(unittest.TestCase):
+    def test_fit(self):
+        model = fit(
+            [
+                ('h264', 360, 10.0, 5.0),
+                ('h264', 360, 20.0, 10.0),
+                ('h264', 1080, 10.0, 20.0),
+            ]
+        )
+
+        self.assertAlmostEqual(model.rate('h264', 360), 0.5)
+        self.assertAlmostEqual(model.rate('h264', 1080), 2.0)
+        self.assertEqual(model.samples[('h264', '360p')], 2)
+
+        # Classes without computations fall back to the overall rate
+        self.assertAlmostEqual(model.rate('mpeg2video', 576), model.overall_rate)
+
+    def test_drain_time(self):
+        model = CostModel({('h264', '360p'): 0.5}, {('h264', '360p'): 1}, 1.0)
+        pending = [
+            PendingVideo('a.mp4', 'h264', 360, 100.0),
+            PendingVideo('b.avi', None, None, 50.0),
+        ]
+
+        self.assertAlmostEqual(drain_time(model, pending, workers=2), 50.0)
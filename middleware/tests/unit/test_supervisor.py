@@ -0,0 +1,77 @@
+import itertools
+import unittest
+from unittest import mock
+
+from middleware import supervisor
+from middleware.supervisor import MINIMUM_WORKER_LIFETIME, Supervisor
+
+
+class SupervisorTest(unittest.TestCase):
+    def setUp(self):
+        self.create_worker = mock.Mock()
+        self.supervisor = Supervisor(self.create_worker, 2, max_jobs=3)
+
+        pids = itertools.count(100)
+
+        # Neither forks nor waits for, nor signals, any actual process
+        self.patches = {
+            'fork': mock.patch.object(
+                supervisor.os, 'fork', side_effect=lambda: next(pids)
+            ),
+            'wait': mock.patch.object(supervisor.os, 'wait'),
+            'kill': mock.patch.object(supervisor.os, 'kill'),
+            '_exit': mock.patch.object(supervisor.os, '_exit'),
+            'signal': mock.patch.object(supervisor.signal, 'signal'),
+            'freeze': mock.patch.object(supervisor.gc, 'freeze'),
+            'sleep': mock.patch.object(supervisor.time, 'sleep'),
+        }
+
+        self.mocks = {name: patch.start() for name, patch in self.patches.items()}
+
+    def tearDown(self):
+        for patch in self.patches.values():
+            patch.stop()
+
+    def test_a_recycled_worker_is_restarted(self):
+        # The first worker exits once it has executed its jobs, after which
+        # no child is left to wait for
+        self.mocks['wait'].side_effect = [(100, 0), ChildProcessError()]
+
+        self.supervisor.run()
+
+        self.assertEqual(3, self.mocks['fork'].call_count)
+        self.assertEqual({101, 102}, set(self.supervisor.children))
+
+        # Having exited right away, the worker is restarted with a delay
+        self.mocks['sleep'].assert_called_once_with(MINIMUM_WORKER_LIFETIME)
+
+    def test_no_worker_is_restarted_once_stopping(self):
+        def wait():
+            if not self.supervisor.stopping:
+                self.supervisor.stop(None, None)
+
+            return min(self.supervisor.children), 0
+
+        self.mocks['wait'].side_effect = wait
+
+        self.supervisor.run()
+
+        self.assertEqual(2, self.mocks['fork'].call_count)
+        self.assertEqual({}, self.supervisor.children)
+        self.assertEqual(
+            [100, 101], [c.args[0] for c in self.mocks['kill'].call_args_list]
+        )
+
+    def test_a_worker_executes_max_jobs(self):
+        self.mocks['fork'].side_effect = None
+        self.mocks['fork'].return_value = 0
+
+        with mock.patch.object(supervisor, 'db'), mock.patch.object(
+            supervisor, 'limit_threads'
+        ):
+            self.supervisor.spawn()
+
+        worker = self.create_worker.return_value
+        worker.work.assert_called_once_with(max_jobs=3)
+
+        self.mocks['_exit'].assert_called_once_with(0)
@@ -0,0 +1,99 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from video_reuse_detector.batch import (
+    BatchResult,
+    collect_input_files,
+    fingerprint_file,
+    run,
+    stem_collisions,
+)
+
+
+class TestBatch(unittest.TestCase):
+    def test_collect_input_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+
+            (directory / 'videos').mkdir()
+            a = directory / 'videos' / 'a.mp4'
+            b = directory / 'videos' / 'b.mp4'
+            c = directory / 'c.mp4'
+
+            for path in (a, b, c):
+                path.touch()
+
+            # The file list repeats a path that is also found in the directory
+            file_list = directory / 'list.txt'
+            file_list.write_text(f'{c}\n\n{a}\n')
+
+            actual = collect_input_files([str(directory / 'videos'), str(file_list)])
+
+            self.assertEqual(actual, [a, b, c])
+
+    def test_files_with_the_same_name_do_not_share_a_directory(self):
+        directories = []
+
+        def extract(file_path, interim_directory):
+            directories.append(interim_directory)
+            self.assertTrue(interim_directory.exists())
+            return {}
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch(
+            'video_reuse_detector.batch.extract_fingerprint_collection_with_keyframes',
+            extract,
+        ), mock.patch('video_reuse_detector.ffmpeg.get_video_duration', lambda _: 1.0):
+            interim = Path(tmp) / 'interim'
+
+            for directory in ('a', 'b'):
+                fingerprint_file(Path(tmp) / directory / 'x.mp4', interim, 'none', None)
+
+            self.assertNotEqual(directories[0], directories[1])
+            self.assertEqual(list(interim.iterdir()), [])
+
+    def test_stem_collisions(self):
+        a = Path('a.mp4')
+        b = Path('b.mp4')
+        a_avi = Path('a.avi')
+        x_a = Path('x') / 'a.mp4'
+
+        self.assertEqual(stem_collisions([a, b]), {})
+        self.assertEqual(stem_collisions([a, b, a_avi, x_a]), {'a': [a, a_avi, x_a]})
+
+    def test_files_with_the_same_stem_are_rejected(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch(
+            'video_reuse_detector.batch.Pool'
+        ) as pool:
+            directory = Path(tmp)
+            (directory / 'x').mkdir()
+
+            paths = [
+                directory / 'a.mp4',
+                directory / 'a.avi',
+                directory / 'x' / 'b.mp4',
+            ]
+
+            for path in paths:
+                path.touch()
+
+            for store_name in ('keyframes', 'npz'):
+                with self.assertRaises(ValueError):
+                    run(paths, directory / 'interim', store_name, directory / 'out')
+
+            # Nothing is fingerprinted, nor written
+            pool.assert_not_called()
+            self.assertFalse((directory / 'out').exists())
+
+    def test_throughput(self):
+        result = BatchResult('video.mp4', 10.0, 5.0, 10)
+        self.assertEqual(result.throughput, 2.0)
+
+    def test_throughput_failed_file(self):
+        result = BatchResult('video.mp4', 0.0, 0.0, 0, error='Broken')
+        self.assertEqual(result.throughput, 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
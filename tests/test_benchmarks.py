@@ -0,0 +1,21 @@
+import unittest
+
+from benchmarks.compare import compare
+from benchmarks.run import measure
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_measure(self):
+        result = measure(lambda: sum(range(100)), repeat=3)
+
+        self.assertEqual(result['repeat'], 3)
+        self.assertGreaterEqual(result['number'], 1)
+        self.assertLessEqual(result['min'], result['median'])
+
+    def test_compare_only_common_benchmarks(self):
+        baseline = {'orb.from_image': {'median': 2.0}, 'extract': {'median': 1.0}}
+        candidate = {'orb.from_image': {'median': 1.0}}
+
+        self.assertEqual(
+            compare(baseline, candidate), [('orb.from_image', 2.0, 1.0, 0.5)]
+        )
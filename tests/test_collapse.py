@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+
+from video_reuse_detector.fingerprint import (
+    FingerprintCollection,
+    FingerprintComparison,
+    collapse_near_duplicates,
+)
+from video_reuse_detector.thumbnail import Thumbnail
+
+
+def fingerprint(segment_id: int, image: np.ndarray) -> FingerprintCollection:
+    return FingerprintCollection(Thumbnail(image), None, None, 'v.mp4', segment_id)
+
+
+def pattern(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).random((30, 30))
+
+
+class TestCollapse(unittest.TestCase):
+    def test_near_duplicates_are_collapsed(self):
+        title, black = pattern(0), np.zeros((30, 30))
+        images = [title, title + 1e-3, title, pattern(1), black, black]
+
+        collapsed = collapse_near_duplicates(
+            [fingerprint(i, image) for i, image in enumerate(images)]
+        )
+
+        self.assertEqual(
+            [(fpc.segment_id, fpc.run_length) for fpc in collapsed],
+            [(0, 3), (3, 1), (4, 2)],
+        )
+
+    def test_runs_are_not_collapsed_across_gaps(self):
+        title = pattern(0)
+
+        collapsed = collapse_near_duplicates(
+            [fingerprint(0, title), fingerprint(2, title)]
+        )
+
+        self.assertEqual([fpc.run_length for fpc in collapsed], [1, 1])
+
+    def test_comparisons_are_expanded_from_runs(self):
+        query = fingerprint(10, pattern(0))
+        query.run_length = 2
+        reference = fingerprint(0, pattern(0))
+        reference.run_length = 3
+
+        comparison = FingerprintComparison.compare(
+            query, reference, lambda: (False, False, 0.0)
+        )
+        expanded = list(comparison.expand())
+
+        self.assertEqual(len(expanded), 6)
+        self.assertEqual(
+            {(c.query_segment_id, c.reference_segment_id) for c in expanded},
+            {(q, r) for q in (10, 11) for r in (0, 1, 2)},
+        )
+        self.assertTrue(
+            all(c.similarity_score == comparison.similarity_score for c in expanded)
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
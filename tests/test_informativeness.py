@@ -0,0 +1,44 @@
+import unittest
+
+import numpy as np
+
+from video_reuse_detector.informativeness import is_informative
+from video_reuse_detector.similarity import normalized_crossed_correlation
+
+
+class TestInformativeness(unittest.TestCase):
+    def test_flat_frames_are_uninformative(self):
+        black = np.zeros((64, 64, 3), dtype=np.uint8)
+        # Noise of a few intensity levels, e.g. in the darkest part of a fade
+        rng = np.random.default_rng(0)
+        dark = rng.integers(0, 6, (64, 64, 3), dtype=np.uint8)
+
+        self.assertFalse(is_informative(black, 0))
+        self.assertFalse(is_informative(dark, 0))
+
+    def test_textured_frames_are_informative(self):
+        rng = np.random.default_rng(0)
+        texture = rng.integers(0, 256, (64, 64, 3), dtype=np.uint8)
+
+        self.assertTrue(is_informative(texture, 0))
+
+    def test_slates_need_keypoints(self):
+        # Two intensities only, i.e. an entropy of a bit
+        slate = np.zeros((64, 64, 3), dtype=np.uint8)
+        slate[16:48, 16:48] = 255
+
+        self.assertFalse(is_informative(slate, 0))
+        self.assertTrue(is_informative(slate, 100))
+
+    def test_flat_images_do_not_correlate(self):
+        black = np.zeros((30, 30))
+        rng = np.random.default_rng(0)
+
+        self.assertEqual(normalized_crossed_correlation(black, black), 0.0)
+        texture = rng.random((30, 30))
+
+        self.assertEqual(normalized_crossed_correlation(black, texture), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
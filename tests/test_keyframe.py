@@ -1,9 +1,17 @@
 import unittest
 from pathlib import Path
 
+import numpy as np
+
 import video_reuse_detector.ffmpeg as ffmpeg
+from video_reuse_detector.color_correlation import ColorCorrelation
 from video_reuse_detector.downsample import downsample
-from video_reuse_detector.keyframe import Keyframe
+from video_reuse_detector.keyframe import (
+    LETTERBOX_THRESHOLD,
+    Keyframe,
+    crop_letterbox,
+    letterbox_bounds,
+)
 from video_reuse_detector.segment import segment
 
 
@@ -23,6 +31,54 @@ class TestKeyframe(unittest.TestCase):
 
         self.assertEqual(keyframe_image.shape[0:2], (Keyframe.height, Keyframe.width))
 
+    def test_letterbox_is_cropped(self):
+        frame = np.zeros((360, 640, 3), dtype=np.uint8)
+        rng = np.random.default_rng(0)
+        frame[60:300] = rng.integers(32, 256, (240, 640, 3), dtype=np.uint8)
+
+        image = crop_letterbox(frame, letterbox_bounds([frame]))
+
+        self.assertEqual(image.shape, (240, 640, 3))
+        self.assertFalse(np.any(image.max(axis=(1, 2)) <= LETTERBOX_THRESHOLD))
+
+    def test_dark_frames_are_not_cropped(self):
+        frame = np.zeros((360, 640, 3), dtype=np.uint8)
+
+        image = crop_letterbox(frame, letterbox_bounds([frame]))
+
+        self.assertEqual(image.shape, frame.shape)
+
+    def test_thin_text_in_a_dark_frame_is_not_cropped_to(self):
+        frame = np.zeros((360, 640, 3), dtype=np.uint8)
+        frame[178:183, 170:470] = 255
+
+        keyframe = Keyframe.from_frames([frame], letterbox_bounds([frame]))
+
+        self.assertEqual(keyframe.image.shape[0:2], (Keyframe.height, Keyframe.width))
+        ColorCorrelation.from_image(keyframe.image)
+
+    def test_small_object_in_a_dark_frame_is_not_cropped_to(self):
+        frame = np.zeros((360, 640, 3), dtype=np.uint8)
+        frame[160:200, 300:340] = 200
+
+        image = crop_letterbox(frame, letterbox_bounds([frame]))
+
+        self.assertEqual(image.shape, frame.shape)
+
+    def test_bars_are_detected_across_frames(self):
+        rng = np.random.default_rng(0)
+        frames = [np.zeros((360, 640, 3), dtype=np.uint8) for _ in range(3)]
+
+        # The frames of darker scenes do not move the bars of the video
+        frames[0][60:300] = rng.integers(32, 256, (240, 640, 3), dtype=np.uint8)
+        frames[1][150:200, 100:200] = 255
+        frames[2][60:300, 80:560] = 128
+
+        rows, columns = letterbox_bounds(frames)
+
+        self.assertEqual((rows.start, rows.stop), (60, 300))
+        self.assertEqual((columns.start, columns.stop), (0, 640))
+
 
 if __name__ == '__main__':
     unittest.main()
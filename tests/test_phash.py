@@ -0,0 +1,64 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from video_reuse_detector import phash
+
+
+def shapes(seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    image = np.zeros((240, 320, 3), dtype=np.uint8)
+
+    for _ in range(12):
+        center = (int(rng.integers(0, 320)), int(rng.integers(0, 240)))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.circle(image, center, int(rng.integers(10, 80)), color, -1)
+
+    return image
+
+
+class TestPHash(unittest.TestCase):
+    def test_near_duplicates_are_within_the_radius(self):
+        image = shapes(0)
+        h = phash.from_image(image)
+
+        flipped = cv2.flip(image, 1)
+        blurred = cv2.GaussianBlur(image, (5, 5), 1)
+        compressed = cv2.imdecode(
+            cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 20])[1], 1
+        )
+
+        for near_duplicate in [flipped, blurred, compressed]:
+            self.assertLessEqual(
+                phash.hamming_distance(h, phash.from_image(near_duplicate)),
+                phash.RADIUS,
+            )
+
+    def test_different_images_are_far_apart(self):
+        h = phash.from_image(shapes(0))
+
+        for seed in range(1, 6):
+            self.assertGreater(
+                phash.hamming_distance(h, phash.from_image(shapes(seed))), 10
+            )
+
+    def test_near_duplicates_share_a_chunk(self):
+        rng = np.random.default_rng(0)
+
+        for _ in range(100):
+            h = phash.to_signed(int(rng.integers(0, 2 ** 63)) << 1)
+            flipped_bits = rng.choice(phash.BITS, phash.RADIUS, replace=False)
+            other = h ^ sum(1 << int(bit) for bit in flipped_bits)
+
+            self.assertTrue(
+                any(a == b for a, b in zip(phash.chunks(h), phash.chunks(other)))
+            )
+
+    def test_hashes_fit_a_bigint(self):
+        h = phash.from_image(shapes(0))
+        self.assertTrue(-(2 ** 63) <= h < 2 ** 63)
+
+
+if __name__ == '__main__':
+    unittest.main()
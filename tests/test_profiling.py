@@ -0,0 +1,69 @@
+import unittest
+
+from video_reuse_detector import profiling
+from video_reuse_detector.profiling import NULL_SPAN, Histogram, Profile
+
+
+@profiling.profiled('double')
+def double(x):
+    return 2 * x
+
+
+class TestProfiling(unittest.TestCase):
+    def test_spans_are_not_measured_unless_collected(self):
+        self.assertIs(profiling.span('decode'), NULL_SPAN)
+
+        with profiling.collect(enabled=False) as profile:
+            self.assertIs(profiling.span('decode'), NULL_SPAN)
+
+        self.assertEqual(profile.histograms, {})
+        self.assertGreater(profile.elapsed, 0.0)
+
+    def test_profiled_keeps_return_value(self):
+        with profiling.collect() as profile:
+            self.assertEqual(double(2), 4)
+            self.assertEqual(double(3), 6)
+
+        summary = profile.summary()
+
+        self.assertEqual(list(summary.keys()), ['double'])
+        self.assertEqual(summary['double']['count'], 2)
+
+    def test_collect_continues_into_profile(self):
+        with profiling.collect() as profile:
+            double(1)
+
+        with profiling.collect(profile=profile):
+            double(1)
+
+        self.assertEqual(profile.histograms['double'].count, 2)
+
+    def test_merge_round_trip(self):
+        a, b = Profile(), Profile()
+
+        a.histograms['orb'] = Histogram()
+        a.histograms['orb'].observe(0.01)
+        b.histograms['orb'] = Histogram()
+        b.histograms['orb'].observe(1.0)
+        b.histograms['thumbnail'] = Histogram()
+        b.histograms['thumbnail'].observe(0.1)
+
+        merged = Profile.from_dict(a.to_dict())
+        merged.merge(Profile.from_dict(b.to_dict()))
+
+        self.assertEqual(merged.histograms['orb'].count, 2)
+        self.assertAlmostEqual(merged.histograms['orb'].total, 1.01)
+        self.assertEqual(merged.histograms['thumbnail'].count, 1)
+
+    def test_quantiles(self):
+        h = Histogram()
+
+        for _ in range(95):
+            h.observe(0.001)
+
+        for _ in range(5):
+            h.observe(10.0)
+
+        self.assertLess(h.quantile(0.5), 0.0011)
+        self.assertLess(h.quantile(0.95), 0.0011)
+        self.assertGreater(h.quantile(0.99), 8.0)
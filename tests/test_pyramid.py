@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+
+from video_reuse_detector.fingerprint import (
+    FingerprintCollection,
+    FingerprintComparison,
+    MatchLevel,
+)
+from video_reuse_detector.pyramid import Pyramid, similarities
+from video_reuse_detector.similarity import normalized_crossed_correlation
+from video_reuse_detector.thumbnail import Thumbnail
+
+
+def thumbnails(seed: int, n: int):
+    rng = np.random.default_rng(seed)
+    base = rng.random((30, 30))
+
+    # From near-duplicates of the same image to unrelated ones
+    return [
+        Thumbnail(base + rng.normal(0, noise, (30, 30)))
+        for noise in np.linspace(0, 2, n)
+    ] + [Thumbnail(np.zeros((30, 30)))]
+
+
+class TestPyramid(unittest.TestCase):
+    def test_similar_pairs_are_never_rejected(self):
+        query, reference = thumbnails(0, 20), thumbnails(0, 20)
+        threshold = 0.65
+
+        result = similarities(
+            Pyramid.from_thumbnails(query),
+            Pyramid.from_thumbnails(reference),
+            threshold,
+        )
+
+        for i, q in enumerate(query):
+            for j, r in enumerate(reference):
+                ncc = normalized_crossed_correlation(q.image, r.image)
+
+                if np.isnan(result[i, j]):
+                    self.assertLess(ncc, threshold)
+                else:
+                    self.assertAlmostEqual(result[i, j], ncc)
+
+        # The pyramid is of no use unless it rejects something
+        self.assertTrue(np.isnan(result).any())
+
+    def test_compare_all_is_unchanged(self):
+        def fingerprints(video_name, seed):
+            return [
+                FingerprintCollection(t, None, None, video_name, i)
+                for i, t in enumerate(thumbnails(seed, 10))
+            ]
+
+        query, reference = fingerprints('q.mp4', 0), fingerprints('r.mp4', 0)
+
+        comparisons = FingerprintComparison.compare_all(query, reference)
+
+        for q in query:
+            expected = {
+                r.segment_id: FingerprintComparison.compare(q, r) for r in reference
+            }
+
+            for comparison in comparisons[q.segment_id]:
+                e = expected[comparison.reference_segment_id]
+                self.assertEqual(comparison.match_level, e.match_level)
+                self.assertAlmostEqual(comparison.similarity_score, e.similarity_score)
+
+        self.assertTrue(
+            any(
+                c.match_level != MatchLevel.LEVEL_G
+                for cs in comparisons.values()
+                for c in cs
+            )
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
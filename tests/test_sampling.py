@@ -0,0 +1,60 @@
+import unittest
+
+import numpy as np
+
+from video_reuse_detector.sampling import MAX_RUN_LENGTH, sample
+
+
+def frame(intensity: int) -> np.ndarray:
+    return np.full((64, 64, 3), intensity, dtype=np.uint8)
+
+
+def moving(seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (64, 64, 3), dtype=np.uint8)
+
+
+class TestSampling(unittest.TestCase):
+    def test_static_span_is_one_sample(self):
+        segments = [[frame(100)] * 5] * 4 + [[frame(200)] * 5] * 2
+
+        samples = list(sample(segments, start_segment_id=10))
+
+        self.assertEqual(
+            [(s.segment_id, s.run_length) for s in samples], [(10, 4), (14, 2)]
+        )
+
+    def test_motion_is_sampled_per_segment(self):
+        segments = [[moving(5 * i + j) for j in range(5)] for i in range(3)]
+
+        samples = list(sample(segments))
+
+        self.assertEqual(
+            [(s.segment_id, s.run_length) for s in samples], [(0, 1), (1, 1), (2, 1)]
+        )
+
+    def test_keyframe_is_not_averaged_over_a_cut(self):
+        first, second = frame(0), frame(255)
+
+        (s,) = list(sample([[first, first, second, second, second]]))
+
+        self.assertEqual(len(s.frames), 3)
+        self.assertTrue(all(f is second for f in s.frames))
+
+    def test_run_length_is_bounded(self):
+        segments = [[frame(100)] * 5] * (MAX_RUN_LENGTH + 1)
+
+        samples = list(sample(segments))
+
+        self.assertEqual([s.run_length for s in samples], [MAX_RUN_LENGTH, 1])
+
+    def test_empty_segments_are_skipped(self):
+        samples = list(sample([[frame(100)], [], [frame(100)]]))
+
+        self.assertEqual(
+            [(s.segment_id, s.run_length) for s in samples], [(0, 1), (2, 1)]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+import numpy as np
+
+from video_reuse_detector.fingerprint import (
+    FingerprintCollection,
+    FingerprintComparison,
+    MatchLevel,
+)
+from video_reuse_detector.keyframe import Keyframe
+from video_reuse_detector.ssm import SAMPLE_RATE, SSM, similarity_matrix
+
+
+def chirp(seconds: int) -> np.ndarray:
+    t = np.arange(SAMPLE_RATE * seconds) / SAMPLE_RATE
+    return (0.5 * np.sin(2 * np.pi * (300 + 400 * t) * t)).astype(np.float32)
+
+
+def noise(seconds: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.normal(0, 0.3, SAMPLE_RATE * seconds).astype(np.float32)
+
+
+class TestSSM(unittest.TestCase):
+    def test_one_fingerprint_per_segment(self):
+        # The last, partial, segment is padded
+        samples = np.concatenate([chirp(2), chirp(1)[: SAMPLE_RATE // 2]])
+
+        self.assertEqual(len(SSM.from_pcm(samples)), 3)
+        self.assertEqual(SSM.from_pcm(np.zeros(0, dtype=np.float32)), [])
+
+    def test_silence_has_no_fingerprint(self):
+        self.assertEqual(SSM.from_pcm(np.zeros(SAMPLE_RATE, dtype=np.float32)), [None])
+
+    def test_similarity(self):
+        loud = SSM.from_pcm(chirp(3))
+        quiet = SSM.from_pcm(chirp(3) * 0.1)
+        other = SSM.from_pcm(noise(3))
+
+        for a, b, c in zip(loud, quiet, other):
+            self.assertGreater(a.similar_to(b), 0.9)
+            self.assertLess(a.similar_to(c), 0.5)
+
+    def test_similarity_matrix(self):
+        query = SSM.from_pcm(chirp(2)) + [None]
+        reference = SSM.from_pcm(noise(1)) + SSM.from_pcm(chirp(1))
+
+        similarities = similarity_matrix(query, reference)
+
+        self.assertEqual(similarities.shape, (3, 2))
+        self.assertAlmostEqual(
+            similarities[0, 1], query[0].similar_to(reference[1]), places=5
+        )
+        self.assertTrue(np.isnan(similarities[2]).all())
+
+    def test_bytes_round_trip(self):
+        ssm = SSM.from_pcm(chirp(1))[0]
+
+        self.assertGreater(SSM.from_bytes(ssm.to_bytes()).similar_to(ssm), 0.99)
+
+    def test_level_b(self):
+        # A smooth gradient has no ORB keypoints, so the audio decides
+        # between level B and level C
+        image = np.dstack([np.tile(np.linspace(0, 255, 320), (320, 1))] * 3)
+        image[..., 2] = 120
+        keyframe = Keyframe(image.astype(np.uint8))
+
+        query = FingerprintCollection.from_keyframe(keyframe, 'query.mp4', 0)
+        reference = FingerprintCollection.from_keyframe(keyframe, 'reference.mp4', 0)
+        self.assertIsNone(query.orb)
+
+        query.ssm = SSM.from_pcm(chirp(1))[0]
+        reference.ssm = SSM.from_pcm(chirp(1) * 0.5)[0]
+
+        comparisons = FingerprintComparison.compare_all([query], [reference])
+        self.assertEqual(comparisons[0][0].match_level, MatchLevel.LEVEL_B)
+
+        reference.ssm = SSM.from_pcm(noise(1))[0]
+
+        comparison = FingerprintComparison.compare(query, reference)
+        self.assertEqual(comparison.match_level, MatchLevel.LEVEL_C)
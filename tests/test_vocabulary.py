@@ -0,0 +1,96 @@
+import unittest
+from collections import Counter
+
+import numpy as np
+
+from video_reuse_detector import vocabulary
+from video_reuse_detector.orb import lu
+from video_reuse_detector.vocabulary import Vocabulary
+
+
+def clusters(number_of_clusters: int, size: int, noise: float, seed=0):
+    """
+    Descriptors scattered around random centers, by flipping each of their
+    bits with probability `noise`, and the cluster of each
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.integers(0, 256, (number_of_clusters, 32), dtype=np.uint8)
+
+    bits = np.unpackbits(np.repeat(centers, size, axis=0), axis=1)
+    flipped = (rng.random(bits.shape) < noise).astype(np.uint8)
+
+    labels = np.repeat(np.arange(number_of_clusters), size)
+
+    return np.packbits(bits ^ flipped, axis=1), labels
+
+
+class TestVocabulary(unittest.TestCase):
+    def test_hamming_distances_match_the_lookup_table(self):
+        rng = np.random.default_rng(0)
+        a = rng.integers(0, 256, (5, 32), dtype=np.uint8)
+        b = rng.integers(0, 256, (7, 32), dtype=np.uint8)
+
+        expected = lu[a[:, None, :] ^ b[None, :, :]].sum(axis=2)
+
+        np.testing.assert_array_equal(vocabulary.hamming_distances(a, b), expected)
+
+    def test_words_do_not_mix_clusters(self):
+        descriptors, labels = clusters(10, 100, 0.05)
+
+        trained = Vocabulary.train(descriptors, 20)
+        words = trained.quantize(descriptors)
+
+        for word in set(words.tolist()):
+            self.assertEqual(len(set(labels[words == word].tolist())), 1)
+
+        # And every cluster is mostly quantized to one word
+        for cluster in range(10):
+            ((_, count),) = Counter(words[labels == cluster]).most_common(1)
+            self.assertGreaterEqual(count, 30)
+
+    def test_quantization_is_batched(self):
+        descriptors, _ = clusters(4, 3000, 0.1)
+        trained = Vocabulary.train(descriptors, 4, iterations=2)
+
+        self.assertGreater(len(descriptors), vocabulary.BATCH_SIZE)
+        np.testing.assert_array_equal(
+            trained.quantize(descriptors),
+            vocabulary.hamming_distances(descriptors, trained.words).argmin(axis=1),
+        )
+
+    def test_vocabularies_round_trip_through_bytes(self):
+        descriptors, _ = clusters(3, 10, 0.1)
+        trained = Vocabulary.train(descriptors, 3)
+
+        restored = Vocabulary.from_bytes(trained.to_bytes())
+
+        np.testing.assert_array_equal(restored.words, trained.words)
+
+    def test_no_descriptors_have_no_words(self):
+        descriptors, _ = clusters(3, 10, 0.1)
+        trained = Vocabulary.train(descriptors, 3)
+
+        self.assertEqual(trained.bag_of_words(np.zeros((0, 32), np.uint8)), {})
+
+    def test_rare_shared_words_score_highest(self):
+        query = {0: {1: 0.5, 2: 0.5}}
+        postings = [
+            # Shares the rare word
+            ('rare', 1, 1.0),
+            # Shares the common word only
+            ('common', 2, 1.0),
+            ('unrelated', 3, 1.0),
+        ]
+        idfs = {
+            1: vocabulary.inverse_document_frequency(1, 100),
+            2: vocabulary.inverse_document_frequency(50, 100),
+        }
+
+        scores = vocabulary.tf_idf_scores(query, postings, idfs)
+
+        self.assertNotIn((0, 'unrelated'), scores)
+        self.assertGreater(scores[(0, 'rare')], scores[(0, 'common')])
+
+
+if __name__ == '__main__':
+    unittest.main()
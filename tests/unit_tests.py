@@ -4,6 +4,7 @@ Most run without interacting with ffmpeg (test_color_correlation) being the exce
 """
 import unittest
 
+import tests.test_batch
 import tests.test_color_correlation
 import tests.test_image_transformation
 import tests.test_orb
@@ -14,6 +15,7 @@ loader = unittest.TestLoader()
 suite = unittest.TestSuite()
 
 # add tests to the test suite
+suite.addTests(loader.loadTestsFromModule(tests.test_batch))
 suite.addTests(loader.loadTestsFromModule(tests.test_color_correlation))
 suite.addTests(loader.loadTestsFromModule(tests.test_image_transformation))
 suite.addTests(loader.loadTestsFromModule(tests.test_orb))
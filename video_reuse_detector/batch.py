@@ -0,0 +1,353 @@
+"""
+Offline bulk fingerprinting of many videos in a single interpreter.
+
+Compared to orchestrating the individual steps (segment, downsample,
+keyframe, ...) through GNU parallel, as parallel_process.sh does, this
+pays the Python/OpenCV import cost once per worker process rather than
+once per step and file.
+
+Usage,
+
+    python -m video_reuse_detector.batch static/videos/archive minimal_archive.txt
+
+where every argument is either a directory (searched recursively), a
+.txt-file listing one video path per line, or a video file.
+"""
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+import video_reuse_detector.util as util
+from video_reuse_detector import ffmpeg
+from video_reuse_detector.fingerprint import (
+    FingerprintCollection,
+    extract_fingerprint_collection_with_keyframes,
+    segment_id_keyframe_fp_map_to_list,
+)
+from video_reuse_detector.keyframe import Keyframe
+
+
+FILE_LIST_SUFFIX = '.txt'
+
+
+def read_file_list(file_list: Path) -> List[Path]:
+    """Reads a file with one path per line, such as minimal_archive.txt,
+    ignoring blank lines
+    """
+    with file_list.open() as f:
+        lines = f.read().splitlines()
+
+    return [Path(line.strip()) for line in lines if line.strip() != '']
+
+
+def collect_input_files(inputs: Iterable[str]) -> List[Path]:
+    """Resolves the given directories, file lists and video files into
+    a list of unique video paths, retaining the order they were given in
+    """
+    video_paths = []  # type: List[Path]
+
+    for i in inputs:
+        path = Path(i)
+
+        if path.is_dir():
+            video_paths.extend(sorted(filter(Path.is_file, path.glob('**/*'))))
+        elif path.suffix == FILE_LIST_SUFFIX:
+            video_paths.extend(read_file_list(path))
+        else:
+            video_paths.append(path)
+
+    # dict.fromkeys retains the insertion order
+    return list(dict.fromkeys(video_paths))
+
+
+SegmentMap = Dict[int, Tuple[Keyframe, FingerprintCollection]]
+
+
+def write_keyframes(
+    video_name: str, segment_id_to_keyframe_fp_map: SegmentMap, output_directory: Path
+) -> Path:
+    """Writes one keyframe per segment using the same layout as process.sh,
+    i.e. "<output_directory>/<video>/segment/<segment_id>/keyframe.png",
+    which is what video_reuse_detector.main expects as input.
+    """
+    video_directory = output_directory / Path(video_name).stem
+
+    for segment_id, (keyframe, _) in segment_id_to_keyframe_fp_map.items():
+        segment_directory = video_directory / 'segment' / f'{segment_id:03}'
+        segment_directory.mkdir(parents=True, exist_ok=True)
+        util.imwrite(segment_directory / 'keyframe.png', keyframe.image)
+
+    return video_directory
+
+
+def write_npz(
+    video_name: str, segment_id_to_keyframe_fp_map: SegmentMap, output_directory: Path
+) -> Path:
+    """Writes the fingerprints of a video to a single compressed .npz-file.
+
+    Missing fingerprints (grayscale videos lack a color correlation and
+    some keyframes have no ORB descriptors) are stored as -1 and as a
+    zero-length slice of the descriptors respectively.
+    """
+    fpcs = segment_id_keyframe_fp_map_to_list(segment_id_to_keyframe_fp_map)
+
+    output_directory.mkdir(parents=True, exist_ok=True)
+    destination = output_directory / f'{Path(video_name).stem}.npz'
+
+    descriptors = [
+        np.array(fpc.orb.descriptors, dtype=np.uint8).reshape(-1, 32)
+        if fpc.orb is not None
+        else np.zeros((0, 32), dtype=np.uint8)
+        for fpc in fpcs
+    ]
+
+    np.savez_compressed(
+        str(destination),
+        video_name=np.array(video_name),
+        segment_ids=np.array([fpc.segment_id for fpc in fpcs], dtype=np.int64),
+        thumbnails=np.array([fpc.thumbnail.image for fpc in fpcs], dtype=np.float64),
+        color_correlations=np.array(
+            [
+                fpc.color_correlation.as_number
+                if fpc.color_correlation is not None
+                else -1
+                for fpc in fpcs
+            ],
+            dtype=np.int64,
+        ),
+        orb_offsets=np.cumsum([0] + [len(d) for d in descriptors], dtype=np.int64),
+        orb_descriptors=np.concatenate(descriptors)
+        if descriptors
+        else np.zeros((0, 32), dtype=np.uint8),
+    )
+
+    return destination
+
+
+def discard(
+    video_name: str, segment_id_to_keyframe_fp_map: SegmentMap, output_directory: Path
+) -> Optional[Path]:
+    """Writes nothing. Useful when only the throughput is of interest"""
+    return None
+
+
+Store = Callable[[str, SegmentMap, Path], Optional[Path]]
+
+STORES = {
+    'keyframes': write_keyframes,
+    'npz': write_npz,
+    'none': discard,
+}  # type: Dict[str, Store]
+
+
+@dataclass
+class BatchResult:
+    video_name: str
+    video_duration: float
+    processing_time: float
+    number_of_segments: int
+    output: Optional[Path] = None
+    error: Optional[str] = None
+
+    @property
+    def throughput(self) -> float:
+        """Seconds of video fingerprinted per second of wall time"""
+        if self.processing_time <= 0:
+            return 0.0
+
+        return self.video_duration / self.processing_time
+
+
+def stem_collisions(video_paths: List[Path]) -> Dict[str, List[Path]]:
+    """Groups the paths by stem, the name that the stores write the output
+    of a file to, and returns the stems that are shared by several files,
+    e.g. "a.mp4" and "a.avi", or "x/a.mp4" and "y/a.mp4"
+    """
+    paths_by_stem = {}  # type: Dict[str, List[Path]]
+
+    for p in video_paths:
+        paths_by_stem.setdefault(p.stem, []).append(p)
+
+    return {stem: paths for stem, paths in paths_by_stem.items() if len(paths) > 1}
+
+
+def __init_worker__():
+    # Every worker process is single-threaded as far as OpenCV is
+    # concerned, the parallelism comes from the pool. Otherwise each
+    # worker spawns a thread per core and the processes oversubscribe
+    # the CPU.
+    import cv2
+
+    cv2.setNumThreads(1)
+
+
+def fingerprint_file(
+    file_path: Path, interim_directory: Path, store_name: str, output_directory: Path
+) -> BatchResult:
+    store = STORES[store_name]
+
+    # The extraction writes to, and cleans up, a directory named after the
+    # stem of the file, which files with the same name in different
+    # directories would otherwise share
+    interim_directory.mkdir(parents=True, exist_ok=True)
+    task_directory = Path(tempfile.mkdtemp(dir=interim_directory))
+
+    try:
+        start = time.time()
+        segment_id_to_keyframe_fp_map = extract_fingerprint_collection_with_keyframes(
+            file_path, task_directory
+        )
+        output = store(file_path.name, segment_id_to_keyframe_fp_map, output_directory)
+        processing_time = time.time() - start
+
+        return BatchResult(
+            file_path.name,
+            ffmpeg.get_video_duration(file_path),
+            processing_time,
+            len(segment_id_to_keyframe_fp_map),
+            output,
+        )
+    except Exception as e:
+        # A single broken file should not bring down the entire batch
+        logger.exception(f'Could not fingerprint "{file_path}"')
+
+        return BatchResult(file_path.name, 0.0, 0.0, 0, error=str(e))
+    finally:
+        shutil.rmtree(task_directory, ignore_errors=True)
+
+
+def __fingerprint_file__(args) -> BatchResult:
+    return fingerprint_file(*args)
+
+
+def format_result(result: BatchResult) -> str:
+    if result.error is not None:
+        return f'{result.video_name}\tFAILED\t{result.error}'
+
+    return (
+        f'{result.video_name}'
+        f'\t{result.number_of_segments} segments'
+        f'\t{result.video_duration:.2f}s of video'
+        f'\t{result.processing_time:.2f}s'
+        f'\t{result.throughput:.2f}x'
+    )
+
+
+def run(
+    video_paths: List[Path],
+    interim_directory: Path,
+    store_name: str,
+    output_directory: Path,
+    processes: int = None,
+) -> List[BatchResult]:
+    missing = [p for p in video_paths if not p.exists()]
+
+    for p in missing:
+        logger.warning(f'"{p}" does not exist, skipping...')
+
+    video_paths = [p for p in video_paths if p.exists()]
+
+    # Rejected before anything is fingerprinted, otherwise the output of one
+    # file silently overwrites that of another with the same stem
+    collisions = stem_collisions(video_paths) if store_name != 'none' else {}
+
+    for stem, paths in collisions.items():
+        logger.error(f'"{stem}" is the name of {", ".join(map(str, paths))}')
+
+    if collisions:
+        raise ValueError(
+            f'{len(collisions)} output names are shared by several files,'
+            ' rename them or fingerprint them separately'
+        )
+
+    tasks = [(p, interim_directory, store_name, output_directory) for p in video_paths]
+
+    logger.info(f'Fingerprinting {len(tasks)} files using {processes} processes')
+
+    results = []
+
+    with Pool(processes=processes, initializer=__init_worker__) as pool:
+        # imap_unordered so that results are reported as soon as they are
+        # available, rather than in the order they were given
+        for result in pool.imap_unordered(__fingerprint_file__, tasks):
+            print(format_result(result), flush=True)
+            results.append(result)
+
+    return results
+
+
+def summarize(results: List[BatchResult], wall_time: float) -> str:
+    succeeded = [r for r in results if r.error is None]
+    total_duration = sum(r.video_duration for r in succeeded)
+    throughput = total_duration / wall_time if wall_time > 0 else 0.0
+
+    return (
+        f'Processed {total_duration:.2f} seconds of video'
+        f' ({len(succeeded)}/{len(results)} files) in {wall_time:.2f} seconds,'
+        f' i.e. {throughput:.2f} seconds of video per second'
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Batch fingerprint extraction')
+
+    parser.add_argument(
+        'inputs',
+        nargs='+',
+        help='Directories, files listing video paths (.txt) or video files',
+    )
+
+    parser.add_argument(
+        '--store',
+        choices=sorted(STORES.keys()),
+        default='keyframes',
+        help='Where to write the fingerprints',
+    )
+
+    parser.add_argument(
+        '--output-directory',
+        default='processed',
+        help='The directory the chosen store writes to',
+    )
+
+    parser.add_argument(
+        '--interim-directory',
+        default='interim',
+        help='The directory downsampled frames are written to',
+    )
+
+    parser.add_argument(
+        '--processes',
+        type=int,
+        default=os.cpu_count(),
+        help='The number of worker processes',
+    )
+
+    args = parser.parse_args()
+
+    video_paths = collect_input_files(args.inputs)
+
+    start = time.time()
+
+    try:
+        results = run(
+            video_paths,
+            Path(args.interim_directory),
+            args.store,
+            Path(args.output_directory),
+            args.processes,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    logger.info(summarize(results, time.time() - start))
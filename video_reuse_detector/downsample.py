@@ -6,7 +6,13 @@ from loguru import logger
 from video_reuse_detector import ffmpeg
 
 
-def downsample(input_video: Path, output_directory: Path = None, fps=5) -> List[Path]:
+def downsample(
+    input_video: Path,
+    output_directory: Path = None,
+    fps=5,
+    start: float = None,
+    duration: float = None,
+) -> List[Path]:
     """
     Assumes that the given path refers to a video file and extracts an `fps`
     number of frames from every second of the specified video.
@@ -16,15 +22,25 @@ def downsample(input_video: Path, output_directory: Path = None, fps=5) -> List[
     is, for instance, 10 seconds long, the number of frames that are produced
     is equal to 50.
 
+    If `start` and/or `duration` (both in seconds) are given only that part
+    of the video is downsampled.
+
     The return value is a list of all these frames.
     """
     if output_directory is None:
         output_directory = input_video.parent
 
+    # Note that -ss is given before -i, which makes ffmpeg seek in the input
+    # rather than decoding (and discarding) everything up until "start"
+    seek = f' -ss {start}' if start is not None else ''
+    limit = f' -t {duration}' if duration is not None else ''
+
     # TODO: Always yield strictly fps number of frames.
     ffmpeg_cmd = (
         'ffmpeg'
+        f'{seek}'
         f' -i {input_video}'
+        f'{limit}'
         f' -vf fps={fps}'
         f' {output_directory}/frame%09d.png'
     )
@@ -1,11 +1,51 @@
+import subprocess
 from pathlib import Path
 from typing import List
 
+import numpy as np
 from loguru import logger
 
 from video_reuse_detector import ffmpeg
 
 
+def decode_pcm(
+    input_video: Path,
+    sample_rate: int,
+    start: float = None,
+    duration: float = None,
+) -> np.ndarray:
+    """
+    Decodes the audio of the given video, or of the part given by `start`
+    and/or `duration` (in seconds), to mono samples in [-1, 1] at the given
+    sample rate. The samples are read from a pipe, nothing is written to
+    disk. Videos without audio yield no samples.
+    """
+    seek = ['-ss', str(start)] if start is not None else []
+    limit = ['-t', str(duration)] if duration is not None else []
+
+    ffmpeg_cmd = (
+        ['ffmpeg', '-v', 'error', '-nostdin']
+        + seek
+        + ['-i', str(input_video)]
+        + limit
+        + ['-vn', '-ac', '1', '-ar', str(sample_rate), '-f', 's16le', '-']
+    )
+
+    logger.debug(f'Decoding audio from "{input_video}"')
+    result = subprocess.run(
+        ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False
+    )
+
+    if result.returncode != 0:
+        # Most likely there is no audio stream
+        logger.debug(f'No audio decoded from "{input_video}": {result.stderr!r}')
+        return np.zeros(0, dtype=np.float32)
+
+    samples = np.frombuffer(result.stdout, dtype=np.int16)
+
+    return samples.astype(np.float32) / np.iinfo(np.int16).max
+
+
 def extract(
     input_video: Path, output_directory: Path = None, segment_length_in_seconds=1
 ) -> List[Path]:
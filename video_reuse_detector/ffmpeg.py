@@ -1,9 +1,10 @@
+import json
 import os
 import random
 import re
 import subprocess
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List
 
 from loguru import logger
 
@@ -266,6 +267,57 @@ def get_video_dimensions(file_path: Path) -> str:
     return subprocess.check_output(ffprobe_cmd.split()).decode().rstrip()
 
 
+def parse_frame_rate(frame_rate: str) -> float:
+    """
+    >>> parse_frame_rate('30000/1001')
+    29.97002997002997
+
+    >>> parse_frame_rate('0/0')
+    0.0
+    """
+    numerator, _, denominator = frame_rate.partition('/')
+    denominator = denominator or '1'
+
+    if float(denominator) == 0:
+        return 0.0
+
+    return float(numerator) / float(denominator)
+
+
+def get_video_stream_info(file_path: Path) -> Dict[str, Any]:
+    """
+    The codec, dimensions and average frame rate of the first video stream,
+    on the form,
+
+        {'codec': 'h264', 'width': 640, 'height': 360, 'frame_rate': 25.0}
+
+    or an empty dictionary if there is no video stream
+    """
+    ffprobe_cmd = (
+        'ffprobe'
+        ' -v error'
+        ' -select_streams v:0'
+        ' -show_entries'
+        ' stream=codec_name,width,height,avg_frame_rate'
+        ' -of json'
+        f' {str(file_path)}'
+    )
+
+    streams = json.loads(subprocess.check_output(ffprobe_cmd.split())).get('streams')
+
+    if not streams:
+        return {}
+
+    stream = streams[0]
+
+    return {
+        'codec': stream.get('codec_name'),
+        'width': stream.get('width'),
+        'height': stream.get('height'),
+        'frame_rate': parse_frame_rate(stream.get('avg_frame_rate', '0/0')),
+    }
+
+
 def tint(
     input_file: Path, output_directory: Path, color='red', overwrite=False
 ) -> Path:
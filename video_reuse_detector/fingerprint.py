@@ -1,19 +1,49 @@
+import math
+import shutil
+import tempfile
 from collections import OrderedDict, namedtuple
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum, auto
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
 from loguru import logger
 
+import video_reuse_detector.util as util
+from video_reuse_detector import ffmpeg, phash, pyramid
 from video_reuse_detector.color_correlation import ColorCorrelation
 from video_reuse_detector.downsample import downsample
-from video_reuse_detector.keyframe import Keyframe
+from video_reuse_detector.extract_audio import decode_pcm
+from video_reuse_detector.informativeness import is_informative
+from video_reuse_detector.keyframe import Keyframe, letterbox_bounds
 from video_reuse_detector.orb import ORB
+from video_reuse_detector.profiling import count, profiled, span
+from video_reuse_detector.pyramid import Pyramid
+from video_reuse_detector.sampling import Sample, sample
+from video_reuse_detector.ssm import SAMPLE_RATE, SSM, similarity_matrix
 from video_reuse_detector.thumbnail import Thumbnail
 
 
+# Videos are downsampled to FPS frames per second and every FPS consecutive
+# frames are averaged into a keyframe, hence each segment spans one second
+FPS = 5
+SEGMENT_LENGTH_IN_SECONDS = 1
+
+# The number of frames, spread evenly over a video, that its letterbox is
+# detected from
+LETTERBOX_SAMPLES = 9
+
+
+def number_of_segments(video_duration: float) -> int:
+    """The (upper bound of the) number of segments in a video
+
+    >>> number_of_segments(10.12)
+    11
+    """
+    return math.ceil(video_duration / SEGMENT_LENGTH_IN_SECONDS)
+
+
 class MatchLevel(Enum):
     LEVEL_A = auto()
     LEVEL_B = auto()
@@ -39,8 +69,19 @@ class FingerprintCollection:
     orb: ORB
     video_name: str
     segment_id: int
-
-    # TODO: Add SSM? Will we support audio?
+    # From the audio, which is processed separately, see
+    # extract_fingerprint_collection_with_keyframes. None for silent segments
+    # and videos without audio
+    ssm: Optional[SSM] = None
+    # The number of consecutive segments, starting at segment_id, that the
+    # fingerprints represent, more than one for the low-motion spans found
+    # by adaptive sampling, see sampling.py
+    run_length: int = 1
+    # Whether the keyframe is worth comparing, see informativeness.py.
+    # Uninformative fingerprints are stored, but never compared
+    informative: bool = True
+    # See phash.py, None for fingerprints that were stored without one
+    phash: Optional[int] = None
 
     @staticmethod
     def from_keyframe(
@@ -50,33 +91,52 @@ class FingerprintCollection:
         # when comparing two videos as the multi-level matching algorithm
         # is traversed and doing so here, as opposed to within the logic
         # for establishing a similarity value proves more succinct.
-        thumbnail = Thumbnail.from_image(keyframe.image)
+        with span('thumbnail'):
+            thumbnail = Thumbnail.from_image(keyframe.image)
 
         if is_color_image(keyframe.image):
-            color_correlation = ColorCorrelation.from_image(keyframe.image)
+            with span('color_correlation'):
+                color_correlation = ColorCorrelation.from_image(keyframe.image)
         else:
             color_correlation = None
 
-        orb = ORB.from_image(keyframe.image)
+        with span('orb'):
+            orb = ORB.from_image(keyframe.image)
+
+        informative = is_informative(keyframe.image, len(orb.descriptors))
+
         if len(orb.descriptors) == 0:
             orb = None
 
-        # TODO: set SSM, see previous TODO comment
+        with span('phash'):
+            perceptual_hash = phash.from_image(keyframe.image)
 
         return FingerprintCollection(
-            thumbnail, color_correlation, orb, video_name, segment_id
+            thumbnail,
+            color_correlation,
+            orb,
+            video_name,
+            segment_id,
+            informative=informative,
+            phash=perceptual_hash,
         )
 
 
+# The thumbnail similarity below which two segments are not compared further
+THUMBNAIL_THRESHOLD = 0.65
+
+
+@profiled('compare_thumbnails')
 def compare_thumbnails(
     query: FingerprintCollection,
     reference: FingerprintCollection,
-    similarity_threshold=0.65,
+    similarity_threshold=THUMBNAIL_THRESHOLD,
 ) -> Tuple[bool, float]:
     S_th = query.thumbnail.similar_to(reference.thumbnail)
     return (S_th >= similarity_threshold, S_th)
 
 
+@profiled('compare_color_correlation')
 def compare_color_correlation(
     query: FingerprintCollection,
     reference: FingerprintCollection,
@@ -102,6 +162,7 @@ def compare_color_correlation(
     return (True, S_cc >= similarity_threshold, S_cc)
 
 
+@profiled('compare_orb')
 def compare_orb(query, reference, similarity_threshold=0.7):
     COULD_NOT_COMPARE = (False, False, 0.0)
 
@@ -125,9 +186,55 @@ def compare_orb(query, reference, similarity_threshold=0.7):
 
 
 def compare_ssm(
-    query: FingerprintCollection, reference: FingerprintCollection
+    query: FingerprintCollection,
+    reference: FingerprintCollection,
+    similarity_threshold=0.7,
 ) -> Tuple[bool, bool, float]:
-    return False, False, 0
+    if query.ssm is None or reference.ssm is None:
+        return False, False, 0.0
+
+    S_ssm = query.ssm.similar_to(reference.ssm)
+
+    return True, S_ssm >= similarity_threshold, S_ssm
+
+
+def ssm_lookup(
+    similarities: np.ndarray, similarity_threshold=0.7
+) -> Callable[[int, int], Tuple[bool, bool, float]]:
+    """
+    As compare_ssm, for query and reference segments given by their index
+    in a matrix of precomputed similarities, see ssm.similarity_matrix
+    """
+
+    def compare(i: int, j: int) -> Tuple[bool, bool, float]:
+        S_ssm = similarities[i, j]
+
+        if np.isnan(S_ssm):
+            return False, False, 0.0
+
+        return True, S_ssm >= similarity_threshold, float(S_ssm)
+
+    return compare
+
+
+def thumbnail_lookup(
+    similarities: np.ndarray, similarity_threshold=THUMBNAIL_THRESHOLD
+) -> Callable[[int, int], Tuple[bool, float]]:
+    """
+    As compare_thumbnails, for query and reference segments given by their
+    index in a matrix of precomputed similarities, see pyramid.similarities,
+    where NaN stands for a pair that is known to be dissimilar
+    """
+
+    def compare(i: int, j: int) -> Tuple[bool, float]:
+        S_th = similarities[i, j]
+
+        if np.isnan(S_th):
+            return False, 0.0
+
+        return S_th >= similarity_threshold, float(S_th)
+
+    return compare
 
 
 __FingerprintComparison__ = namedtuple(
@@ -146,10 +253,28 @@ __FingerprintComparison__ = namedtuple(
 
 # TODO: re-implement using continuation style?
 def __compare_fingerprints__(
-    query: FingerprintCollection, reference: FingerprintCollection
+    query: FingerprintCollection,
+    reference: FingerprintCollection,
+    compare_audio: Callable[[], Tuple[bool, bool, float]] = None,
+    compare_thumbnail: Callable[[], Tuple[bool, float]] = None,
 ) -> __FingerprintComparison__:
+    """
+    Compares the fingerprints level by level, see MatchLevel. The audio and
+    the thumbnails are compared through `compare_audio` and
+    `compare_thumbnail`, if given, rather than compare_ssm and
+    compare_thumbnails
+    """
+    if compare_audio is None:
+
+        def compare_audio():
+            return compare_ssm(query, reference)
+
+    if compare_thumbnail is None:
 
-    similar_enough_th, S_th = compare_thumbnails(query, reference)
+        def compare_thumbnail():
+            return compare_thumbnails(query, reference)
+
+    similar_enough_th, S_th = compare_thumbnail()
 
     could_compare_cc = None
     similar_enough_cc = None
@@ -175,21 +300,17 @@ def __compare_fingerprints__(
                 similarity_score = w_th * S_th + w_cc * S_cc + w_orb * S_orb
                 match_level = MatchLevel.LEVEL_A
             else:
-                """
-                TODO: Add back once SSM is supported
-                could_compare_ssm, similar_enough_ssm, S_ssm = compare_ssm(
-                    query, reference
-                )  # noqa: E501
+                could_compare_ssm, similar_enough_ssm, S_ssm = compare_audio()
+
                 if could_compare_ssm and similar_enough_ssm:
-                    # Level B
+                    # Level B, the audio matched rather than the keypoints
                     w_th, w_cc, w_ssm = 0.4, 0.3, 0.2
-                    similarity = w_th * S_th + w_cc * S_cc + w_ssm * S_ssm
-                    return (MatchLevel.LEVEL_B, similarity)
+                    similarity_score = w_th * S_th + w_cc * S_cc + w_ssm * S_ssm
+                    match_level = MatchLevel.LEVEL_B
                 else:
-                """
-                w_th, w_cc = 0.5, 0.3
-                similarity_score = w_th * S_th + w_cc * S_cc
-                match_level = MatchLevel.LEVEL_C
+                    w_th, w_cc = 0.5, 0.3
+                    similarity_score = w_th * S_th + w_cc * S_cc
+                    match_level = MatchLevel.LEVEL_C
         else:
             could_compare_orb, similar_enough_orb, S_orb = compare_orb(
                 query, reference
@@ -201,20 +322,17 @@ def __compare_fingerprints__(
                 similarity_score = w_th * S_th + w_orb * S_orb
                 match_level = MatchLevel.LEVEL_D
             else:
-                """
-                TODO: Add back once SSM is supported
-                could_compare_ssm, similar_enough_ssm, S_ssm = compare_ssm(
-                    query, reference
-                )  # noqa: E501
+                could_compare_ssm, similar_enough_ssm, S_ssm = compare_audio()
+
                 if could_compare_ssm and similar_enough_ssm:
+                    # Level E, grayscale video but the audio matched
                     w_th, w_ssm = 0.5, 0.2
-                    similarity = w_th * S_th + w_ssm * S_ssm
-                    return (MatchLevel.LEVEL_E, similarity)
+                    similarity_score = w_th * S_th + w_ssm * S_ssm
+                    match_level = MatchLevel.LEVEL_E
                 else:
-                """
-                w_th = 0.5  # TODO: What should the weight here be?
-                similarity_score = w_th * S_th
-                match_level = MatchLevel.LEVEL_F
+                    w_th = 0.5  # TODO: What should the weight here be?
+                    similarity_score = w_th * S_th
+                    match_level = MatchLevel.LEVEL_F
     else:
         # Thumbnails too dissimilar to continue comparing
         similarity_score = 0
@@ -247,11 +365,42 @@ class FingerprintComparison:
     could_compare_orb: bool
     similar_enough_orb: bool
 
+    # The number of segments the compared fingerprints represent, see
+    # FingerprintCollection.run_length and expand
+    query_run_length: int = 1
+    reference_run_length: int = 1
+
+    def expand(self) -> Iterator['FingerprintComparison']:
+        """
+        The comparison of every pair of segments represented by the compared
+        fingerprints, which are all equal to this one but for the segments
+
+        >>> c = FingerprintComparison(
+        ...     'q.mp4', 'r.mp4', 4, 0, MatchLevel.LEVEL_A, 1.0,
+        ...     True, True, True, True, True, 2, 1)
+        >>> [(e.query_segment_id, e.reference_segment_id) for e in c.expand()]
+        [(4, 0), (5, 0)]
+        """
+        for i in range(self.query_run_length):
+            for j in range(self.reference_run_length):
+                yield replace(
+                    self,
+                    query_segment_id=self.query_segment_id + i,
+                    reference_segment_id=self.reference_segment_id + j,
+                    query_run_length=1,
+                    reference_run_length=1,
+                )
+
     @staticmethod
     def compare(
-        query_fpc: FingerprintCollection, reference_fpc: FingerprintCollection
+        query_fpc: FingerprintCollection,
+        reference_fpc: FingerprintCollection,
+        compare_audio: Callable[[], Tuple[bool, bool, float]] = None,
+        compare_thumbnail: Callable[[], Tuple[bool, float]] = None,
     ) -> 'FingerprintComparison':
-        comparison = __compare_fingerprints__(query_fpc, reference_fpc)
+        comparison = __compare_fingerprints__(
+            query_fpc, reference_fpc, compare_audio, compare_thumbnail
+        )
 
         return FingerprintComparison(
             query_fpc.video_name,
@@ -265,13 +414,20 @@ class FingerprintComparison:
             comparison.similar_enough_cc,
             comparison.could_compare_orb,
             comparison.similar_enough_orb,
+            query_fpc.run_length,
+            reference_fpc.run_length,
         )
 
     @staticmethod
+    @profiled('compare')
     def compare_all(
         query_fps: List[FingerprintCollection],
         reference_fps: List[FingerprintCollection],
     ) -> Dict[int, List['FingerprintComparison']]:
+        # Uninformative segments, e.g. black frames, are not compared at all
+        query_fps = [fpc for fpc in query_fps if fpc.informative]
+        reference_fps = [fpc for fpc in reference_fps if fpc.informative]
+
         # Map from the segment id in the query video to a list of
         # tuples containing the reference segment id and the return
         # value of the fingerprint comparison
@@ -282,13 +438,38 @@ class FingerprintComparison:
         # sort by segment_id in the keys (0, 1, ...)
         all_comparisons = OrderedDict(sorted(all_comparisons.items()))
 
-        for query_fpc in query_fps:
-            for reference_fpc in reference_fps:
+        # The audio of all pairs is compared at once, which is far cheaper
+        # than comparing pair by pair, whether or not it is needed
+        with span('compare_ssm'):
+            audio_similarities = ssm_lookup(
+                similarity_matrix(
+                    [fpc.ssm for fpc in query_fps], [fpc.ssm for fpc in reference_fps]
+                )
+            )
+
+        # As are the thumbnails, coarse to fine, such that most dissimilar
+        # pairs are rejected without comparing their thumbnails in full
+        with span('compare_thumbnails'):
+            thumbnail_similarities = thumbnail_lookup(
+                pyramid.similarities(
+                    Pyramid.from_thumbnails([fpc.thumbnail for fpc in query_fps]),
+                    Pyramid.from_thumbnails([fpc.thumbnail for fpc in reference_fps]),
+                    THUMBNAIL_THRESHOLD,
+                )
+            )
+
+        for i, query_fpc in enumerate(query_fps):
+            for j, reference_fpc in enumerate(reference_fps):
                 logger.trace(
                     f'Comparing {query_fpc.video_name}:{query_fpc.segment_id} to {reference_fpc.video_name}:{reference_fpc.segment_id}'  # noqa: E501
                 )
 
-                comparison = FingerprintComparison.compare(query_fpc, reference_fpc)
+                comparison = FingerprintComparison.compare(
+                    query_fpc,
+                    reference_fpc,
+                    lambda: audio_similarities(i, j),
+                    lambda: thumbnail_similarities(i, j),
+                )
                 all_comparisons[query_fpc.segment_id].append(comparison)
 
         for segment_id, _ in all_comparisons.items():
@@ -305,6 +486,57 @@ class FingerprintComparison:
         return all_comparisons
 
 
+# The thumbnail similarity at, or above, which consecutive segments are
+# considered near-duplicates, see collapse_near_duplicates
+COLLAPSE_THRESHOLD = 0.98
+
+
+def collapse_near_duplicates(
+    fingerprints: List[FingerprintCollection],
+    similarity_threshold: float = COLLAPSE_THRESHOLD,
+) -> List[FingerprintCollection]:
+    """
+    Collapses every run of consecutive segments whose thumbnails are
+    near-duplicates of the first segment of the run, e.g. static titles,
+    black frames and long takes, into the fingerprints of that first
+    segment, the run_length of which is the number of segments of the run.
+    The fingerprints of the first segment, its audio included, then stand
+    for the entire run, which is what the comparisons of the run are
+    expanded from, see FingerprintComparison.expand.
+
+    The given fingerprints, which may have been collapsed already, are
+    left as they are.
+    """
+    collapsed: List[FingerprintCollection] = []
+
+    for fpc in sorted(fingerprints, key=lambda fpc: fpc.segment_id):
+        if len(collapsed) > 0:
+            representative = collapsed[-1]
+            a, b = representative.thumbnail.image, fpc.thumbnail.image
+
+            is_adjacent = (
+                representative.segment_id + representative.run_length
+                == fpc.segment_id
+            )
+            # Flat thumbnails, e.g. of black frames, have no correlation
+            is_duplicate = (
+                np.allclose(a, b)
+                or representative.thumbnail.similar_to(fpc.thumbnail)
+                >= similarity_threshold
+            )
+
+            if is_adjacent and is_duplicate:
+                collapsed[-1] = replace(
+                    representative,
+                    run_length=representative.run_length + fpc.run_length,
+                )
+                continue
+
+        collapsed.append(fpc)
+
+    return collapsed
+
+
 def segment_id_keyframe_fp_map_to_list(
     segment_id_to_keyframe_fp_map: Dict[int, Tuple[Keyframe, FingerprintCollection]]
 ) -> List[FingerprintCollection]:
@@ -343,31 +575,193 @@ def chunks(lst, chunk_size):
         yield lst[i : i + chunk_size]
 
 
+def detect_letterbox(
+    file_path: Path, root_output_directory: Path, duration: float = None
+) -> Tuple[slice, slice]:
+    """
+    The bounds within the letterbox of the video, see
+    keyframe.letterbox_bounds, detected from frames spread evenly over the
+    entire video. Every range of the video is hence cropped alike, whichever
+    range is extracted
+    """
+    if duration is None:
+        duration = ffmpeg.get_video_duration(file_path)
+
+    # The frames of concurrent extractions of the same video are kept apart
+    root_output_directory.mkdir(parents=True, exist_ok=True)
+    output_directory = Path(tempfile.mkdtemp(dir=root_output_directory))
+
+    try:
+        frame_paths = []
+
+        for i in range(LETTERBOX_SAMPLES):
+            timestamp = duration * (i + 0.5) / LETTERBOX_SAMPLES
+            frame_paths.extend(
+                ffmpeg.execute(
+                    f'ffmpeg -ss {timestamp:.3f} -i {file_path} -vframes 1'
+                    f' {output_directory}/letterbox{i:02}.png',
+                    output_directory,
+                )
+            )
+
+        return letterbox_bounds([util.imread(str(path)) for path in frame_paths])
+    finally:
+        shutil.rmtree(output_directory, ignore_errors=True)
+
+
 def extract_fingerprint_collection_with_keyframes(
-    file_path: Path, root_output_directory: Path
+    file_path: Path,
+    root_output_directory: Path,
+    start_segment_id: int = 0,
+    end_segment_id: int = None,
+    adaptive: bool = False,
+    letterbox: Tuple[slice, slice] = None,
 ) -> Dict[int, Tuple[Keyframe, FingerprintCollection]]:
+    """Extracts the fingerprints for the segments in the range
+    [start_segment_id, end_segment_id), by default the entire video.
+
+    If `adaptive`, the keyframes are sampled by sampling.sample, i.e. a
+    keyframe may cover several segments, and only the segments that start
+    a keyframe are present in the returned map.
+
+    The keyframes are cropped to the `letterbox` bounds, which are detected
+    from the video unless given, see detect_letterbox
+    """
     assert file_path.exists()
 
-    logger.info(f'Extracting fingerprints for {file_path.name}...')
-    downsamples = chunks(
-        downsample(file_path, root_output_directory / file_path.stem), 5
-    )
+    if letterbox is None:
+        with span('letterbox'):
+            letterbox = detect_letterbox(file_path, root_output_directory)
+
+    frames_per_segment = FPS * SEGMENT_LENGTH_IN_SECONDS
+    is_range = start_segment_id != 0 or end_segment_id is not None
+
+    if is_range:
+        output_directory = (
+            root_output_directory / file_path.stem / f'range{start_segment_id:09}'
+        )
+        start = start_segment_id * SEGMENT_LENGTH_IN_SECONDS
+        duration = (
+            (end_segment_id - start_segment_id) * SEGMENT_LENGTH_IN_SECONDS
+            if end_segment_id is not None
+            else None
+        )
+
+        logger.info(
+            f'Extracting fingerprints for {file_path.name}'
+            f' (segments {start_segment_id}..{end_segment_id})...'
+        )
+    else:
+        output_directory = root_output_directory / file_path.stem
+        start, duration = None, None
+
+        logger.info(f'Extracting fingerprints for {file_path.name}...')
+
+    with span('decode'):
+        all_frame_paths = downsample(file_path, output_directory, FPS, start, duration)
+
+    count('frames', len(all_frame_paths))
+    downsamples = chunks(all_frame_paths, frames_per_segment)
+
+    # The audio is decoded once for all segments, straight into memory
+    with span('audio'):
+        ssms = SSM.from_pcm(
+            decode_pcm(file_path, SAMPLE_RATE, start, duration), SAMPLE_RATE
+        )
 
     fps = {}
 
-    segment_id = 0
-    for frame_paths in downsamples:
-        if len(frame_paths) == 0:
-            # Happens on rare occasions sometimes for videos with a fractional length
-            # as the last segment might not contain any frames.
-            continue
+    # The frames are read segment by segment, as they are sampled
+    segments = (list(map(util.imread, frame_paths)) for frame_paths in downsamples)
+
+    if adaptive:
+        samples = sample(segments, start_segment_id)
+    else:
+        # Happens on rare occasions sometimes for videos with a fractional
+        # length as the last segment might not contain any frames.
+        samples = (
+            Sample(segment_id, 1, frames)
+            for segment_id, frames in enumerate(segments, start_segment_id)
+            if len(frames) > 0
+        )
+
+    for s in samples:
+        with span('keyframe'):
+            keyframe = Keyframe.from_frames(s.frames, letterbox)
+
+        fpc = FingerprintCollection.from_keyframe(
+            keyframe, file_path.name, s.segment_id
+        )
+        fpc.run_length = s.run_length
+
+        # The audio of a keyframe covering several segments is represented
+        # by that of its first segment
+        i = s.segment_id - start_segment_id
+        fpc.ssm = ssms[i] if i < len(ssms) else None
+        fps[s.segment_id] = (keyframe, fpc)
+        count('keyframes')
 
-        keyframe = Keyframe.from_frame_paths(frame_paths)
-        fpc = FingerprintCollection.from_keyframe(keyframe, file_path.name, segment_id)
-        fps[segment_id] = (keyframe, fpc)
+        if not fpc.informative:
+            count('uninformative')
 
-        segment_id += 1
+    if is_range:
+        # The frames are of no use once the keyframes are computed, and for
+        # long videos that are processed range by range they would otherwise
+        # accumulate to several GBs of images
+        shutil.rmtree(output_directory, ignore_errors=True)
 
     logger.info(f'Extracted fingerprints for {file_path.name}')
 
     return fps
+
+
+def extract_fingerprint_collection_in_ranges(
+    file_path: Path,
+    root_output_directory: Path,
+    segments_per_range: int = 60,
+    start_segment_id: int = 0,
+    end_segment_id: int = None,
+    adaptive: bool = False,
+    letterbox: Tuple[slice, slice] = None,
+) -> Iterator[Tuple[int, int, List[FingerprintCollection]]]:
+    """Extracts the fingerprints for the segments in the range
+    [start_segment_id, end_segment_id) of the given video, by default
+    the entire video, `segments_per_range` segments at a time.
+
+    After each range a tuple on the form (range start, range end,
+    fingerprints) is yielded so that the caller can persist the
+    fingerprints, i.e. checkpoint, before the next range is processed. An
+    interrupted extraction can then be resumed by passing the segment id
+    following the last persisted one as `start_segment_id`.
+
+    As every range is sampled separately, see `adaptive`, a keyframe never
+    covers segments of two ranges. The keyframes of all of the ranges are
+    cropped to the `letterbox` bounds, which are detected once unless given,
+    see detect_letterbox.
+    """
+    duration = ffmpeg.get_video_duration(file_path)
+
+    if end_segment_id is None:
+        end_segment_id = number_of_segments(duration)
+
+    if letterbox is None:
+        with span('letterbox'):
+            letterbox = detect_letterbox(file_path, root_output_directory, duration)
+
+    for range_start in range(start_segment_id, end_segment_id, segments_per_range):
+        range_end = min(range_start + segments_per_range, end_segment_id)
+
+        segment_id_to_keyframe_fp_map = extract_fingerprint_collection_with_keyframes(
+            file_path,
+            root_output_directory,
+            range_start,
+            range_end,
+            adaptive,
+            letterbox,
+        )
+
+        yield (
+            range_start,
+            range_end,
+            segment_id_keyframe_fp_map_to_list(segment_id_to_keyframe_fp_map),
+        )
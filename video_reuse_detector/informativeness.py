@@ -0,0 +1,50 @@
+"""
+Whether a keyframe holds enough information to be worth comparing.
+
+Black frames, fades and flat slates have thumbnails that correlate with
+nothing, degenerate color correlations (every pixel is gray), and few if
+any keypoints, yet they would otherwise be compared to every segment of
+every other video, and match the black frames of all of them. Such
+keyframes are tagged as uninformative when they are fingerprinted, see
+FingerprintCollection.informative, and skipped by the comparisons.
+"""
+import numpy as np
+
+from video_reuse_detector import image_transformation
+
+
+# Of the intensities of the grayscale keyframe, in [0, 255]. Below it the
+# keyframe is considered flat, e.g. a black frame or the darkest part of a
+# fade
+MIN_STANDARD_DEVIATION = 8.0
+
+# Of the histogram of the intensities of the grayscale keyframe, in bits.
+# Keyframes with fewer distinct intensities, e.g. plain text on a flat
+# background, are informative only if they have enough keypoints
+MIN_ENTROPY = 3.0
+MIN_KEYPOINTS = 20
+
+
+def entropy(grayscale: np.ndarray) -> float:
+    """
+    The entropy of the histogram of the intensities of the image, in bits
+
+    >>> entropy(np.array([[0, 0], [255, 255]], dtype=np.uint8))
+    1.0
+    """
+    histogram = np.bincount(grayscale.ravel(), minlength=256)
+    p = histogram[histogram > 0] / grayscale.size
+
+    return float(-np.sum(p * np.log2(p)))
+
+
+def is_informative(image: np.ndarray, number_of_keypoints: int) -> bool:
+    grayscale = image_transformation.grayscale(image) if image.ndim == 3 else image
+
+    if np.std(grayscale) < MIN_STANDARD_DEVIATION:
+        return False
+
+    return (
+        entropy(grayscale.astype(np.uint8)) >= MIN_ENTROPY
+        or number_of_keypoints >= MIN_KEYPOINTS
+    )
@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import List, Tuple
 
 import numpy as np
 from loguru import logger
@@ -17,6 +17,68 @@ def average_frames(frames: List[np.ndarray]) -> np.ndarray:
     return image_transformation.average(frames)
 
 
+# The highest intensity of a row, or column, of a letterbox (or pillarbox)
+# bar
+LETTERBOX_THRESHOLD = 24
+
+# The least share of the height, and width, of a frame that is kept when the
+# bars are cropped. Dark bands that would leave less are rather taken to be
+# part of a dark scene, e.g. around a line of text, and are not cropped
+MINIMUM_CROP_FRACTION = 0.5
+
+# The bounds of a frame that is not letterboxed
+NO_LETTERBOX = (slice(None), slice(None))
+
+
+def __bar_bounds__(is_dark: np.ndarray) -> slice:
+    """
+    The rows (or columns) between the dark runs at the edges, unless they
+    leave less than MINIMUM_CROP_FRACTION of them
+
+    >>> __bar_bounds__(np.array([True, False, True, False, True]))
+    slice(1, 4, None)
+    >>> __bar_bounds__(np.array([True, True, False, True, True]))
+    slice(None, None, None)
+    """
+    lit = np.flatnonzero(~is_dark)
+
+    if len(lit) == 0 or lit[-1] + 1 - lit[0] < MINIMUM_CROP_FRACTION * len(is_dark):
+        return slice(None)
+
+    return slice(int(lit[0]), int(lit[-1]) + 1)
+
+
+def letterbox_bounds(frames: List[np.ndarray]) -> Tuple[slice, slice]:
+    """
+    The rows and columns within the letterbox (or pillarbox) bars of the
+    frames, all of the same video. A bar is a band of rows, or columns, at
+    an edge that is dark across the full width, or height, of every frame,
+    so a dark frame of a single scene is no evidence of bars by itself
+
+    >>> frame = np.zeros((6, 4, 3), dtype=np.uint8)
+    >>> frame[1:5] = 128
+    >>> letterbox_bounds([frame])
+    (slice(1, 5, None), slice(0, 4, None))
+    """
+    if len(frames) == 0:
+        return NO_LETTERBOX
+
+    brightest = np.max(
+        [frame.max(axis=2) if frame.ndim == 3 else frame for frame in frames],
+        axis=0,
+    )
+
+    return (
+        __bar_bounds__(brightest.max(axis=1) <= LETTERBOX_THRESHOLD),
+        __bar_bounds__(brightest.max(axis=0) <= LETTERBOX_THRESHOLD),
+    )
+
+
+def crop_letterbox(image: np.ndarray, bounds: Tuple[slice, slice]) -> np.ndarray:
+    rows, columns = bounds
+    return image[rows, columns]
+
+
 def crop_with_central_alignment(image: np.ndarray, m: int, n: int):
     """
     Crops the given image to a (M x N) area with central alignment
@@ -35,13 +97,24 @@ class Keyframe:
     height = 320
 
     @staticmethod
-    def from_frame_paths(frame_paths: List[Path]) -> 'Keyframe':
+    def from_frame_paths(
+        frame_paths: List[Path], letterbox: Tuple[slice, slice] = NO_LETTERBOX
+    ) -> 'Keyframe':
         frames = list(map(util.imread, list(map(str, frame_paths))))
-        return Keyframe.from_frames(frames)
+        return Keyframe.from_frames(frames, letterbox)
 
     @staticmethod
-    def from_frames(frames: List[np.ndarray]) -> 'Keyframe':
+    def from_frames(
+        frames: List[np.ndarray], letterbox: Tuple[slice, slice] = NO_LETTERBOX
+    ) -> 'Keyframe':
+        """
+        Averages the frames into a keyframe, within the `letterbox` bounds of
+        the video, see letterbox_bounds
+        """
         kf = average_frames(frames)
+        # The bars would otherwise be part of the (central) crop of videos
+        # that are letterboxed, but not of other versions of them
+        kf = crop_letterbox(kf, letterbox)
         kf = image_transformation.scale(kf, scale_factor=1.2)
 
         height, width, _ = kf.shape
@@ -75,7 +148,7 @@ if __name__ == "__main__":
 
     logger.debug(f'Reading {args.input_frames} as images')
     frames = list(map(util.imread, args.input_frames))
-    keyframe = Keyframe.from_frames(frames)
+    keyframe = Keyframe.from_frames(frames, letterbox_bounds(frames))
 
     frame_paths = list(map(Path, args.input_frames))
 
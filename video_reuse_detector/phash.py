@@ -0,0 +1,91 @@
+"""
+A 64-bit perceptual hash of a keyframe.
+
+The keyframe is reduced to a SIZE x SIZE grayscale image that is folded
+like the thumbnail, see image_transformation.fold, rather than taken from
+the thumbnail itself, which only holds the averages of 4 x 4 blocks. The
+hash holds whether each of the lowest 64 frequencies of the discrete
+cosine transform (DCT) of that image is above their median, which is
+robust to small changes of brightness, contrast and compression. As the
+folded image is symmetric its odd horizontal frequencies are zero, so only
+the even ones are used, and the hash is invariant to horizontal flips.
+
+Near-duplicate keyframes have hashes that differ in a few bits. A hash is
+split into CHUNKS chunks that are indexed separately, and by the
+pigeonhole principle two hashes within a Hamming distance of less than
+CHUNKS share at least one chunk exactly. Looking up the near-duplicates of
+a hash is thus an exact lookup of each of its chunks, see chunks.
+"""
+from typing import List
+
+import cv2
+import numpy as np
+
+from video_reuse_detector import image_transformation
+
+
+SIZE = 32
+BITS = 64
+CHUNKS = 4
+CHUNK_BITS = BITS // CHUNKS
+
+# The highest Hamming distance of two hashes of near-duplicates, which has
+# to be less than CHUNKS for the chunks to find all of them
+RADIUS = CHUNKS - 1
+
+# The DCT coefficients that make up the hash, 8 rows by the 8 lowest even
+# columns
+__ROWS__ = 8
+__COLUMNS__ = slice(0, 16, 2)
+
+
+def from_image(image: np.ndarray) -> int:
+    """
+    The hash of the image, as a signed 64-bit integer so that it fits a
+    BIGINT column
+    """
+    grayscale = image_transformation.grayscale(image) if image.ndim == 3 else image
+    small = cv2.resize(grayscale, (SIZE, SIZE), interpolation=cv2.INTER_AREA)
+    folded = image_transformation.fold(small.astype(np.float64))
+
+    coefficients = cv2.dct(folded)[:__ROWS__, __COLUMNS__]
+    values = coefficients.ravel()
+
+    # The DC component, i.e. the average, carries no information about the
+    # structure of the image
+    bits = values > np.median(values[1:])
+
+    unsigned = int(np.packbits(bits).view('>u8')[0])
+
+    return to_signed(unsigned)
+
+
+def to_signed(unsigned: int) -> int:
+    """
+    >>> to_signed(2 ** 64 - 1)
+    -1
+    """
+    return unsigned - (1 << BITS) if unsigned >= 1 << (BITS - 1) else unsigned
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """
+    >>> hamming_distance(-1, 0)
+    64
+    """
+    return bin((a ^ b) & ((1 << BITS) - 1)).count('1')
+
+
+def chunks(h: int) -> List[int]:
+    """
+    The CHUNKS chunks of the hash, most significant first
+
+    >>> chunks(0x0001000200030004)
+    [1, 2, 3, 4]
+    """
+    unsigned = h & ((1 << BITS) - 1)
+    mask = (1 << CHUNK_BITS) - 1
+
+    return [
+        (unsigned >> (CHUNK_BITS * (CHUNKS - 1 - i))) & mask for i in range(CHUNKS)
+    ]
@@ -1,11 +1,273 @@
+"""
+Instrumentation of the stages of the pipeline.
+
+Code that is worth measuring is wrapped in a named span,
+
+    with profiling.span('orb'):
+        orb = ORB.from_image(keyframe.image)
+
+or decorated with @profiled('orb'). Spans are only measured while a
+profile is being collected, e.g. for the duration of a job,
+
+    with profiling.collect() as profile:
+        extract(...)
+
+    profile.summary()  # {'orb': {'count': 60, 'total': 0.4, ...}, ...}
+
+and are otherwise a lookup and two no-op method calls, cheap enough to
+leave in the innermost loops. The durations of a span are aggregated
+into a histogram with fixed, logarithmic buckets, so that a profile
+takes the same amount of memory no matter how often a span is entered,
+and so that profiles from different jobs can be merged.
+
+Besides spans, a profile counts things, e.g. the number of decoded frames,
+see count.
+"""
+import bisect
+import math
+import resource
 import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Iterator, List
 
 from decorator import decorator
 from loguru import logger
 
 
+# The upper bounds (in seconds) of the histogram buckets, from a microsecond
+# to about 2 minutes. The last bucket is unbounded
+BUCKET_BOUNDS = [1e-6 * 2 ** i for i in range(28)]
+
+
+class Histogram:
+    def __init__(self, counts: List[int] = None, total: float = 0.0):
+        self.counts = counts if counts is not None else [0] * (len(BUCKET_BOUNDS) + 1)
+        self.total = total
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, duration: float):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, duration)] += 1
+        self.total += duration
+
+    def merge(self, other: 'Histogram'):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates the q-quantile by interpolating linearly within the bucket
+        it falls in, as Prometheus does
+
+        >>> h = Histogram()
+        >>> for duration in [0.001, 0.002, 0.003, 0.004]:
+        ...     h.observe(duration)
+        >>> 0.001 < h.quantile(0.5) <= 0.002048
+        True
+        """
+        count = self.count
+
+        if count == 0:
+            return 0.0
+
+        rank = q * count
+        cumulative = 0
+
+        for i, n in enumerate(self.counts):
+            if n > 0 and cumulative + n >= rank:
+                lower = BUCKET_BOUNDS[i - 1] if i > 0 else 0.0
+                upper = BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else lower * 2
+
+                return lower + (upper - lower) * (rank - cumulative) / n
+
+            cumulative += n
+
+        return BUCKET_BOUNDS[-1]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'total': self.total,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+        }
+
+
+class Span:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Profile:
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.elapsed = 0.0
+
+    def span(self, name: str) -> Span:
+        histogram = self.histograms.get(name)
+
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+
+        return Span(histogram)
+
+    def merge(self, other: 'Profile'):
+        for name, histogram in other.histograms.items():
+            self.histograms.setdefault(name, Histogram()).merge(histogram)
+
+        for name, n in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + n
+
+        self.elapsed += other.elapsed
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {name: h.summary() for name, h in sorted(self.histograms.items())}
+
+    def to_dict(self) -> Dict:
+        return {
+            'elapsed': self.elapsed,
+            'counters': self.counters,
+            'histograms': {
+                name: {'counts': h.counts, 'total': h.total}
+                for name, h in self.histograms.items()
+            },
+        }
+
+    @staticmethod
+    def from_dict(d: Dict) -> 'Profile':
+        profile = Profile()
+        profile.elapsed = d['elapsed']
+        profile.counters = dict(d.get('counters', {}))
+        profile.histograms = {
+            name: Histogram(h['counts'], h['total'])
+            for name, h in d['histograms'].items()
+        }
+
+        return profile
+
+
+# The Profile being collected, if any
+__profile__ = ContextVar('profile', default=None)
+
+
+def span(name: str):
+    profile = __profile__.get()
+
+    if profile is None:
+        return NULL_SPAN
+
+    return profile.span(name)
+
+
+def count(name: str, n: int = 1):
+    """Adds n to the named counter of the profile being collected, if any"""
+    profile = __profile__.get()
+
+    if profile is not None:
+        profile.counters[name] = profile.counters.get(name, 0) + n
+
+
+def profiled(name: str):
+    """Measures every call of the decorated function as a span"""
+
+    def wrap(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return wrap
+
+
+@contextmanager
+def collect(enabled: bool = True, profile: Profile = None) -> Iterator[Profile]:
+    """
+    Collects the spans entered within the block into a new profile, or
+    continues collecting into the given one. The elapsed (wall) time of the
+    block is measured either way, but if not `enabled` no spans are.
+    """
+    if profile is None:
+        profile = Profile()
+
+    token = __profile__.set(profile if enabled else None)
+    start = time.perf_counter()
+
+    try:
+        yield profile
+    finally:
+        profile.elapsed += time.perf_counter() - start
+        __profile__.reset(token)
+
+
+def to_prometheus(histograms: Dict[str, Histogram], metric: str) -> str:
+    """
+    Renders the histograms in the Prometheus text format, as a single
+    metric with the name of each span as the "stage" label
+
+    >>> h = Histogram()
+    >>> h.observe(0.5)
+    >>> print(to_prometheus({'orb': h}, 'stage_seconds').splitlines()[-2])
+    stage_seconds_sum{stage="orb"} 0.5
+    """
+    lines = [f'# TYPE {metric} histogram']
+
+    for name, histogram in sorted(histograms.items()):
+        cumulative = 0
+
+        for bound, n in zip(BUCKET_BOUNDS + [math.inf], histogram.counts):
+            cumulative += n
+            le = '+Inf' if bound == math.inf else f'{bound:g}'
+            lines.append(f'{metric}_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+
+        lines.append(f'{metric}_sum{{stage="{name}"}} {histogram.total:g}')
+        lines.append(f'{metric}_count{{stage="{name}"}} {cumulative}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def peak_memory_usage() -> int:
+    """The peak resident set size of the current process, in bytes"""
+    # ru_maxrss is expressed in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
 @decorator
 def timeit(func, *args, **kwargs):
+    """
+    Returns the result of the decorated function along with its execution
+    time, i.e. as a tuple (result, time). Meant for ad-hoc benchmarks, see
+    the notebooks, code that is run as part of the pipeline uses spans
+    """
     start = time.time()
     result = func(*args, **kwargs)
     end = time.time()
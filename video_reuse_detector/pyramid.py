@@ -0,0 +1,141 @@
+"""
+Coarse-to-fine comparison of thumbnails.
+
+The similarity of two thumbnails is the normalized cross correlation (NCC)
+of their centered pixels, i.e. the dot product of the unit vectors a and b
+of the two. Averaging a thumbnail over the blocks of a coarse grid splits
+its vector into a coarse part a_c, which is constant within every block,
+and a residual a_r that is orthogonal to it, such that
+
+    a . b = a_c . b_c + a_r . b_r <= a_c . b_c + |a_r| |b_r|
+
+by the Cauchy-Schwarz inequality. The right-hand side, which only takes
+the block averages and the norm of the residual, is an upper bound of the
+similarity, so a pair of thumbnails whose bound is below the similarity
+threshold can be rejected without looking at the full resolution.
+
+The thumbnails are compared at every level of the pyramid, coarsest first,
+each pruning the pairs that the next, more expensive, level has to look
+at. The coarsest level is a single matrix product of contiguous, compact
+arrays for all pairs at once.
+"""
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+from video_reuse_detector.similarity import EPSILON
+from video_reuse_detector.thumbnail import Thumbnail
+
+
+# The side of the thumbnails, see Thumbnail.from_image
+SIZE = 30
+
+# The grids the thumbnails are averaged over, coarsest first, each of which
+# has to divide SIZE
+LEVELS = (6, 15)
+
+# Accounts for the rounding errors of the single precision coarse levels,
+# so that the bounds stay conservative
+SLACK = 1e-4
+
+
+def block_averages(images: np.ndarray, grid: int) -> np.ndarray:
+    """
+    The averages of the (SIZE / grid)^2 blocks of the images, as vectors
+
+    >>> block_averages(np.arange(16.0).reshape(1, 4, 4), 2)
+    array([[ 2.5,  4.5, 10.5, 12.5]])
+    """
+    n, size, _ = images.shape
+    block = size // grid
+
+    return (
+        images.reshape(n, grid, block, grid, block).mean(axis=(2, 4)).reshape(n, -1)
+    )
+
+
+@dataclass
+class Level:
+    # The coarse parts of the unit vectors of the thumbnails, scaled such
+    # that their dot products equal those of the parts at full resolution
+    coarse: np.ndarray
+    # The norms of the residuals of the unit vectors
+    residuals: np.ndarray
+
+
+@dataclass
+class Pyramid:
+    levels: List[Level]
+    # The unit vectors of the thumbnails, zero for flat thumbnails which
+    # correlate with nothing, see similarity.normalized_crossed_correlation
+    vectors: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @staticmethod
+    def from_thumbnails(thumbnails: List[Thumbnail]) -> 'Pyramid':
+        if len(thumbnails) == 0:
+            images = np.zeros((0, SIZE, SIZE))
+        else:
+            images = np.array([t.image for t in thumbnails], dtype=np.float64)
+
+        n = len(images)
+        centered = images - images.mean(axis=(1, 2), keepdims=True)
+        norms = np.sqrt(np.sum(centered ** 2, axis=(1, 2)))
+        is_flat = norms < EPSILON
+
+        units = centered / np.where(is_flat, 1.0, norms)[:, None, None]
+        units[is_flat] = 0.0
+
+        levels = []
+
+        for grid in LEVELS:
+            block = SIZE // grid
+            # Each average stands for block^2 pixels
+            coarse = block_averages(units, grid) * block
+            residuals = np.sqrt(np.clip(1.0 - np.sum(coarse ** 2, axis=1), 0.0, None))
+            residuals[is_flat] = 0.0
+
+            levels.append(
+                Level(
+                    np.ascontiguousarray(coarse, dtype=np.float32),
+                    residuals.astype(np.float32),
+                )
+            )
+
+        return Pyramid(levels, units.reshape(n, -1))
+
+
+def similarities(query: Pyramid, reference: Pyramid, threshold: float) -> np.ndarray:
+    """
+    The similarities between all query and reference thumbnails that are at
+    least `threshold`, or might be, and NaN for the pairs that are rejected
+    by a coarse level of the pyramid, i.e. that are known to be less
+    similar than `threshold`
+    """
+    result = np.full((len(query), len(reference)), np.nan)
+
+    if result.size == 0:
+        return result
+
+    # All pairs at the coarsest level
+    coarsest_q, coarsest_r = query.levels[0], reference.levels[0]
+    bounds = coarsest_q.coarse @ coarsest_r.coarse.T + np.outer(
+        coarsest_q.residuals, coarsest_r.residuals
+    )
+    i, j = np.nonzero(bounds >= threshold - SLACK)
+
+    # Only the remaining pairs at the finer levels
+    for level_q, level_r in zip(query.levels[1:], reference.levels[1:]):
+        bounds = (
+            np.einsum('ij,ij->i', level_q.coarse[i], level_r.coarse[j])
+            + level_q.residuals[i] * level_r.residuals[j]
+        )
+        keep = bounds >= threshold - SLACK
+        i, j = i[keep], j[keep]
+
+    result[i, j] = np.einsum('ij,ij->i', query.vectors[i], reference.vectors[j])
+
+    return result
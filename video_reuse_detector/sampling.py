@@ -0,0 +1,138 @@
+"""
+Adaptive keyframe sampling.
+
+By default every FPS consecutive frames, i.e. every second, of a video are
+averaged into a keyframe, see fingerprint.py. The adaptive sampler instead
+follows the content of the video, using cheap statistics of the
+differences between consecutive frames,
+
+- a shot boundary (cut) within a second is never averaged over, the
+  keyframe of the second is averaged from the longest shot within it, and
+- a low-motion span, e.g. a static title or a long take, is represented by
+  the keyframe of its first second, the run length of which is the number
+  of seconds (segments) the span covers.
+
+The frames are compared at the resolution of a TINY_SIZE grayscale
+thumbnail, which makes the statistics noise tolerant and a negligible
+cost next to decoding the frames.
+"""
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+from video_reuse_detector import image_transformation
+
+
+TINY_SIZE = (32, 32)
+
+# The mean absolute difference between two tiny frames (with intensities in
+# [0, 1]) above which they are considered to be of different shots
+CUT_THRESHOLD = 0.2
+
+# The mean absolute difference between two tiny frames below which there is
+# considered to be no (significant) motion between them
+STATIC_THRESHOLD = 0.02
+
+# The most segments a low-motion span covers, so that fingerprints are
+# still spread over a long static video
+MAX_RUN_LENGTH = 30
+
+
+@dataclass
+class Sample:
+    segment_id: int
+    # The number of consecutive segments, starting at segment_id, that are
+    # represented by the sample
+    run_length: int
+    # The frames that the keyframe of the sample is averaged from
+    frames: List[np.ndarray]
+
+
+def tiny(frame: np.ndarray) -> np.ndarray:
+    gray = image_transformation.grayscale(frame) if frame.ndim == 3 else frame
+    resized = cv2.resize(gray, TINY_SIZE, interpolation=cv2.INTER_AREA)
+
+    return resized.astype(np.float32) / 255
+
+
+def difference(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    The mean absolute difference between two tiny frames
+
+    >>> difference(np.zeros((2, 2)), np.full((2, 2), 0.5))
+    0.5
+    """
+    return float(np.mean(np.abs(a - b)))
+
+
+def longest_shot(differences: List[float]) -> slice:
+    """
+    The frames of the longest run without a cut, given the differences
+    between every pair of consecutive frames, the earliest on ties
+
+    >>> longest_shot([0.0, 0.5, 0.0, 0.0])
+    slice(2, 5, None)
+
+    >>> longest_shot([0.0, 0.0])
+    slice(0, 3, None)
+    """
+    cuts = [i + 1 for i, d in enumerate(differences) if d > CUT_THRESHOLD]
+    bounds = [0] + cuts + [len(differences) + 1]
+
+    start, end = max(zip(bounds, bounds[1:]), key=lambda b: b[1] - b[0])
+
+    return slice(start, end)
+
+
+def sample(
+    segments: Iterable[List[np.ndarray]], start_segment_id: int = 0
+) -> Iterator[Sample]:
+    """
+    Samples the given segments, each a list of (consecutive) frames, see
+    the module docstring. Only the frames of the current segment, and of
+    the sample being extended, are held in memory
+    """
+    current: Optional[Sample] = None
+    # The tiny version of the first frame of the current sample, which every
+    # following segment is compared to, so that slow but steady motion
+    # still ends a low-motion span
+    representative = None
+    previous = None
+
+    for segment_id, frames in enumerate(segments, start_segment_id):
+        if len(frames) == 0:
+            continue
+
+        tinies = [tiny(frame) for frame in frames]
+        differences = [difference(a, b) for a, b in zip(tinies, tinies[1:])]
+
+        # Whether the segment starts a new shot
+        is_cut = (
+            previous is not None and difference(previous, tinies[0]) > CUT_THRESHOLD
+        )
+        previous = tinies[-1]
+
+        is_static = (
+            current is not None
+            and not is_cut
+            and all(d <= STATIC_THRESHOLD for d in differences)
+            and difference(representative, tinies[-1]) <= STATIC_THRESHOLD
+            and current.segment_id + current.run_length == segment_id
+            and current.run_length < MAX_RUN_LENGTH
+        )
+
+        if is_static:
+            current.run_length += 1
+            continue
+
+        if current is not None:
+            yield current
+
+        shot = longest_shot(differences)
+        current = Sample(segment_id, 1, frames[shot])
+        representative = tinies[shot.start]
+
+    if current is not None:
+        yield current
@@ -1,6 +1,9 @@
 import numpy as np
 
 
+EPSILON = 1e-12
+
+
 def hamming_distance(n1: int, n2: int) -> float:
     return bin(n1 ^ n2).count('1') / 32.0
 
@@ -11,6 +14,11 @@ def normalized_crossed_correlation(qFp: np.ndarray, rFp: np.ndarray) -> float:
     dividend = np.sum(left * right)
     divisor = np.sqrt(np.sum(left ** 2) * np.sum(right ** 2))
 
+    # Flat images, e.g. black frames, correlate with nothing, not even each
+    # other, rather than dividing by (nearly) zero
+    if divisor < EPSILON:
+        return 0.0
+
     correlation = dividend / divisor
 
     return correlation
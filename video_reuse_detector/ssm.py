@@ -0,0 +1,155 @@
+"""
+The audio fingerprint of a segment, based on a self-similarity matrix
+(SSM).
+
+The audio of a segment is split into FRAMES_PER_SEGMENT short frames, and
+the spectrum of every frame is pooled into BANDS logarithmically spaced
+frequency bands. The SSM holds the (cosine) similarity between the band
+energies of every pair of frames, i.e. how the sound of the segment
+evolves, which is unaffected by the volume and largely by the equalization
+of the audio. As the SSM of two different, but steady, sounds are alike,
+the fingerprint also holds the spectral envelope, i.e. the band energies
+averaged over the frames.
+
+All segments of a video are computed at once, from the PCM audio of the
+entire video (or range), see extract_audio.decode_pcm, and compared at
+once, see similarity_matrix.
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+
+SAMPLE_RATE = 8000
+FRAMES_PER_SEGMENT = 16
+BANDS = 16
+LOWEST_FREQUENCY = 100
+
+# Segments with a lower root mean square amplitude (of samples in [-1, 1])
+# are considered silent, and have no fingerprint
+SILENCE_THRESHOLD = 1e-3
+
+# The upper triangle of the SSM, excluding the diagonal, and the envelope
+__TRIANGLE__ = np.triu_indices(FRAMES_PER_SEGMENT, k=1)
+SIZE = len(__TRIANGLE__[0]) + BANDS
+
+# The components are stored as signed bytes
+__SCALE__ = 127
+
+
+def __band_matrix__(frame_length: int, sample_rate: int) -> np.ndarray:
+    """
+    A (frequency bins x BANDS) matrix that sums the power of the bins of a
+    spectrum into logarithmically spaced bands
+    """
+    frequencies = np.fft.rfftfreq(frame_length, d=1.0 / sample_rate)
+    edges = np.geomspace(LOWEST_FREQUENCY, sample_rate / 2, BANDS + 1)
+    band_of_bin = np.digitize(frequencies, edges) - 1
+
+    matrix = np.zeros((len(frequencies), BANDS), dtype=np.float32)
+    in_range = (band_of_bin >= 0) & (band_of_bin < BANDS)
+    matrix[np.flatnonzero(in_range), band_of_bin[in_range]] = 1.0
+
+    return matrix
+
+
+def __normalize__(x: np.ndarray) -> np.ndarray:
+    """Zero mean and unit length along the last axis"""
+    centered = x - x.mean(axis=-1, keepdims=True)
+    norm = np.linalg.norm(centered, axis=-1, keepdims=True)
+
+    return np.divide(centered, norm, out=np.zeros_like(centered), where=norm > 0)
+
+
+@dataclass
+class SSM:
+    # The upper triangle of the SSM followed by the spectral envelope, both
+    # normalized, and scaled by sqrt(0.5), such that the dot product of two
+    # vectors is the mean of the similarities of the two parts
+    vector: np.ndarray
+
+    @staticmethod
+    def from_pcm(
+        samples: np.ndarray, sample_rate: int = SAMPLE_RATE
+    ) -> List[Optional['SSM']]:
+        """
+        The fingerprints of every segment (second) of the given mono audio,
+        the last one padded with silence, where silent segments have none
+        """
+        segment_length = sample_rate
+        frame_length = segment_length // FRAMES_PER_SEGMENT
+
+        number_of_segments = -(-len(samples) // segment_length)
+
+        if number_of_segments == 0:
+            return []
+
+        padded = np.zeros(number_of_segments * segment_length, dtype=np.float32)
+        padded[: len(samples)] = samples
+
+        # (segments, frames, samples per frame), any remainder of the frames
+        # is dropped
+        frames = padded.reshape(number_of_segments, segment_length)[
+            :, : FRAMES_PER_SEGMENT * frame_length
+        ].reshape(number_of_segments, FRAMES_PER_SEGMENT, frame_length)
+
+        window = np.hanning(frame_length).astype(np.float32)
+        power = np.abs(np.fft.rfft(frames * window, axis=-1)) ** 2
+        energies = np.log1p(power @ __band_matrix__(frame_length, sample_rate))
+
+        # (segments, frames, frames)
+        rows = __normalize__(energies)
+        ssms = rows @ rows.transpose(0, 2, 1)
+
+        vectors = np.concatenate(
+            [
+                __normalize__(ssms[:, __TRIANGLE__[0], __TRIANGLE__[1]]),
+                __normalize__(energies.mean(axis=1)),
+            ],
+            axis=1,
+        ) * np.sqrt(0.5)
+
+        rms = np.sqrt(np.mean(padded.reshape(number_of_segments, -1) ** 2, axis=1))
+
+        return [
+            SSM(vector) if loudness >= SILENCE_THRESHOLD else None
+            for vector, loudness in zip(vectors.astype(np.float32), rms)
+        ]
+
+    def to_bytes(self) -> bytes:
+        return np.round(self.vector * __SCALE__).astype(np.int8).tobytes()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> 'SSM':
+        vector = np.frombuffer(data, dtype=np.int8).astype(np.float32) / __SCALE__
+        return SSM(vector)
+
+    def similar_to(self, other: 'SSM') -> float:
+        return float(np.clip(self.vector @ other.vector, -1.0, 1.0))
+
+
+def similarity_matrix(
+    query: List[Optional[SSM]], reference: List[Optional[SSM]]
+) -> np.ndarray:
+    """
+    The similarities between all query and reference fingerprints in a
+    single matrix product, NaN where either fingerprint is missing
+
+    >>> a, b = SSM(np.ones(2) / np.sqrt(2)), SSM(np.array([1.0, 0.0]))
+    >>> similarity_matrix([a, None], [a, b]).round(2)
+    array([[1.  , 0.71],
+           [ nan,  nan]])
+    """
+
+    def stack(ssms: List[Optional[SSM]]) -> np.ndarray:
+        if len(ssms) == 0:
+            return np.zeros((0, SIZE))
+
+        size = next((len(s.vector) for s in ssms if s is not None), SIZE)
+
+        return np.array(
+            [s.vector if s is not None else np.full(size, np.nan) for s in ssms]
+        )
+
+    return np.clip(stack(query) @ stack(reference).T, -1.0, 1.0)
@@ -0,0 +1,216 @@
+"""
+A vocabulary of visual words for ORB descriptors, i.e. a bag of visual
+words.
+
+The vocabulary is trained offline, on descriptors sampled from the
+archive, by binary k-majority clustering: every descriptor is assigned to
+the word (centroid) closest to it in Hamming distance, after which every
+bit of a word is set to the majority of that bit among its descriptors.
+The descriptors of a keyframe are then quantized into words, and the
+keyframe is represented by the frequencies of its words, which can be
+indexed in an inverted file and scored by tf-idf rather than matched
+descriptor by descriptor, see ORB.similar_to.
+"""
+import io
+import math
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterable, List, Mapping, Tuple
+
+import numpy as np
+from loguru import logger
+
+
+# The size of an ORB descriptor, in bytes and bits
+DESCRIPTOR_BYTES = 32
+DESCRIPTOR_BITS = DESCRIPTOR_BYTES * 8
+
+# Descriptors assigned to words at a time, which bounds the memory of the
+# (descriptors x words) distance matrix
+BATCH_SIZE = 4096
+
+
+def __signs__(descriptors: np.ndarray) -> np.ndarray:
+    """The bits of the descriptors as -1 and 1, one row per descriptor"""
+    bits = np.unpackbits(descriptors.astype(np.uint8), axis=1)
+    return bits.astype(np.float32) * 2 - 1
+
+
+def hamming_distances(descriptors: np.ndarray, words: np.ndarray) -> np.ndarray:
+    """
+    The Hamming distances between all descriptors and words
+
+    >>> a = np.zeros((1, DESCRIPTOR_BYTES), dtype=np.uint8)
+    >>> b = np.full((2, DESCRIPTOR_BYTES), [[0], [1]], dtype=np.uint8)
+    >>> hamming_distances(a, b)
+    array([[ 0, 32]])
+    """
+    return __distances__(__signs__(descriptors), __signs__(words))
+
+
+def __distances__(descriptor_signs: np.ndarray, word_signs: np.ndarray) -> np.ndarray:
+    # A single matrix product of the bits as signs, as the dot product of
+    # two descriptors is the number of equal bits less the number of
+    # different ones
+    products = descriptor_signs @ word_signs.T
+    return np.rint((DESCRIPTOR_BITS - products) / 2).astype(np.int64)
+
+
+def nearest_words(descriptors: np.ndarray, words: np.ndarray) -> np.ndarray:
+    """The index of the word closest to each descriptor"""
+    word_signs = __signs__(words)
+
+    return np.concatenate(
+        [
+            __distances__(
+                __signs__(descriptors[i : i + BATCH_SIZE]), word_signs
+            ).argmin(axis=1)
+            for i in range(0, len(descriptors), BATCH_SIZE)
+        ]
+        or [np.zeros(0, dtype=np.int64)]
+    )
+
+
+def majorities(bits: np.ndarray, assignments: np.ndarray, number_of_words: int):
+    """
+    The majority of every bit among the descriptors assigned to each word,
+    and whether any descriptor is assigned to it
+
+    >>> bits = np.array([[1, 0], [1, 1], [0, 0]], dtype=np.uint8)
+    >>> majorities(bits, np.array([0, 0, 2]), 3)
+    (array([[ True,  True],
+           [False, False],
+           [False, False]]), array([ True, False,  True]))
+    """
+    sizes = np.bincount(assignments, minlength=number_of_words)
+    is_assigned = sizes > 0
+
+    # Summed word by word over the descriptors sorted by word
+    order = np.argsort(assignments, kind='stable')
+    starts = np.cumsum(sizes) - sizes
+    sums = np.add.reduceat(
+        bits[order].astype(np.int64), starts[is_assigned], axis=0
+    )
+
+    result = np.zeros((number_of_words, bits.shape[1]), dtype=bool)
+    result[is_assigned] = 2 * sums >= sizes[is_assigned, None]
+
+    return result, is_assigned
+
+
+@dataclass
+class Vocabulary:
+    # One word, i.e. a binary descriptor, per row
+    words: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    @staticmethod
+    def train(
+        descriptors: np.ndarray, number_of_words: int, iterations: int = 10, seed=0
+    ) -> 'Vocabulary':
+        """
+        Clusters the descriptors into (at most) the given number of words by
+        binary k-majority, starting from distinct descriptors picked at
+        random
+        """
+        descriptors = np.unique(descriptors.astype(np.uint8), axis=0)
+        number_of_words = min(number_of_words, len(descriptors))
+
+        rng = np.random.default_rng(seed)
+        words = descriptors[rng.choice(len(descriptors), number_of_words, False)]
+
+        bits = np.unpackbits(descriptors, axis=1)
+
+        for iteration in range(iterations):
+            assignments = nearest_words(descriptors, words)
+            majority, is_assigned = majorities(bits, assignments, number_of_words)
+
+            # A word without descriptors is left as it is
+            updated = words.copy()
+            updated[is_assigned] = np.packbits(majority[is_assigned], axis=1)
+
+            changed = int(np.count_nonzero(np.any(updated != words, axis=1)))
+            words = updated
+
+            logger.debug(f'Iteration {iteration}, {changed} words changed')
+
+            if changed == 0:
+                break
+
+        return Vocabulary(words)
+
+    def quantize(self, descriptors: np.ndarray) -> np.ndarray:
+        """The id of the word of each descriptor"""
+        if len(descriptors) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        return nearest_words(np.asarray(descriptors, dtype=np.uint8), self.words)
+
+    def bag_of_words(self, descriptors: np.ndarray) -> Dict[int, float]:
+        """
+        The term frequency of every word of the descriptors, i.e. its share
+        of the descriptors
+        """
+        return term_frequencies(self.quantize(descriptors).tolist())
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.save(buffer, self.words)
+        return buffer.getvalue()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> 'Vocabulary':
+        return Vocabulary(np.load(io.BytesIO(data)))
+
+
+def term_frequencies(word_ids: List[int]) -> Dict[int, float]:
+    """
+    >>> term_frequencies([3, 3, 7, 1])
+    {3: 0.5, 7: 0.25, 1: 0.25}
+    """
+    counts = Counter(word_ids)
+    return {word_id: n / len(word_ids) for word_id, n in counts.items()}
+
+
+def inverse_document_frequency(document_frequency: int, documents: int) -> float:
+    """
+    >>> inverse_document_frequency(10, 10)
+    0.0
+    """
+    return math.log(documents / document_frequency) if document_frequency > 0 else 0.0
+
+
+def tf_idf_scores(
+    query_bags: Mapping[int, Mapping[int, float]],
+    postings: Iterable[Tuple[Hashable, int, float]],
+    idfs: Mapping[int, float],
+) -> Dict[Tuple[int, Hashable], float]:
+    """
+    The dot products of the tf-idf vectors of the query segments, i.e. their
+    bags of words by segment id, and those of the documents of the postings,
+    (document, word id, term frequency), that share words with them. Only
+    the words with an inverse document frequency are scored
+
+    >>> postings = [('a', 2, 1.0), ('b', 1, 0.5), ('b', 3, 0.5)]
+    >>> tf_idf_scores({0: {1: 0.5, 2: 0.5}}, postings, {1: 1.0, 2: 2.0})
+    {(0, 'a'): 2.0, (0, 'b'): 0.25}
+    """
+    # The query segments by the words they contain
+    segments_by_word: Dict[int, List[Tuple[int, float]]] = defaultdict(list)
+
+    for segment_id, bag in query_bags.items():
+        for word_id, tf in bag.items():
+            if word_id in idfs:
+                segments_by_word[word_id].append((segment_id, tf))
+
+    scores: Dict[Tuple[int, Hashable], float] = defaultdict(float)
+
+    for document, word_id, tf in postings:
+        weight = tf * idfs.get(word_id, 0.0) ** 2
+
+        for segment_id, query_tf in segments_by_word.get(word_id, []):
+            scores[(segment_id, document)] += query_tf * weight
+
+    return dict(scores)